@@ -0,0 +1,268 @@
+# analytics.py
+"""Optional columnar backend for aggregations over long scan and
+maintenance histories.
+
+Writes stay on SQLite. For large databases the history tables
+(``scanned_items``, ``maintenance_log``) are mirrored into Parquet files
+under ``data/_analytics/<user dir>/<db>/<table>/`` and aggregate queries run
+on them with DuckDB, which scans only the columns a query touches and
+parallelises group-bys across cores. The mirror is brought up to date
+incrementally (rows with ``id`` above the last mirrored one) before a query
+whenever the database has changed, and small appends are compacted into
+one file once there are ``MAX_PARTS`` of them.
+
+The tables are mostly appended to, but uploads and imports can update or
+delete rows. The table's data version (``table_versions``, bumped once per
+inserted, updated or deleted row) tells the two apart: if it moved by more
+than the number of new rows, the mirror is rebuilt.
+
+DuckDB is optional: without it, below ``MIN_ROWS`` rows, or with
+``SEALTRAIL_ANALYTICS=off``, ``query`` runs the same SQL on SQLite. Keep
+queries to the SQL both engines share (filters, GROUP BY, COUNT/MIN/MAX,
+``substr``); timestamps stay canonical text (timestamps.py) in the mirror,
+so ``timestamps.where_between`` works unchanged.
+
+    df = analytics.query(db_path, "scanned_items",
+                         "SELECT location, COUNT(*) AS count FROM scanned_items GROUP BY 1")
+"""
+import json
+import os
+import shutil
+import threading
+
+import pandas as pd
+
+import catalog
+import migrations
+import profiler
+
+MODE = os.environ.get("SEALTRAIL_ANALYTICS", "auto")   # auto | on | off
+MIN_ROWS = int(os.environ.get("SEALTRAIL_ANALYTICS_MIN_ROWS", 500_000))
+MIRROR_DIR = os.path.join("data", "_analytics")
+MIRRORED = ("scanned_items", "maintenance_log")
+CHUNK_ROWS = 1_000_000
+MAX_PARTS = 16
+
+_duckdb = None
+_synced = {}
+_locks = {}
+_building = set()
+_lock = threading.Lock()
+
+
+def _engine():
+    """The duckdb module, or None when it is not installed."""
+    global _duckdb
+    if _duckdb is None:
+        try:
+            import duckdb
+            _duckdb = duckdb
+        except ImportError:
+            _duckdb = False
+    return _duckdb or None
+
+
+def use(db_path, table):
+    """Whether queries on ``table`` go to the columnar mirror. The first sync
+    in a process (a full build, or catching up after a restart) runs in the
+    background; queries stay on SQLite until it is done."""
+    if MODE == "off" or table not in MIRRORED or _engine() is None:
+        return False
+    if MODE != "on" and catalog.row_count(db_path, table) < MIN_ROWS:
+        return False
+    return _ready(db_path, table)
+
+
+def _ready(db_path, table):
+    key = (os.path.abspath(db_path), table)
+    if key in _synced:
+        return True
+    with _lock:
+        if key not in _building:
+            _building.add(key)
+            threading.Thread(target=_build, args=(db_path, table), name="analytics-mirror", daemon=True).start()
+    return False
+
+
+def _build(db_path, table):
+    try:
+        sync(db_path, table)
+    finally:
+        with _lock:
+            _building.discard((os.path.abspath(db_path), table))
+
+
+# --- MIRROR ---
+
+def mirror_folder(db_path, table):
+    db_path = os.path.abspath(db_path)
+    user_dir = os.path.basename(os.path.dirname(db_path))
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    return os.path.join(MIRROR_DIR, user_dir, stem, table)
+
+
+def _state(folder):
+    try:
+        with open(os.path.join(folder, "state.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"max_id": 0, "rows": 0, "parts": [], "next_part": 0, "retired": [], "version": None, "columns": None}
+
+
+def _save_state(folder, state):
+    tmp = os.path.join(folder, "state.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, os.path.join(folder, "state.json"))
+
+
+def _columns(conn, table):
+    """SELECT list casting each column to the type DuckDB should store, so
+    every part file has the same schema whatever a chunk's values are."""
+    cols = []
+    for _, name, decl, *_ in conn.execute(f"PRAGMA table_info({table})"):
+        kind = "BIGINT" if "INT" in (decl or "").upper() else "VARCHAR"
+        cols.append(f'CAST("{name}" AS {kind}) AS "{name}"')
+    return ", ".join(cols)
+
+
+def _parquet_list(paths):
+    return "[" + ", ".join("'" + p.replace("'", "''") + "'" for p in paths) + "]"
+
+
+def _copy_to_part(duck, folder, state, select_sql):
+    """Write ``select_sql`` to the next part file (atomically) and return its name."""
+    name = f"part-{state['next_part']:05d}.parquet"
+    state["next_part"] += 1
+    tmp = os.path.join(folder, name + ".tmp").replace("'", "''")
+    duck.execute(f"COPY ({select_sql}) TO '{tmp}' (FORMAT parquet, COMPRESSION zstd)")
+    os.replace(os.path.join(folder, name + ".tmp"), os.path.join(folder, name))
+    return name
+
+
+def _write_part(duck, folder, state, chunk, select):
+    duck.register("chunk", chunk)
+    name = _copy_to_part(duck, folder, state, f"SELECT {select} FROM chunk")
+    duck.unregister("chunk")
+    state["parts"].append(name)
+    state["rows"] += len(chunk)
+    state["max_id"] = int(chunk["id"].max())
+    _save_state(folder, state)
+
+
+def _compact(duck, folder, state):
+    paths = [os.path.join(folder, p) for p in state["parts"]]
+    name = _copy_to_part(duck, folder, state, f"SELECT * FROM read_parquet({_parquet_list(paths)}) ORDER BY id")
+    # Parts replaced last time are no longer listed anywhere; queries that
+    # started before this compaction may still be reading the ones replaced now
+    for p in state["retired"]:
+        if os.path.exists(os.path.join(folder, p)):
+            os.remove(os.path.join(folder, p))
+    state["retired"], state["parts"] = state["parts"], [name]
+    _save_state(folder, state)
+
+
+def _appends_only(conn, table, state, version, select, appended):
+    """Whether ``table`` only gained rows above ``state["max_id"]`` since the
+    mirror was last synced (no update, delete, restore or new column)."""
+    if select != state.get("columns"):
+        return False
+    if version is not None and state.get("version") is not None:
+        return version - state["version"] == appended
+    # No version yet (mirror from before table_versions): fall back to the row count
+    return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == state["rows"] + appended
+
+
+def sync(db_path, table):
+    """Bring the Parquet mirror of ``table`` up to date. Cheap when nothing
+    changed since the last call (one fingerprint stat)."""
+    key = (os.path.abspath(db_path), table)
+    stamp = migrations.db_fingerprint(db_path)
+    if _synced.get(key) == stamp:
+        return mirror_folder(db_path, table)
+    with _lock:
+        table_lock = _locks.setdefault(key, threading.Lock())
+    with table_lock:
+        folder = mirror_folder(db_path, table)
+        if _synced.get(key) == stamp:
+            return folder
+        os.makedirs(folder, exist_ok=True)
+        state = _state(folder)
+        duck = _engine().connect()
+        conn = profiler.connect(db_path, timeout=30)
+        try:
+            with profiler.timed("analytics", f"{table} (sync)", db=db_path) as info:
+                # One read transaction: the version, the new rows and the copy agree
+                conn.execute("BEGIN")
+                row = conn.execute("SELECT version FROM table_versions WHERE tbl = ?", (table,)).fetchone()
+                version = row[0] if row else None
+                select = _columns(conn, table)
+                appended = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE id > ?", (state["max_id"],)).fetchone()[0]
+                if state["rows"] and not _appends_only(conn, table, state, version, select, appended):
+                    shutil.rmtree(folder)
+                    os.makedirs(folder)
+                    state = _state(folder)
+                added = 0
+                for chunk in pd.read_sql_query(
+                    f"SELECT * FROM {table} WHERE id > ? ORDER BY id", conn,
+                    params=[state["max_id"]], chunksize=CHUNK_ROWS,
+                ):
+                    if chunk.empty:
+                        continue
+                    _write_part(duck, folder, state, chunk, select)
+                    added += len(chunk)
+                if len(state["parts"]) > MAX_PARTS:
+                    _compact(duck, folder, state)
+                state["version"], state["columns"] = version, select
+                _save_state(folder, state)
+                info["rows"] = added
+        finally:
+            conn.rollback()
+            conn.close()
+            duck.close()
+        _synced[key] = stamp
+    return folder
+
+
+def forget(db_path):
+    """Drop the mirrors of ``db_path`` (after a restore or delete)."""
+    for table in MIRRORED:
+        _synced.pop((os.path.abspath(db_path), table), None)
+        shutil.rmtree(mirror_folder(db_path, table), ignore_errors=True)
+
+
+# --- QUERIES ---
+
+def query(db_path, table, sql, params=()):
+    """Run ``sql`` (which reads ``table``) on the columnar mirror when
+    ``use`` says so, otherwise on SQLite. Returns a DataFrame."""
+    if not use(db_path, table):
+        migrations.ensure_schema(db_path)
+        conn = profiler.connect(db_path)
+        try:
+            with profiler.timed("analytics", f"{table} (sqlite)", db=db_path) as info:
+                df = pd.read_sql_query(sql, conn, params=list(params))
+                info["rows"] = len(df)
+        finally:
+            conn.close()
+        return df
+
+    folder = sync(db_path, table)
+    parts = [os.path.join(folder, p) for p in _state(folder)["parts"]]
+    duck = _engine().connect()
+    try:
+        with profiler.timed("analytics", f"{table} (duckdb)", db=db_path) as info:
+            if parts:
+                duck.execute(f"CREATE VIEW {table} AS SELECT * FROM read_parquet({_parquet_list(parts)})")
+            else:
+                conn = profiler.connect(db_path)
+                try:
+                    empty = pd.read_sql_query(f"SELECT * FROM {table} LIMIT 0", conn)
+                finally:
+                    conn.close()
+                duck.register(table, empty)
+            df = duck.execute(sql, list(params)).df()
+            info["rows"] = len(df)
+    finally:
+        duck.close()
+    return df
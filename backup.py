@@ -0,0 +1,202 @@
+# backup.py
+"""Online backups for SealTrail databases.
+
+Copying a live ``.db`` file while it is being written can produce a torn
+copy. Backups here use the sqlite3 online backup API instead: pages are
+copied a bounded number at a time with a short pause between steps, from a
+read transaction held open on the source. In WAL mode that transaction pins
+one consistent snapshot, so writers (scanning, imports) keep committing and
+the backup never has to restart because of them.
+
+Snapshots are gzip-compressed into ``data/_backups/<user dir>/`` and pruned
+to the newest ``KEEP`` per database.
+
+    python backup.py                       # back up every database under data/
+    python backup.py --every 3600 --keep 24
+    python backup.py --db data/alice_at_x.com/warehouse.db
+    python backup.py --restore data/_backups/alice_at_x.com/warehouse-20250101T020000Z.db.gz \
+                     --db data/alice_at_x.com/warehouse.db
+"""
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import analytics
+import db_writer
+import catalog
+import migrations
+import snapshots
+
+DATA_DIR = "data"
+BACKUP_DIR = os.environ.get("SEALTRAIL_BACKUP_DIR", os.path.join(DATA_DIR, "_backups"))
+KEEP = int(os.environ.get("SEALTRAIL_BACKUP_KEEP", 14))
+PAGES_PER_STEP = 256
+STEP_PAUSE = 0.002
+STAMP_FORMAT = "%Y%m%dT%H%M%SZ"
+
+
+class BackupError(Exception):
+    pass
+
+
+# --- SNAPSHOT FILES ---
+
+def backup_folder(db_path):
+    user_dir = os.path.basename(os.path.dirname(os.path.abspath(db_path)))
+    return os.path.join(BACKUP_DIR, user_dir)
+
+
+def list_backups(db_path):
+    """Backups of ``db_path``, newest first, as dicts with path/size/created."""
+    folder = backup_folder(db_path)
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    if not os.path.isdir(folder):
+        return []
+    out = []
+    for name in os.listdir(folder):
+        if not (name.startswith(f"{stem}-") and name.endswith(".db.gz")):
+            continue
+        try:
+            created = datetime.strptime(name[len(stem) + 1:-len(".db.gz")], STAMP_FORMAT)
+        except ValueError:
+            continue
+        path = os.path.join(folder, name)
+        out.append({"path": path, "name": name, "size": os.path.getsize(path), "created": created})
+    return sorted(out, key=lambda b: b["created"], reverse=True)
+
+
+# --- BACKUP ---
+
+def _copy_online(src_path, dest_path, progress=None):
+    src = sqlite3.connect(src_path, timeout=30)
+    dst = sqlite3.connect(dest_path)
+    try:
+        # In rollback-journal mode the read transaction below would block writers
+        src.execute("PRAGMA journal_mode=WAL")
+        src.execute("BEGIN")
+        src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+
+        def step(status, remaining, total):
+            if progress and total:
+                progress((total - remaining) / total)
+            time.sleep(STEP_PAUSE)
+
+        src.backup(dst, pages=PAGES_PER_STEP, progress=step)
+        src.rollback()
+        ok = dst.execute("PRAGMA quick_check").fetchone()[0]
+        if ok != "ok":
+            raise BackupError(f"Backup copy of {src_path} failed quick_check: {ok}")
+    finally:
+        dst.close()
+        src.close()
+
+
+def backup_database(db_path, keep=KEEP, progress=None):
+    """Write a compressed online snapshot of ``db_path`` and prune old ones.
+    Returns the snapshot path."""
+    if not os.path.exists(db_path):
+        raise BackupError(f"No such database: {db_path}")
+    folder = backup_folder(db_path)
+    os.makedirs(folder, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    target = os.path.join(folder, f"{stem}-{datetime.now(timezone.utc).strftime(STAMP_FORMAT)}.db.gz")
+
+    fd, raw = tempfile.mkstemp(suffix=".db", dir=folder)
+    os.close(fd)
+    try:
+        _copy_online(db_path, raw, progress=lambda f: progress(0.8 * f) if progress else None)
+        if progress:
+            progress(0.8, "Compressing")
+        with open(raw, "rb") as fin, gzip.open(target + ".tmp", "wb", compresslevel=6) as fout:
+            shutil.copyfileobj(fin, fout, 1024 * 1024)
+        os.replace(target + ".tmp", target)
+    finally:
+        for path in (raw, target + ".tmp"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    prune(db_path, keep)
+    return target
+
+
+def prune(db_path, keep=KEEP):
+    removed = 0
+    for old in list_backups(db_path)[keep:]:
+        os.remove(old["path"])
+        removed += 1
+    return removed
+
+
+# --- RESTORE ---
+
+def restore(snapshot_path, db_path):
+    """Replace the contents of ``db_path`` with a snapshot.
+
+    The snapshot is decompressed and must pass ``PRAGMA integrity_check``
+    before anything is touched. Pages are then copied into the live file
+    with the backup API, so open connections see the restored data.
+    """
+    fd, raw = tempfile.mkstemp(suffix=".restore", dir=os.path.dirname(os.path.abspath(db_path)))
+    os.close(fd)
+    try:
+        with gzip.open(snapshot_path, "rb") as fin, open(raw, "wb") as fout:
+            shutil.copyfileobj(fin, fout, 1024 * 1024)
+        src = sqlite3.connect(raw)
+        try:
+            result = [r[0] for r in src.execute("PRAGMA integrity_check")]
+            if result != ["ok"]:
+                raise BackupError(f"Snapshot failed integrity_check: {'; '.join(result[:5])}")
+            # Stop the writer so no queued write lands half-way through the copy
+            db_writer.close(db_path)
+            dst = sqlite3.connect(db_path, timeout=30)
+            try:
+                src.backup(dst)
+            finally:
+                dst.close()
+        finally:
+            src.close()
+    finally:
+        os.remove(raw)
+    migrations.forget(db_path)
+    analytics.forget(db_path)
+    snapshots.forget(db_path)
+
+
+# --- CLI ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Online backups of SealTrail databases")
+    parser.add_argument("--db", action="append", help="Database to back up (default: all under data/)")
+    parser.add_argument("--keep", type=int, default=KEEP, help="Snapshots to keep per database")
+    parser.add_argument("--every", type=float, default=0, help="Repeat every N seconds")
+    parser.add_argument("--restore", metavar="SNAPSHOT", help="Restore SNAPSHOT into --db")
+    args = parser.parse_args(argv)
+
+    if args.restore:
+        if not args.db or len(args.db) != 1:
+            parser.error("--restore needs exactly one --db")
+        restore(args.restore, args.db[0])
+        print(f"Restored {args.db[0]} from {args.restore}")
+        return
+
+    while True:
+        targets = args.db or catalog.find_databases()
+        for db_path in targets:
+            started = time.perf_counter()
+            try:
+                path = backup_database(db_path, keep=args.keep)
+                print(f"{db_path} -> {path} ({os.path.getsize(path) / 1024:.0f} KB, {time.perf_counter() - started:.1f}s)")
+            except Exception as e:
+                print(f"{db_path}: backup failed: {e}")
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
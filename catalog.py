@@ -0,0 +1,206 @@
+# catalog.py
+"""Cached metadata for every SealTrail database.
+
+The sidebar, the table selector and the admin overview used to list the
+user directory, query ``sqlite_master`` and count rows on every rerun. The
+catalog keeps, per ``.db`` file, its tables, size, schema hash and
+modification time, and only re-reads a file when its fingerprint
+(mtime/size of the file and its WAL) changes. Directory listings are cached
+on the directory's mtime, so a rerun with nothing changed costs one stat
+call per directory and per database.
+
+Row counts are kept apart, since counting means reading every table:
+``row_counts`` (all tables, for the admin pages) is cached on the file
+fingerprint, ``row_count`` (one table) on that table's data version, so a
+write to one table doesn't re-count the others.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import jobs
+import migrations
+
+DATA_DIR = "data"
+
+_dirs = {}
+_dbs = {}
+_counts = {}
+_table_counts = {}
+_lock = threading.Lock()
+
+
+# --- DIRECTORIES ---
+
+def _listing(folder):
+    """(``.db`` file names, sub-folder names) of ``folder``, re-listed only
+    when the folder's mtime changes (entries created, renamed or deleted)."""
+    try:
+        stamp = os.stat(folder).st_mtime_ns
+    except OSError:
+        return [], []
+    key = os.path.abspath(folder)
+    cached = _dirs.get(key)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    with os.scandir(folder) as entries:
+        entries = list(entries)
+    listing = (
+        sorted(e.name for e in entries if e.is_file() and e.name.endswith(".db")),
+        sorted(e.name for e in entries if e.is_dir()),
+    )
+    _dirs[key] = (stamp, listing)
+    return listing
+
+
+def list_databases(folder):
+    """Sorted ``.db`` file names in ``folder``."""
+    return _listing(folder)[0]
+
+
+def find_databases(root=DATA_DIR):
+    """Every user database under ``root``. Internal folders (``_backups``,
+    ``_jobs``) and the job runner's own database are skipped."""
+    skip = os.path.abspath(jobs.JOBS_DB)
+    names, subdirs = _listing(root)
+    found = [os.path.join(root, n) for n in names if os.path.abspath(os.path.join(root, n)) != skip]
+    for sub in subdirs:
+        if not sub.startswith("_"):
+            found.extend(find_databases(os.path.join(root, sub)))
+    return found
+
+
+# --- DATABASES ---
+
+def _read(db_path):
+    conn = sqlite3.connect(db_path, timeout=5)
+    try:
+        schema = conn.execute(
+            "SELECT type, name, COALESCE(sql, '') FROM sqlite_master WHERE name NOT LIKE 'sqlite_%' ORDER BY type, name"
+        ).fetchall()
+        tables = [name for kind, name, _ in schema if kind == "table"]
+        user_version = conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+    return {
+        "tables": tables,
+        "schema_hash": hashlib.sha1(repr(schema).encode()).hexdigest()[:12],
+        "user_version": user_version,
+    }
+
+
+def info(db_path):
+    """Metadata for one database: name, path, size_bytes, modified, tables
+    (names), schema_hash, user_version. Cached until the file changes; an
+    unreadable file yields an ``error`` entry instead of tables."""
+    key = os.path.abspath(db_path)
+    stamp = migrations.db_fingerprint(key)
+    cached = _dbs.get(key)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    with _lock:
+        cached = _dbs.get(key)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        size = sum(s[1] for s in stamp if s)
+        mtime = max((s[0] for s in stamp if s), default=0)
+        entry = {
+            "name": os.path.basename(key),
+            "path": db_path,
+            "size_bytes": size,
+            "modified": datetime.fromtimestamp(mtime / 1e9) if mtime else None,
+            "tables": [],
+            "schema_hash": None,
+            "user_version": None,
+            "error": None,
+        }
+        try:
+            entry.update(_read(key))
+        except sqlite3.Error as e:
+            entry["error"] = str(e)
+        _dbs[key] = (stamp, entry)
+    return entry
+
+
+def row_counts(db_path):
+    """{table: row count} for every table of one database. Counts every
+    table whenever the file changed; for the admin pages."""
+    key = os.path.abspath(db_path)
+    stamp = migrations.db_fingerprint(key)
+    cached = _counts.get(key)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    counts = {}
+    tables = info(db_path)["tables"]
+    if tables:
+        conn = sqlite3.connect(key, timeout=5)
+        try:
+            counts = {t: conn.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0] for t in tables}
+        finally:
+            conn.close()
+    _counts[key] = (stamp, counts)
+    return counts
+
+
+def row_count(db_path, table):
+    """Rows in one table (0 when it doesn't exist), counted again only when
+    the table's data version (migrations.table_version) changed."""
+    key = (os.path.abspath(db_path), table)
+    stamp = migrations.db_fingerprint(key[0])
+    cached = _table_counts.get(key)
+    if cached and cached[0] == stamp:
+        return cached[2]
+    version, count = None, 0
+    if table in info(db_path)["tables"]:
+        conn = sqlite3.connect(key[0], timeout=5)
+        try:
+            try:
+                version = migrations.table_version(conn, table)
+            except sqlite3.OperationalError:
+                version = None   # not migrated yet: no table_versions
+            if cached and version is not None and cached[1] == version:
+                count = cached[2]
+            else:
+                count = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+        finally:
+            conn.close()
+    _table_counts[key] = (stamp, version, count)
+    return count
+
+
+def user_tables(db_path):
+    """Working tables first, then the app's own tables."""
+    tables = list(info(db_path)["tables"])
+    return [t for t in tables if t not in migrations.APP_TABLES] + [t for t in tables if t in migrations.APP_TABLES]
+
+
+def overview(root=DATA_DIR):
+    """One row per database under ``root`` for the admin overview."""
+    rows = []
+    for db_path in find_databases(root):
+        entry = info(db_path)
+        counts = row_counts(db_path) if not entry["error"] else {}
+        rows.append({
+            "owner": os.path.basename(os.path.dirname(os.path.abspath(db_path))),
+            "database": entry["name"],
+            "size_mb": round(entry["size_bytes"] / 1024 / 1024, 2),
+            "tables": len(entry["tables"]),
+            "rows": sum(counts.values()),
+            "schema_version": entry["user_version"],
+            "schema_hash": entry["schema_hash"],
+            "modified": entry["modified"],
+            "error": entry["error"],
+            "path": db_path,
+        })
+    return rows
+
+
+def forget(db_path):
+    key = os.path.abspath(db_path)
+    _dbs.pop(key, None)
+    _counts.pop(key, None)
+    for entry in [k for k in _table_counts if k[0] == key]:
+        _table_counts.pop(entry, None)
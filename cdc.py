@@ -0,0 +1,370 @@
+# cdc.py
+"""Change-data capture and incremental sync to a central database.
+
+Capture is opt-in per database: once a database has been synced (or
+``enable``d), triggers on ``scanned_items``, ``maintenance_log`` and every
+working table append one row per insert, update or delete to
+``change_log``:
+
+    seq      increasing sequence number
+    tbl      table name
+    op       I / U / D, or R ("re-read the whole table")
+    row_key  the row's ID column, ``id`` for app tables, rowid otherwise
+    data     the new row as a JSON object (NULL for deletes)
+
+A table whose triggers had to be (re)created, because it was replaced by
+an upload or gained a column, gets an R event instead of per-row history.
+
+``sync_database`` applies everything after the target's checkpoint for
+that source: only the last event per row is applied, tables with an R
+event are re-copied, and all of it is read inside one read transaction on
+the source so the copy and the events agree. The checkpoint is committed
+with the data, then the consumed log entries are deleted from the source.
+The work is proportional to the number of changed rows, not the size of
+the database.
+
+    python cdc.py --target data/_central/central.db            # every database under data/
+    python cdc.py --target data/_central/central.db --every 3600
+    python cdc.py --target central.db --db data/alice_at_x.com/warehouse.db
+
+In the target each source table becomes a table of the same name with two
+extra key columns, ``_source`` (``<user dir>/<file>``) and ``_row_key``;
+columns are added as new ones show up.
+
+The switch is the ``change_capture`` row of the source database itself, so
+every process sees the same setting. With capture off (the default, and
+after ``--disable``) no triggers are installed, so a database nobody syncs
+doesn't keep a JSON copy of every write. Only a sync deletes log entries,
+and only the ones its committed checkpoint covers.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+import catalog
+import db_writer
+import migrations
+import timestamps
+
+LOG_TABLE = "change_log"
+TRACKED_APP_TABLES = ("scanned_items", "maintenance_log")
+DEFAULT_TARGET = os.path.join("data", "_central", "central.db")
+BATCH_ROWS = 5000
+MAX_PAIRS = 60   # SQLite allows 127 function arguments
+
+
+# --- TRIGGERS ---
+
+def key_column(conn, table):
+    """What identifies a row of ``table`` across syncs."""
+    if table in TRACKED_APP_TABLES:
+        return "id"
+    return migrations.table_id_column(conn, table) or "rowid"
+
+
+def _json_row(prefix, columns):
+    """SQL building a JSON object from ``prefix``.col for every column, nested
+    through json_insert so wide tables stay under the argument limit."""
+    chunks = [columns[i:i + MAX_PAIRS] for i in range(0, len(columns), MAX_PAIRS)] or [[]]
+    expr = "json_object(" + ", ".join(f"'{c}', {prefix}.\"{c}\"" for c in chunks[0]) + ")"
+    for chunk in chunks[1:]:
+        expr = f"json_insert({expr}, " + ", ".join(f"'$.\"{c}\"', {prefix}.\"{c}\"" for c in chunk) + ")"
+    return expr
+
+
+def trigger_sql(conn, table):
+    """{trigger name: CREATE TRIGGER statement} for ``table``."""
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+    key = key_column(conn, table)
+    key_new, key_old = ("NEW.rowid", "OLD.rowid") if key == "rowid" else (f'NEW."{key}"', f'OLD."{key}"')
+    log = f"INSERT INTO {LOG_TABLE} (tbl, op, row_key, data)"
+    return {
+        f"cdc_{table}_insert": (
+            f'CREATE TRIGGER "cdc_{table}_insert" AFTER INSERT ON "{table}" BEGIN\n'
+            f"    {log} VALUES ('{table}', 'I', {key_new}, {_json_row('NEW', columns)});\nEND"
+        ),
+        f"cdc_{table}_update": (
+            f'CREATE TRIGGER "cdc_{table}_update" AFTER UPDATE ON "{table}" BEGIN\n'
+            f"    {log} SELECT '{table}', 'D', {key_old}, NULL WHERE {key_old} IS NOT {key_new};\n"
+            f"    {log} VALUES ('{table}', 'U', {key_new}, {_json_row('NEW', columns)});\nEND"
+        ),
+        f"cdc_{table}_delete": (
+            f'CREATE TRIGGER "cdc_{table}_delete" AFTER DELETE ON "{table}" BEGIN\n'
+            f"    {log} VALUES ('{table}', 'D', {key_old}, NULL);\nEND"
+        ),
+    }
+
+
+def tracked_tables(conn):
+    """App history tables plus every working table."""
+    present = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return [t for t in TRACKED_APP_TABLES if t in present] + migrations.working_tables(conn)
+
+
+def ensure_triggers(conn, table):
+    """Create or refresh the triggers of one table. Returns True when they
+    changed, in which case an R event is logged so the next sync re-reads it."""
+    if not migrations.replace_triggers(conn, table, "cdc", trigger_sql(conn, table)):
+        return False
+    conn.execute(f"INSERT INTO {LOG_TABLE} (tbl, op) VALUES (?, 'R')", (table,))
+    return True
+
+
+def enabled(conn):
+    row = conn.execute("SELECT enabled FROM change_capture WHERE id = 1").fetchone()
+    return bool(row and row[0])
+
+
+def _hook(conn, tables):
+    present = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    tables = [t for t in TRACKED_APP_TABLES if t in present] + tables
+    if enabled(conn):
+        return [t for t in tables if ensure_triggers(conn, t)]
+    # Entries already logged stay until a sync has consumed them
+    return [t for t in tables if migrations.replace_triggers(conn, t, "cdc", {})]
+
+
+migrations.register_triggers("cdc", _hook)
+
+
+def enable(db_path, on=True):
+    """Switch capture on (or off) for ``db_path`` and install (or drop) its
+    triggers in the same transaction. Returns the tables whose triggers
+    changed. Other processes follow through the schema change."""
+    migrations.ensure_schema(db_path)
+
+    def apply(conn):
+        conn.execute(
+            "INSERT INTO change_capture (id, enabled, changed_at) VALUES (1, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET enabled = excluded.enabled, changed_at = excluded.changed_at",
+            (int(on), timestamps.now()),
+        )
+        return _hook(conn, migrations.working_tables(conn))
+
+    return db_writer.run(db_path, apply)
+
+
+# --- SYNC ---
+
+def source_id(db_path):
+    db_path = os.path.abspath(db_path)
+    return f"{os.path.basename(os.path.dirname(db_path))}/{os.path.basename(db_path)}"
+
+
+def _prepare_target(target):
+    conn = sqlite3.connect(target, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS _sync_checkpoint (
+            source TEXT PRIMARY KEY,
+            last_seq INTEGER,
+            synced_at TEXT
+        )
+    """)
+    conn.commit()
+    return conn
+
+
+class _Target:
+    """Upserts into the target, adding tables and columns as they appear."""
+
+    def __init__(self, conn, source):
+        self.conn = conn
+        self.source = source
+        self.columns = {}
+
+    def _columns(self, table, wanted):
+        known = self.columns.get(table)
+        if known is None:
+            self.conn.execute(
+                f'CREATE TABLE IF NOT EXISTS "{table}" (_source TEXT NOT NULL, _row_key TEXT NOT NULL, '
+                f"PRIMARY KEY (_source, _row_key))"
+            )
+            known = self.columns[table] = {r[1] for r in self.conn.execute(f'PRAGMA table_info("{table}")')}
+        for col in wanted:
+            if col not in known:
+                self.conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{col}"')
+                known.add(col)
+
+    def upsert(self, table, rows):
+        """rows: [(row_key, {column: value})]. Grouped by column set so each
+        group is one executemany."""
+        groups = {}
+        for key, values in rows:
+            groups.setdefault(tuple(values), []).append((self.source, str(key), *values.values()))
+        for cols, params in groups.items():
+            self._columns(table, cols)
+            col_list = ", ".join(f'"{c}"' for c in ("_source", "_row_key") + cols)
+            updates = ", ".join(f'"{c}" = excluded."{c}"' for c in cols)
+            self.conn.executemany(
+                f'INSERT INTO "{table}" ({col_list}) VALUES ({", ".join("?" * (len(cols) + 2))}) '
+                f"ON CONFLICT(_source, _row_key) DO " + (f"UPDATE SET {updates}" if cols else "NOTHING"),
+                params,
+            )
+
+    def delete(self, table, keys):
+        if table in self.columns or self._exists(table):
+            self.conn.executemany(
+                f'DELETE FROM "{table}" WHERE _source = ? AND _row_key = ?',
+                [(self.source, str(k)) for k in keys],
+            )
+
+    def clear(self, table):
+        if self._exists(table):
+            self.conn.execute(f'DELETE FROM "{table}" WHERE _source = ?', (self.source,))
+
+    def _exists(self, table):
+        return self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone() is not None
+
+    def tables(self):
+        return [r[0] for r in self.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name != '_sync_checkpoint'"
+        )]
+
+
+def _copy_table(src, target, table):
+    key = key_column(src, table)
+    key_sql = "rowid" if key == "rowid" else f'"{key}"'
+    target.clear(table)
+    cur = src.execute(f'SELECT {key_sql} AS "_cdc_key", * FROM "{table}"')
+    names = [d[0] for d in cur.description][1:]
+    copied = 0
+    while True:
+        batch = cur.fetchmany(BATCH_ROWS)
+        if not batch:
+            return copied
+        target.upsert(table, [(row[0], dict(zip(names, row[1:]))) for row in batch])
+        copied += len(batch)
+
+
+def sync_database(db_path, target_conn, truncate=True):
+    """Apply the changes of ``db_path`` since its checkpoint to ``target_conn``.
+    Returns a summary dict."""
+    source = source_id(db_path)
+    row = target_conn.execute("SELECT last_seq FROM _sync_checkpoint WHERE source = ?", (source,)).fetchone()
+    last = row[0] if row else None
+    target = _Target(target_conn, source)
+    stats = {"source": source, "events": 0, "copied": 0, "tables_copied": []}
+
+    src = sqlite3.connect(db_path, timeout=30)
+    try:
+        # One read transaction: the log position, the events and any table copies see the same snapshot
+        src.execute("BEGIN")
+        # AUTOINCREMENT's high-water mark survives the truncation below
+        top = src.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = ?", (LOG_TABLE,)).fetchone()[0]
+        if last is not None and top < last:
+            last = None   # the file was restored or replaced: start over
+        tables = tracked_tables(src)
+        if last is None:
+            recopy = set(tables)
+        else:
+            recopy = {r[0] for r in src.execute(
+                f"SELECT DISTINCT tbl FROM {LOG_TABLE} WHERE seq > ? AND seq <= ? AND op = 'R'", (last, top))}
+
+        # Tables the source no longer has
+        for table in set(target.tables()) - set(tables):
+            target.clear(table)
+        for table in sorted(recopy & set(tables)):
+            stats["copied"] += _copy_table(src, target, table)
+            stats["tables_copied"].append(table)
+
+        if last is not None:
+            # Only the newest event per row matters
+            cur = src.execute(f"""
+                SELECT c.tbl, c.op, c.row_key, c.data FROM {LOG_TABLE} c
+                JOIN (SELECT MAX(seq) AS seq FROM {LOG_TABLE}
+                      WHERE seq > ? AND seq <= ? AND op != 'R' GROUP BY tbl, row_key) newest
+                  ON c.seq = newest.seq
+                ORDER BY c.seq
+            """, (last, top))
+            while True:
+                batch = cur.fetchmany(BATCH_ROWS)
+                if not batch:
+                    break
+                upserts, deletes = {}, {}
+                for tbl, op, key, data in batch:
+                    if tbl in recopy:
+                        continue
+                    if op == "D":
+                        deletes.setdefault(tbl, []).append(key)
+                    else:
+                        upserts.setdefault(tbl, []).append((key, json.loads(data)))
+                for tbl, keys in deletes.items():
+                    target.delete(tbl, keys)
+                for tbl, rows in upserts.items():
+                    target.upsert(tbl, rows)
+                stats["events"] += len(batch)
+
+        target_conn.execute(
+            "INSERT INTO _sync_checkpoint (source, last_seq, synced_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(source) DO UPDATE SET last_seq = excluded.last_seq, synced_at = excluded.synced_at",
+            (source, top, datetime.now(timezone.utc).isoformat()),
+        )
+        target_conn.commit()
+        src.rollback()
+
+        if truncate and top and (last is None or top > last):
+            # Safe to drop: the checkpoint above is committed, and a rerun skips seq <= top
+            src.execute(f"DELETE FROM {LOG_TABLE} WHERE seq <= ?", (top,))
+            src.commit()
+    except Exception:
+        target_conn.rollback()
+        raise
+    finally:
+        src.close()
+    stats["last_seq"] = top
+    return stats
+
+
+def sync_all(target, databases=None, truncate=True):
+    conn = _prepare_target(target)
+    results = []
+    try:
+        for db_path in databases or catalog.find_databases():
+            if os.path.abspath(db_path) == os.path.abspath(target):
+                continue
+            # Syncing a database opts it in; newly installed triggers log a full re-copy
+            enable(db_path)
+            t0 = time.perf_counter()
+            stats = sync_database(db_path, conn, truncate=truncate)
+            stats["seconds"] = round(time.perf_counter() - t0, 2)
+            results.append(stats)
+    finally:
+        conn.close()
+    return results
+
+
+# --- CLI ---
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync captured changes into a central SQLite database.")
+    parser.add_argument("--target", default=DEFAULT_TARGET, help=f"Central database (default {DEFAULT_TARGET})")
+    parser.add_argument("--db", action="append", help="Source database (repeatable; default: all under data/)")
+    parser.add_argument("--every", type=float, help="Repeat every N seconds")
+    parser.add_argument("--keep-log", action="store_true", help="Do not delete consumed change_log entries")
+    parser.add_argument("--disable", action="store_true", help="Stop capturing changes in the databases and exit")
+    args = parser.parse_args()
+
+    if args.disable:
+        for db_path in args.db or catalog.find_databases():
+            enable(db_path, on=False)
+            print(f"{db_path}: capture off")
+        return
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.target)), exist_ok=True)
+    while True:
+        for stats in sync_all(args.target, args.db, truncate=not args.keep_log):
+            copied = f", re-copied {', '.join(stats['tables_copied'])} ({stats['copied']} rows)" if stats["tables_copied"] else ""
+            print(f"{stats['source']}: {stats['events']} change(s) up to #{stats['last_seq']}{copied} in {stats['seconds']}s")
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# charts.py
+"""Time-bucketed, point-capped series for the trend charts.
+
+Scan and maintenance charts used to group by the raw timestamp, one point
+per distinct microsecond. Here the bucket (minute ... month) is chosen from
+the date range so a chart never gets more than ``MAX_POINTS`` points, the
+grouping runs in SQLite over the indexed timestamp column (or, for large
+histories, on the columnar mirror in analytics.py), and results are cached
+until the database changes.
+
+    series, bucket = charts.time_series(db_path, "scanned_items", "timestamp", start, end)
+"""
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import analytics
+import migrations
+import profiler
+import timestamps
+
+MAX_POINTS = 500
+CACHE_SIZE = 64
+
+# name -> (approximate seconds, SQLite expression producing the bucket start)
+BUCKETS = OrderedDict([
+    ("minute", (60, "strftime('%Y-%m-%d %H:%M:00', {col})")),
+    ("hour", (3600, "strftime('%Y-%m-%d %H:00:00', {col})")),
+    ("day", (86400, "date({col})")),
+    ("week", (7 * 86400, "date({col}, 'weekday 0', '-6 days')")),
+    ("month", (30 * 86400, "strftime('%Y-%m-01', {col})")),
+])
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def pick_bucket(start, end, max_points=MAX_POINTS):
+    """Smallest bucket that keeps the range under ``max_points`` points."""
+    span = max((pd.Timestamp(end) - pd.Timestamp(start)).total_seconds(), 1)
+    for name, (seconds, _) in BUCKETS.items():
+        if span / seconds <= max_points:
+            return name
+    return "month"
+
+
+def _cap(series, max_points):
+    """Merge neighbouring buckets when an explicit bucket still yields too many."""
+    if len(series) <= max_points:
+        return series
+    group = pd.RangeIndex(len(series)) // -(-len(series) // max_points)
+    return series.groupby(group).agg(bucket=("bucket", "first"), count=("count", "sum")).reset_index(drop=True)
+
+
+def _floor(ts, bucket):
+    """pandas equivalent of the BUCKETS expressions."""
+    if bucket == "minute":
+        return ts.dt.floor("min")
+    if bucket == "hour":
+        return ts.dt.floor("h")
+    days = ts.dt.normalize()
+    if bucket == "week":
+        return days - pd.to_timedelta(days.dt.dayofweek, unit="D")
+    if bucket == "month":
+        return days.dt.to_period("M").dt.to_timestamp()
+    return days
+
+
+def _sqlite_series(db_path, table, ts_col, where_sql, params, bucket, max_points, dates):
+    migrations.ensure_schema(db_path)
+    conn = profiler.connect(db_path)
+    try:
+        with profiler.timed("chart", table, db=db_path) as info:
+            if bucket == "auto":
+                first, last = conn.execute(
+                    f"SELECT MIN({ts_col}), MAX({ts_col}) FROM {table} WHERE {where_sql}", params
+                ).fetchone()
+                bucket = pick_bucket(first, last, max_points) if first else "day"
+            expr = BUCKETS[bucket][1].format(col=ts_col if dates else f"{ts_col}, 'localtime'")
+            series = pd.read_sql_query(
+                f"SELECT {expr} AS bucket, COUNT(*) AS count FROM {table} "
+                f"WHERE {where_sql} GROUP BY 1 HAVING bucket IS NOT NULL ORDER BY 1",
+                conn, params=params,
+            )
+            series["bucket"] = pd.to_datetime(series["bucket"])
+            series = _cap(series, max_points)
+            info["rows"] = len(series)
+    finally:
+        conn.close()
+    return series, bucket
+
+
+def _columnar_series(db_path, table, ts_col, where_sql, params, bucket, max_points, dates):
+    """Same result as the SQLite path, for analytics-backed tables. The engine
+    only groups on a text prefix of the canonical timestamp (UTC minute, UTC
+    hour or calendar day); the few thousand groups are then shifted to local
+    time and merged into the chart bucket here."""
+    if bucket == "auto":
+        bounds = analytics.query(db_path, table, f"SELECT MIN({ts_col}) AS first, MAX({ts_col}) AS last FROM {table} WHERE {where_sql}", params)
+        first, last = bounds.iloc[0]
+        bucket = pick_bucket(first, last, max_points) if pd.notna(first) else "day"
+    width = 10 if dates else 16 if bucket == "minute" else 13
+    groups = analytics.query(
+        db_path, table,
+        f"SELECT substr({ts_col}, 1, {width}) AS prefix, COUNT(*) AS count FROM {table} WHERE {where_sql} GROUP BY 1",
+        params,
+    )
+    if dates:
+        ts = pd.to_datetime(groups["prefix"], format="%Y-%m-%d", errors="coerce")
+    else:
+        ts = timestamps.parse(groups["prefix"] + (":00.000Z" if width == 16 else ":00:00.000Z"))
+    series = (
+        groups.assign(bucket=_floor(ts, bucket)).dropna(subset=["bucket"])
+        .groupby("bucket", as_index=False)["count"].sum().sort_values("bucket", ignore_index=True)
+    )
+    return _cap(series[["bucket", "count"]], max_points), bucket
+
+
+def time_series(db_path, table, ts_col, start=None, end=None, bucket="auto", max_points=MAX_POINTS, dates=False):
+    """Counts per time bucket for ``table`` between local days ``start`` and
+    ``end`` (inclusive). ``dates=True`` for calendar-date columns.
+
+    Returns (DataFrame[bucket, count], bucket name). Without bounds the
+    table's own min/max timestamp sets the range. UTC timestamps are
+    bucketed in server-local time.
+    """
+    range_sql, params = timestamps.where_between(ts_col, start, end, dates=dates)
+    key = (db_path, table, ts_col, tuple(params), bucket, max_points, dates)
+    stamp = migrations.db_fingerprint(db_path)
+    with _lock:
+        cached = _cache.get(key)
+        if cached and cached[0] == stamp:
+            _cache.move_to_end(key)
+            profiler.record("chart", table, 0.0, rows=len(cached[1]), cache_hit=True, db=db_path)
+            return cached[1], cached[2]
+
+    where_sql = f"{ts_col} IS NOT NULL AND {range_sql}"
+
+    if analytics.use(db_path, table):
+        with profiler.timed("chart", table, db=db_path) as info:
+            series, bucket = _columnar_series(db_path, table, ts_col, where_sql, params, bucket, max_points, dates)
+            info["rows"] = len(series)
+    else:
+        series, bucket = _sqlite_series(db_path, table, ts_col, where_sql, params, bucket, max_points, dates)
+
+    with _lock:
+        _cache[key] = (stamp, series, bucket)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return series, bucket
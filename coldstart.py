@@ -0,0 +1,146 @@
+# coldstart.py
+"""Cold-start check for every page.
+
+Each page is run once in a fresh Python process (Streamlit's AppTest, no
+server), which is what the first visitor after a deploy or a scale-up
+gets. Pages run against a scratch copy of the app and the database, so
+their writes (migrations, audit rows, job and profiler records) never
+touch the real ones. Per page it reports the time spent in the page's own imports, the
+first render and the whole process, and exits non-zero when a page's
+import + first render exceeds the budget
+(``profiler.STARTUP_BUDGET_MS``, env ``SEALTRAIL_STARTUP_BUDGET_MS``).
+
+    python coldstart.py                                  # every page, first database under data/
+    python coldstart.py --db data/alice_at_x.com/warehouse.db --budget-ms 1200
+    python coldstart.py pages/4_Dashboard.py --runs 3 --keep
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+PAGES = ["main.py"] + sorted(glob.glob("pages/*.py"))
+
+
+def prepare(workdir, db_path):
+    """Copy the app and ``db_path`` into ``workdir``. Returns the path of
+    the database copy relative to ``workdir`` (None without a database)."""
+    for path in glob.glob("*.py") + glob.glob("*.yaml"):
+        shutil.copy(path, workdir)
+    shutil.copytree("pages", os.path.join(workdir, "pages"))
+    if not db_path:
+        return None
+    user_dir = os.path.basename(os.path.dirname(os.path.abspath(db_path)))
+    copy = os.path.join("data", user_dir, os.path.basename(db_path))
+    os.makedirs(os.path.join(workdir, "data", user_dir))
+    # Online backup API: a consistent copy even while the app is writing
+    src, dst = sqlite3.connect(db_path, timeout=30), sqlite3.connect(os.path.join(workdir, copy))
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+    return copy
+
+
+def _child(page, db_path):
+    """Runs in the fresh process: one AppTest run of ``page``, result as JSON on stdout."""
+    t0 = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+
+    import profiler
+
+    framework_ms = (time.perf_counter() - t0) * 1000
+    at = AppTest.from_file(page, default_timeout=120)
+    if db_path:
+        owner = os.path.basename(os.path.dirname(os.path.abspath(db_path)))
+        at.session_state["user_email"] = owner.replace("_at_", "@")
+        at.session_state["user_role"] = "admin"
+        at.session_state["db_path"] = db_path
+        at.session_state["selected_db"] = os.path.basename(db_path)
+    t1 = time.perf_counter()
+    at.run()
+    run_ms = (time.perf_counter() - t1) * 1000
+    report = {row["page"]: row for row in profiler.startup_report()}
+    row = next(iter(report.values()), {})
+    print(json.dumps({
+        "framework_ms": round(framework_ms, 1),
+        "run_ms": round(run_ms, 1),
+        "import_ms": row.get("import_ms"),
+        "render_ms": row.get("render_ms"),
+        "exception": [e.value for e in at.exception][:1],
+    }))
+
+
+def measure(page, workdir, db_path=None):
+    """Fresh-process timings for one page, run in the app copy in ``workdir``."""
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "coldstart.py", "--child", page] + (["--db", db_path] if db_path else []),
+        capture_output=True, text=True, cwd=workdir,
+    )
+    wall_ms = (time.perf_counter() - t0) * 1000
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode or not lines:
+        return {"page": page, "error": (proc.stderr.strip().splitlines() or ["no output"])[-1]}
+    result = json.loads(lines[-1])
+    # Pages that stop early never reach perf.finish(); fall back to the AppTest run time
+    if result["import_ms"] is None:
+        result["import_ms"], result["render_ms"] = 0.0, result["run_ms"]
+    result.update(page=page, process_ms=round(wall_ms, 1),
+                  total_ms=round(result["import_ms"] + result["render_ms"], 1))
+    return result
+
+
+def main():
+    import catalog
+    import profiler
+
+    parser = argparse.ArgumentParser(description="Measure each page's cold start in a fresh process.")
+    parser.add_argument("pages", nargs="*", help="Page scripts (default: main.py and pages/*.py)")
+    parser.add_argument("--db", help="Database to open the pages with (default: the first under data/)")
+    parser.add_argument("--runs", type=int, default=1, help="Fresh processes per page; the median is reported")
+    parser.add_argument("--budget-ms", type=float, default=profiler.STARTUP_BUDGET_MS)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, args.db)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="sealtrail-coldstart-")
+    over = []
+    try:
+        db_path = prepare(workdir, args.db or next(iter(catalog.find_databases()), None))
+        print(f"{'page':<36} {'import':>8} {'render':>8} {'total':>8} {'process':>8}")
+        for page in args.pages or PAGES:
+            results = [measure(page, workdir, db_path) for _ in range(max(args.runs, 1))]
+            failed = [r for r in results if "error" in r]
+            if failed:
+                print(f"{page:<36} error: {failed[0]['error']}")
+                over.append(page)
+                continue
+            result = sorted(results, key=lambda r: r["total_ms"])[len(results) // 2]
+            flag = "" if result["total_ms"] <= args.budget_ms else "  over budget"
+            print(f"{page:<36} {result['import_ms']:>8.0f} {result['render_ms']:>8.0f} "
+                  f"{result['total_ms']:>8.0f} {result['process_ms']:>8.0f}{flag}")
+            if flag:
+                over.append(page)
+    finally:
+        if args.keep:
+            print(f"Kept {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    print(f"budget {args.budget_ms:.0f} ms (import + first render)")
+    sys.exit(1 if over else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# data_import.py
+"""File parsing and set-based bulk imports into a SealTrail database."""
+import pandas as pd
+
+import migrations
+
+MAINTENANCE_COLUMNS = ("equipment_id", "description", "date", "technician")
+
+
+# --- FILE PARSING ---
+
+def read_upload(uploaded_file):
+    ext = uploaded_file.name.split(".")[-1].lower()
+    if ext == "csv":
+        df = pd.read_csv(uploaded_file)
+    elif ext == "tsv":
+        df = pd.read_csv(uploaded_file, sep="\t")
+    elif ext in ["xlsx", "xls"]:
+        df = pd.read_excel(uploaded_file)
+    elif ext == "json":
+        df = pd.read_json(uploaded_file)
+    else:
+        raise ValueError(f"Unsupported file type: .{ext}")
+
+    # Normalize column names
+    df.columns = df.columns.astype(str).str.strip()
+    if "Asset_ID" in df.columns and "equipment_id" not in df.columns:
+        df.rename(columns={"Asset_ID": "equipment_id"}, inplace=True)
+    return df
+
+
+# --- MAINTENANCE IMPORT ---
+
+def prepare_maintenance(df):
+    """Map an uploaded sheet onto maintenance_log columns.
+
+    Returns (records, rejected) where rejected holds rows without an
+    equipment ID or a parseable date.
+    """
+    lower = {col.lower(): col for col in df.columns}
+    aliases = {
+        "equipment_id": ["equipment_id", "asset_id", "equipment id", "asset id"],
+        "description": ["description", "work description", "work", "notes"],
+        "date": ["date", "date performed", "date_performed", "service date"],
+        "technician": ["technician", "technician name", "tech"],
+    }
+    out = pd.DataFrame(index=df.index)
+    for target, names in aliases.items():
+        source = next((lower[n] for n in names if n in lower), None)
+        out[target] = df[source] if source else None
+
+    out["equipment_id"] = out["equipment_id"].astype("string").str.strip().fillna("")
+    # Same text form the single-record form stores: str(date) -> YYYY-MM-DD.
+    # Sheets mix formats row to row, so each value is parsed on its own.
+    out["date"] = pd.to_datetime(out["date"], errors="coerce", format="mixed").dt.strftime("%Y-%m-%d")
+    out["description"] = out["description"].astype("string").fillna("")
+    out["technician"] = out["technician"].astype("string").fillna("")
+
+    valid = (out["equipment_id"] != "") & out["date"].notna()
+    return out[valid].reset_index(drop=True), df[~valid]
+
+
+def import_maintenance(conn, records, equipment_table):
+    """Insert maintenance records and move ``last_maintenance_date`` forward
+    for every affected asset in one transaction.
+
+    Records go in with a single executemany. Per-asset latest dates are
+    aggregated in a temp staging table and applied with one UPDATE ... FROM,
+    which probes the LOWER(id) index instead of scanning per asset.
+    """
+    rows = list(records[list(MAINTENANCE_COLUMNS)].itertuples(index=False, name=None))
+    result = {"inserted": 0, "assets_updated": 0}
+    if not rows:
+        return result
+
+    id_column = migrations.table_id_column(conn, equipment_table) if equipment_table else None
+    try:
+        conn.executemany(
+            "INSERT INTO maintenance_log (equipment_id, description, date, technician) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+        result["inserted"] = len(rows)
+
+        if id_column:
+            if "last_maintenance_date" not in migrations.table_columns(conn, equipment_table):
+                conn.execute(f'ALTER TABLE "{equipment_table}" ADD COLUMN last_maintenance_date TEXT')
+
+            conn.execute("DROP TABLE IF EXISTS temp._maint_staging")
+            conn.execute("CREATE TEMP TABLE _maint_staging (id_key TEXT PRIMARY KEY, last_date TEXT)")
+            conn.executemany(
+                """
+                INSERT INTO temp._maint_staging (id_key, last_date) VALUES (LOWER(?), ?)
+                ON CONFLICT(id_key) DO UPDATE SET last_date = MAX(last_date, excluded.last_date)
+                """,
+                ((eid, date) for eid, _, date, _ in rows),
+            )
+            cur = conn.execute(f"""
+                UPDATE "{equipment_table}"
+                SET last_maintenance_date = s.last_date
+                FROM temp._maint_staging AS s
+                WHERE LOWER("{equipment_table}"."{id_column}") = s.id_key
+                  AND ("{equipment_table}".last_maintenance_date IS NULL
+                       OR "{equipment_table}".last_maintenance_date < s.last_date)
+            """)
+            result["assets_updated"] = cur.rowcount
+            conn.execute("DROP TABLE temp._maint_staging")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return result
+
+
+# --- KEYED UPSERT ---
+
+def _sql_type(dtype):
+    if pd.api.types.is_integer_dtype(dtype) or pd.api.types.is_bool_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+
+def upsert_table(conn, df, table, delete_missing=False):
+    """Merge ``df`` into ``table`` on its equipment_id / Asset_ID column.
+
+    The file is loaded into a staging table and merged with
+    INSERT ... ON CONFLICT DO UPDATE; rows whose values are identical are
+    skipped, so write cost follows the number of changed rows. Columns that
+    exist only in the table (e.g. last_maintenance_date) and its indexes are
+    kept. Returns inserted / updated / unchanged / deleted counts.
+    """
+    file_key = next((col for col in df.columns if col.lower() in migrations.ID_COLUMNS), None)
+    if not file_key:
+        raise ValueError("Upsert needs an equipment_id or Asset_ID column in the file.")
+    if df[file_key].isna().any():
+        raise ValueError(f"{df[file_key].isna().sum()} row(s) have no {file_key}.")
+
+    # to_sql converts values exactly as Replace mode would, so comparisons line up
+    staging = "_staging_upsert"
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    if not exists:
+        # Later rows win, as they would when merging into an existing table
+        df = df.drop_duplicates(subset=[file_key], keep="last")
+        df.to_sql(staging, conn, if_exists="replace", index=False)
+        try:
+            # Table, rows and unique index land together or not at all
+            conn.execute("BEGIN")
+            conn.execute(pd.io.sql.get_schema(df, table))
+            conn.execute(f'INSERT INTO "{table}" SELECT * FROM "{staging}"')
+            conn.execute(f'CREATE UNIQUE INDEX "uq_{table}_{file_key}" ON "{table}"("{file_key}")')
+            conn.execute(f'DROP TABLE "{staging}"')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            conn.execute(f'DROP TABLE IF EXISTS "{staging}"')
+            conn.commit()
+            raise
+        return {"inserted": len(df), "updated": 0, "unchanged": 0, "deleted": 0}
+
+    key = migrations.table_id_column(conn, table)
+    if not key:
+        raise ValueError(f"Table '{table}' has no equipment_id / Asset_ID column to merge on.")
+    df = df.rename(columns={file_key: key}).drop_duplicates(subset=[key], keep="last")
+
+    table_cols = migrations.table_columns(conn, table)
+    for col in df.columns:
+        if col not in table_cols:
+            conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{col}" {_sql_type(df[col].dtype)}')
+
+    dupes = conn.execute(f'SELECT COUNT("{key}") - COUNT(DISTINCT "{key}") FROM "{table}"').fetchone()[0]
+    if dupes:
+        raise ValueError(f"Table '{table}' has {dupes} duplicate {key} value(s); use Replace mode or clean it first.")
+    conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "uq_{table}_{key}" ON "{table}"("{key}")')
+
+    df.to_sql(staging, conn, if_exists="replace", index=False)
+    try:
+        cols = list(df.columns)
+        value_cols = [c for c in cols if c != key]
+        col_list = ", ".join(f'"{c}"' for c in cols)
+        differs = " OR ".join(f't."{c}" IS NOT s."{c}"' for c in value_cols) or "0"
+
+        inserted = conn.execute(
+            f'SELECT COUNT(*) FROM "{staging}" s WHERE NOT EXISTS (SELECT 1 FROM "{table}" t WHERE t."{key}" = s."{key}")'
+        ).fetchone()[0]
+        updated = conn.execute(
+            f'SELECT COUNT(*) FROM "{staging}" s JOIN "{table}" t ON t."{key}" = s."{key}" WHERE {differs}'
+        ).fetchone()[0]
+
+        set_clause = ", ".join(f'"{c}" = excluded."{c}"' for c in value_cols)
+        changed = " OR ".join(f'"{table}"."{c}" IS NOT excluded."{c}"' for c in value_cols)
+        on_conflict = f"DO UPDATE SET {set_clause} WHERE {changed}" if value_cols else "DO NOTHING"
+        conn.execute(f"""
+            INSERT INTO "{table}" ({col_list})
+            SELECT {col_list} FROM "{staging}" WHERE true
+            ON CONFLICT("{key}") {on_conflict}
+        """)
+
+        deleted = 0
+        if delete_missing:
+            deleted = conn.execute(
+                f'DELETE FROM "{table}" WHERE "{key}" NOT IN (SELECT "{key}" FROM "{staging}")'
+            ).rowcount
+        conn.execute(f'DROP TABLE "{staging}"')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.execute(f'DROP TABLE IF EXISTS "{staging}"')
+        conn.commit()
+        raise
+
+    return {"inserted": inserted, "updated": updated, "unchanged": len(df) - inserted - updated, "deleted": deleted}
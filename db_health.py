@@ -0,0 +1,271 @@
+# db_health.py
+"""Routine maintenance and health reports for SealTrail databases.
+
+Inventory saves rewrite whole tables, uploads replace them and the history
+tables only grow, so files collect free pages and the query planner runs
+without statistics. ``maintain`` keeps a database compact and its plans
+good without taking it offline:
+
+1. ``PRAGMA quick_check``;
+2. ``ANALYZE`` the first time (with ``analysis_limit``, so it samples
+   instead of reading whole indexes), ``PRAGMA optimize`` afterwards;
+3. ``PRAGMA incremental_vacuum`` in chunks of ``VACUUM_CHUNK`` pages, so
+   the app's writer gets the lock between chunks;
+4. ``PRAGMA wal_checkpoint(TRUNCATE)``, falling back to PASSIVE when
+   readers are active.
+
+Incremental vacuum needs ``auto_vacuum=INCREMENTAL``. New databases get it
+from ``migrations.ensure_schema``; an existing database is converted with
+one full ``VACUUM`` the first time it is maintained while idle.
+
+Each run is logged in the database's ``db_maintenance`` table. The
+scheduler only touches databases that changed since their last run and
+have been idle (no writes) for ``IDLE_SECONDS``:
+
+    python db_health.py --every 3600            # every database under data/, hourly
+    python db_health.py --db data/alice_at_x.com/warehouse.db --force
+    python db_health.py --report                # health table only
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+import catalog
+import migrations
+import timestamps
+
+IDLE_SECONDS = int(os.environ.get("SEALTRAIL_IDLE_SECONDS", 300))
+VACUUM_CHUNK = 2000      # pages per incremental_vacuum step
+ANALYSIS_LIMIT = 1000    # rows sampled per index by ANALYZE
+MIN_FREE_PAGES = 64      # below this, vacuuming is not worth a write
+
+AUTO_VACUUM = {0: "none", 1: "full", 2: "incremental"}
+
+_maintained = {}
+_reports = {}
+
+
+def _connect(db_path):
+    migrations.ensure_schema(db_path)
+    # Autocommit: VACUUM and the PRAGMAs manage their own transactions
+    return sqlite3.connect(db_path, timeout=30, isolation_level=None)
+
+
+def _read_only(db_path):
+    # Reports cover every user's database; reading one must not migrate it
+    return sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True, timeout=30)
+
+
+def _maintenance_logged(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'db_maintenance'").fetchone()
+
+
+def idle_for(db_path):
+    """Seconds since the database (or its WAL) was last written."""
+    stamps = [os.stat(p).st_mtime for p in (db_path, f"{db_path}-wal") if os.path.exists(p)]
+    return time.time() - max(stamps) if stamps else 0.0
+
+
+# --- REPORT ---
+
+def page_stats(conn):
+    """Fragmentation (percentage of b-tree pages that do not directly follow
+    the previous page of the same tree, as sqlite3_analyzer reports it) and
+    the share of unused bytes inside used pages, which only a VACUUM
+    reclaims. Reads every page; Nones when SQLite was built without the
+    dbstat table."""
+    try:
+        rows = conn.execute("SELECT name, pageno, pgsize, unused FROM dbstat ORDER BY name, path").fetchall()
+    except sqlite3.OperationalError:
+        return {"fragmentation_pct": None, "unused_pct": None}
+    if not rows:
+        return {"fragmentation_pct": 0.0, "unused_pct": 0.0}
+    jumps, prev = 0, (None, None)
+    for name, pageno, _, _ in rows:
+        if name == prev[0] and pageno != prev[1] + 1:
+            jumps += 1
+        prev = (name, pageno)
+    return {
+        "fragmentation_pct": round(100 * jumps / len(rows), 1),
+        "unused_pct": round(100 * sum(r[3] for r in rows) / sum(r[2] for r in rows), 1),
+    }
+
+
+def report(db_path, detailed=False):
+    """Size, free pages and maintenance state of one database. ``detailed``
+    adds ``page_stats``, which reads the whole file. Cached until the
+    database changes."""
+    key = (os.path.abspath(db_path), detailed)
+    stamp = migrations.db_fingerprint(db_path)
+    cached = _reports.get(key)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    conn = _read_only(db_path)
+    try:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        last = (None, None)   # never maintained (or not migrated yet)
+        if _maintenance_logged(conn):
+            last = conn.execute(
+                "SELECT run_at, integrity FROM db_maintenance ORDER BY id DESC LIMIT 1").fetchone() or last
+        row = {
+            "owner": os.path.basename(os.path.dirname(os.path.abspath(db_path))),
+            "database": os.path.basename(db_path),
+            "size_mb": round(pages * page_size / 1024 / 1024, 2),
+            "wal_mb": round(os.path.getsize(f"{db_path}-wal") / 1024 / 1024, 2) if os.path.exists(f"{db_path}-wal") else 0.0,
+            "free_pages": free,
+            "free_pct": round(100 * free / pages, 1) if pages else 0.0,
+            "reclaimable_mb": round(free * page_size / 1024 / 1024, 2),
+            "auto_vacuum": AUTO_VACUUM.get(conn.execute("PRAGMA auto_vacuum").fetchone()[0]),
+            "analyzed": bool(conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()),
+            "last_maintenance": last[0],
+            "integrity": last[1],
+            "path": db_path,
+        }
+        if detailed:
+            row.update(page_stats(conn))
+    finally:
+        conn.close()
+    _reports[key] = (stamp, row)
+    return row
+
+
+def overview(databases=None):
+    return pd.DataFrame([report(db) for db in databases or catalog.find_databases()])
+
+
+def history(db_path, limit=20):
+    conn = _read_only(db_path)
+    try:
+        if not _maintenance_logged(conn):
+            return pd.DataFrame(columns=["id", "run_at", "seconds", "integrity", "freed_pages", "checkpoint", "detail"])
+        return pd.read_sql_query("SELECT * FROM db_maintenance ORDER BY id DESC LIMIT ?", conn, params=[limit])
+    finally:
+        conn.close()
+
+
+# --- MAINTENANCE ---
+
+def _vacuum_incremental(conn, progress=None):
+    freed = 0
+    while True:
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free == 0:
+            return freed
+        # Each call is its own short write transaction; stepping the result runs it
+        conn.execute(f"PRAGMA incremental_vacuum({min(free, VACUUM_CHUNK)})").fetchall()
+        freed += free - conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if progress:
+            progress(freed, free)
+
+
+def maintain(db_path, convert=True, progress=None):
+    """One maintenance pass over ``db_path``. Returns the logged result."""
+    t0 = time.perf_counter()
+    conn = _connect(db_path)
+    notes = []
+    try:
+        integrity = "; ".join(r[0] for r in conn.execute("PRAGMA quick_check(20)"))
+
+        conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        analyzed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+        conn.execute("PRAGMA optimize" if analyzed else "ANALYZE")
+        notes.append("optimize" if analyzed else "analyze")
+
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        freed = 0
+        if mode != 2 and convert and integrity == "ok":
+            # auto_vacuum only changes with a full rebuild; done once, while the database is idle
+            pages_before = conn.execute("PRAGMA page_count").fetchone()[0]
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            freed = pages_before - conn.execute("PRAGMA page_count").fetchone()[0]
+            notes.append("converted to incremental auto_vacuum")
+        elif mode == 2 and free_before >= MIN_FREE_PAGES:
+            freed = _vacuum_incremental(conn, progress)
+
+        busy, log_pages, done = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        if busy:
+            busy, log_pages, done = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        checkpoint = f"{done}/{log_pages} frames" if log_pages >= 0 else "not in WAL mode"
+
+        result = {
+            "run_at": timestamps.now(),
+            "seconds": round(time.perf_counter() - t0, 2),
+            "integrity": integrity,
+            "freed_pages": freed,
+            "checkpoint": checkpoint,
+            "detail": ", ".join(notes),
+        }
+        conn.execute(
+            "INSERT INTO db_maintenance (run_at, seconds, integrity, freed_pages, checkpoint, detail) VALUES (?, ?, ?, ?, ?, ?)",
+            tuple(result.values()),
+        )
+    finally:
+        conn.close()
+    _maintained[os.path.abspath(db_path)] = migrations.db_fingerprint(db_path)
+    catalog.forget(db_path)
+    return result
+
+
+def due(db_path, idle_seconds=IDLE_SECONDS):
+    """Whether the scheduler should maintain ``db_path`` now: it changed
+    since the last run in this process and nothing wrote to it for
+    ``idle_seconds``."""
+    if _maintained.get(os.path.abspath(db_path)) == migrations.db_fingerprint(db_path):
+        return False
+    return idle_for(db_path) >= idle_seconds
+
+
+def run_due(databases=None, idle_seconds=IDLE_SECONDS, force=False, convert=True):
+    """Maintain every database that is ``due`` (all of them with ``force``).
+    Returns {db_path: result or error message}."""
+    results = {}
+    for db_path in databases or catalog.find_databases():
+        if not force and not due(db_path, idle_seconds):
+            continue
+        try:
+            results[db_path] = maintain(db_path, convert=convert)
+        except sqlite3.Error as e:
+            results[db_path] = f"{type(e).__name__}: {e}"
+    return results
+
+
+# --- CLI ---
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain SealTrail databases while they are idle.")
+    parser.add_argument("--db", action="append", help="Database (repeatable; default: all under data/)")
+    parser.add_argument("--every", type=float, help="Repeat every N seconds")
+    parser.add_argument("--idle", type=float, default=IDLE_SECONDS, help="Seconds without writes before a database is maintained")
+    parser.add_argument("--force", action="store_true", help="Maintain even if not idle or unchanged")
+    parser.add_argument("--no-convert", action="store_true", help="Do not VACUUM databases into incremental auto_vacuum")
+    parser.add_argument("--report", action="store_true", help="Print the health report (with fragmentation) and exit")
+    args = parser.parse_args()
+
+    if args.report:
+        databases = args.db or catalog.find_databases()
+        df = pd.DataFrame([report(db, detailed=True) for db in databases])
+        print(df.drop(columns="path").to_string(index=False) if not df.empty else "No databases found.")
+        return
+
+    while True:
+        for db_path, result in run_due(args.db, args.idle, args.force, not args.no_convert).items():
+            if isinstance(result, str):
+                print(f"{db_path}: failed: {result}")
+            else:
+                print(f"{db_path}: {result['integrity']}, freed {result['freed_pages']} page(s), "
+                      f"checkpoint {result['checkpoint']}, {result['detail']} in {result['seconds']}s")
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
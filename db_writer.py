@@ -0,0 +1,202 @@
+# db_writer.py
+"""Single-writer queue per database.
+
+Every write to a given ``.db`` file goes through one writer thread. SQL
+writes queued close together are grouped into one transaction, callers
+get ``concurrent.futures.Future`` objects back, and "database is locked"
+errors (e.g. from another process) are retried with exponential backoff
+instead of surfacing to the user.
+
+    db_writer.submit(db_path, "INSERT INTO scanned_items (...) VALUES (?, ?, ?, ?)", row)
+    db_writer.submit(db_path, sql, rows, many=True).result()
+    db_writer.run(db_path, lambda conn: ...)   # callable runs in its own transaction
+"""
+import logging
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import migrations
+import profiler
+
+logger = logging.getLogger("sealtrail.db_writer")
+
+MAX_BATCH = 200
+FLUSH_SECONDS = 0.01
+MAX_RETRIES = 6
+BACKOFF_BASE = 0.05
+
+_writers = {}
+_writers_lock = threading.Lock()
+_STOP = object()
+
+
+def is_lock_error(exc):
+    msg = str(exc).lower()
+    return isinstance(exc, sqlite3.OperationalError) and ("locked" in msg or "busy" in msg)
+
+
+class _Op:
+    __slots__ = ("sql", "params", "many", "fn", "future")
+
+    def __init__(self, sql=None, params=(), many=False, fn=None):
+        self.sql = sql
+        self.params = params
+        self.many = many
+        self.fn = fn
+        self.future = Future()
+
+    def apply(self, conn):
+        if self.fn is not None:
+            return self.fn(conn)
+        cur = conn.executemany(self.sql, self.params) if self.many else conn.execute(self.sql, self.params)
+        return cur.rowcount if self.many else (cur.lastrowid if cur.lastrowid else cur.rowcount)
+
+
+class DBWriter(threading.Thread):
+    def __init__(self, db_path):
+        super().__init__(name=f"db-writer-{os.path.basename(db_path)}", daemon=True)
+        self.db_path = db_path
+        self.queue = queue.Queue()
+        self.stats = {"ops": 0, "batches": 0, "retries": 0, "failed": 0}
+        self._conn = None
+
+    def submit(self, op):
+        self.queue.put(op)
+        return op.future
+
+    # --- writer thread ---
+
+    def _connect(self):
+        migrations.ensure_schema(self.db_path)
+        conn = profiler.connect(self.db_path, timeout=5)
+        # WAL lets page reads proceed while this thread writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def run(self):
+        pending = None
+        while True:
+            op = pending or self.queue.get()
+            pending = None
+            if op is _STOP:
+                if self._conn is not None:
+                    self._conn.close()
+                return
+            batch = [op]
+            # Callables manage their own statements; run them alone
+            if op.fn is None:
+                deadline = time.monotonic() + FLUSH_SECONDS
+                while len(batch) < MAX_BATCH:
+                    try:
+                        nxt = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if nxt is _STOP or nxt.fn is not None:
+                        pending = nxt
+                        break
+                    batch.append(nxt)
+            self._process(batch)
+
+    def _process(self, batch):
+        try:
+            if self._conn is None:
+                self._conn = self._connect()
+            results = self._with_retry(lambda: self._transaction(batch))
+        except Exception as exc:
+            if len(batch) > 1 and not is_lock_error(exc):
+                # One bad statement shouldn't sink the whole batch: isolate it
+                for op in batch:
+                    self._process([op])
+                return
+            self.stats["failed"] += len(batch)
+            for op in batch:
+                op.future.set_exception(exc)
+            return
+        self.stats["ops"] += len(batch)
+        self.stats["batches"] += 1
+        for op, result in zip(batch, results):
+            op.future.set_result(result)
+
+    def _transaction(self, batch):
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            results = [op.apply(conn) for op in batch]
+            conn.commit()
+            return results
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _with_retry(self, fn):
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                return fn()
+            except sqlite3.OperationalError as exc:
+                if not is_lock_error(exc) or attempt == MAX_RETRIES:
+                    raise
+                self.stats["retries"] += 1
+                delay = BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random())
+                logger.info("%s locked, retrying in %.2fs", self.db_path, delay)
+                time.sleep(delay)
+
+
+# --- PUBLIC API ---
+
+def get_writer(db_path):
+    key = os.path.abspath(db_path)
+    writer = _writers.get(key)
+    if writer is None:
+        with _writers_lock:
+            writer = _writers.get(key)
+            if writer is None:
+                writer = DBWriter(key)
+                writer.start()
+                _writers[key] = writer
+    return writer
+
+
+def submit(db_path, sql, params=(), many=False):
+    """Queue one statement (or an executemany). Returns a Future with the
+    lastrowid / rowcount."""
+    return get_writer(db_path).submit(_Op(sql, params, many))
+
+
+def run(db_path, fn, wait=True):
+    """Run ``fn(conn)`` on the writer thread inside its own transaction.
+
+    ``fn`` may commit or roll back itself (e.g. data_import helpers); if it
+    leaves a transaction open it is committed afterwards.
+    """
+    future = get_writer(db_path).submit(_Op(fn=fn))
+    return future.result() if wait else future
+
+
+def close(db_path):
+    """Flush and stop the writer for a database that is being deleted."""
+    with _writers_lock:
+        writer = _writers.pop(os.path.abspath(db_path), None)
+    if writer is not None:
+        writer.queue.put(_STOP)
+        writer.join(timeout=10)
+
+
+def _forget_after_fork():
+    # A forked child (job or decode process pool) inherits the registry but not
+    # the writer threads; waiting on their queues would block forever
+    global _writers_lock
+    _writers.clear()
+    _writers_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_after_fork)
+
+
+def stats():
+    return {os.path.basename(k): {**w.stats, "queued": w.queue.qsize()} for k, w in _writers.items()}
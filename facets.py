@@ -0,0 +1,171 @@
+# facets.py
+"""Distinct values and their counts per column, for dropdowns and filters.
+
+``facet_values`` holds one row per (table, column, value) with the number
+of rows carrying that value, and is kept current by triggers on insert,
+update and delete, so filter options and form dropdowns are an index range
+read instead of a ``unique()`` pass over the whole table on every rerun.
+
+Faceted columns are recorded in ``facet_columns``:
+
+* the app tables' low-cardinality columns (``APP_FACETS``), from migration 7;
+* every column of a working table except its ID column that has at most
+  ``MAX_DISTINCT`` distinct values when the schema last changed.
+
+Working tables get their triggers from a ``migrations.ensure_triggers``
+hook, which runs again when the database's schema changes (upload, added
+column) and rebuilds the counts of any table whose triggers had to be
+recreated. ``options`` and ``counts`` call it, so callers only read.
+
+    facets.options(db_path, "equipment", ["status", "location"])
+    # {"status": ["active", "repair"], "location": ["Dock 1", ...]}
+
+A column that is not faceted is missing from the result; callers fall back
+to treating it as free text.
+"""
+import os
+
+import pandas as pd
+
+import migrations
+import profiler
+
+APP_FACETS = {
+    "maintenance_log": ("technician",),
+    "scanned_items": ("scanned_by", "location"),
+    "audit_log": ("user", "action"),
+}
+MAX_DISTINCT = 500
+
+_options = {}
+
+
+# --- TRIGGERS ---
+
+def trigger_sql(table, columns):
+    """{trigger name: CREATE TRIGGER statement} maintaining ``columns`` of ``table``."""
+    if not columns:
+        return {}
+
+    def add(ref, c):
+        return (f"    INSERT INTO facet_values (tbl, col, value, count) SELECT '{table}', '{c}', {ref}.\"{c}\", 1 "
+                f"WHERE {ref}.\"{c}\" IS NOT NULL\n"
+                f"        ON CONFLICT(tbl, col, value) DO UPDATE SET count = count + 1;\n")
+
+    def remove(ref, c):
+        match = f"tbl = '{table}' AND col = '{c}' AND value = {ref}.\"{c}\""
+        return (f"    UPDATE facet_values SET count = count - 1 WHERE {match};\n"
+                f"    DELETE FROM facet_values WHERE {match} AND count <= 0;\n")
+
+    quoted = ", ".join(f'"{c}"' for c in columns)
+    changed = " OR ".join(f'OLD."{c}" IS NOT NEW."{c}"' for c in columns)
+    return {
+        f"facets_{table}_insert": (
+            f'CREATE TRIGGER "facets_{table}_insert" AFTER INSERT ON "{table}" BEGIN\n'
+            + "".join(add("NEW", c) for c in columns) + "END"
+        ),
+        f"facets_{table}_update": (
+            f'CREATE TRIGGER "facets_{table}_update" AFTER UPDATE OF {quoted} '
+            f'ON "{table}" WHEN {changed} BEGIN\n'
+            + "".join(remove("OLD", c) + add("NEW", c) for c in columns) + "END"
+        ),
+        f"facets_{table}_delete": (
+            f'CREATE TRIGGER "facets_{table}_delete" AFTER DELETE ON "{table}" BEGIN\n'
+            + "".join(remove("OLD", c) for c in columns) + "END"
+        ),
+    }
+
+
+def _working_columns(conn, table):
+    """Columns of a working table with few enough distinct values to facet."""
+    id_col = migrations.table_id_column(conn, table)
+    columns = [c for c in migrations.table_columns(conn, table) if c != id_col]
+    if not columns:
+        return []
+    # COUNT(DISTINCT) of a capped sub-select stops reading a column once it is over the limit
+    row = conn.execute("SELECT " + ", ".join(
+        f'(SELECT COUNT(*) FROM (SELECT DISTINCT "{c}" FROM "{table}" WHERE "{c}" IS NOT NULL LIMIT {MAX_DISTINCT + 1}))'
+        for c in columns)).fetchone()
+    return [c for c, n in zip(columns, row) if n <= MAX_DISTINCT]
+
+
+def _rebuild(conn, table, columns):
+    conn.execute("DELETE FROM facet_values WHERE tbl = ?", (table,))
+    conn.execute("DELETE FROM facet_columns WHERE tbl = ?", (table,))
+    for c in columns:
+        conn.execute(f"""
+            INSERT INTO facet_values (tbl, col, value, count)
+            SELECT ?, ?, "{c}", COUNT(*) FROM "{table}" WHERE "{c}" IS NOT NULL GROUP BY "{c}"
+        """, (table, c))
+    conn.executemany("INSERT INTO facet_columns (tbl, col) VALUES (?, ?)", [(table, c) for c in columns])
+
+
+def ensure_triggers(conn, table, columns=None):
+    """Create or refresh the facet triggers of one table (a working table's
+    columns are chosen by cardinality), rebuilding its counts when they
+    changed. Returns True when they did."""
+    if columns is None:
+        columns = _working_columns(conn, table)
+    if not migrations.replace_triggers(conn, table, "facets", trigger_sql(table, columns)):
+        return False
+    _rebuild(conn, table, columns)
+    return True
+
+
+def _hook(conn, tables):
+    changed = [t for t in tables if ensure_triggers(conn, t)]
+    # Facets of tables that were dropped
+    conn.execute("DELETE FROM facet_values WHERE tbl NOT IN (SELECT name FROM sqlite_master WHERE type = 'table')")
+    conn.execute("DELETE FROM facet_columns WHERE tbl NOT IN (SELECT name FROM sqlite_master WHERE type = 'table')")
+    return changed
+
+
+migrations.register_triggers("facets", _hook)
+
+
+# --- READS ---
+
+def options(db_path, table, columns=None):
+    """{column: sorted distinct values} for the faceted ``columns`` of
+    ``table`` (all faceted columns when None). Cached until the database
+    changes."""
+    migrations.ensure_triggers(db_path)
+    key = (os.path.abspath(db_path), table)
+    stamp = migrations.db_fingerprint(db_path)
+    cached = _options.get(key)
+    if cached is None or cached[0] != stamp:
+        conn = profiler.connect(db_path)
+        try:
+            with profiler.timed("load", f"{table} (facets)", db=db_path) as info:
+                faceted = [r[0] for r in conn.execute("SELECT col FROM facet_columns WHERE tbl = ? ORDER BY rowid", (table,))]
+                found = {c: [] for c in faceted}
+                for col, value in conn.execute(
+                    "SELECT col, value FROM facet_values WHERE tbl = ? ORDER BY col, value", (table,)
+                ):
+                    if col in found:
+                        found[col].append(value)
+                info["rows"] = sum(len(v) for v in found.values())
+        finally:
+            conn.close()
+        cached = _options[key] = (stamp, found)
+    found = cached[1]
+    return {c: found[c] for c in (columns if columns is not None else found) if c in found}
+
+
+def counts(db_path, table, column):
+    """DataFrame of value, count for one faceted column, most frequent first."""
+    migrations.ensure_triggers(db_path)
+    conn = profiler.connect(db_path)
+    try:
+        return pd.read_sql_query(
+            "SELECT value, count FROM facet_values WHERE tbl = ? AND col = ? ORDER BY count DESC, value",
+            conn, params=[table, column])
+    finally:
+        conn.close()
+
+
+# --- MIGRATION ---
+
+def create_app_facets(conn):
+    for table, columns in APP_FACETS.items():
+        ensure_triggers(conn, table, list(columns))
@@ -0,0 +1,259 @@
+# forecast.py
+"""Precomputed maintenance forecasts for every database.
+
+The Predictive Maintenance page used to fit and predict on every rerun,
+for one database at a time. This batch job walks every database under
+``data/`` in a process pool (one task per database), refreshes the
+reliability model (reliability.py) of each working table, predicts next
+due dates with the intervals in maintenance_settings.yaml and stores the
+result in ``maintenance_forecast``:
+
+    table_name, id_key          working table and LOWER(TRIM(id))
+    equipment_id, equipment_type
+    last_maintenance, next_due  ISO dates
+    interval_days               configured interval
+    learned_interval_days       interval learned from the fleet history
+    days_remaining              as of the run's date
+    status                      Overdue / Due Soon / On Schedule / Never Serviced
+
+``maintenance_forecast_state`` records what a forecast was computed from
+(date, data versions of maintenance_log and the working table, settings);
+``load`` only returns a stored forecast while all of those still hold, so
+pages fall back to a live prediction after any write to the maintenance
+log or the equipment table (edits and same-size uploads included), a
+settings change or at midnight. The job also writes one combined CSV report of
+due and overdue equipment across all databases.
+
+    python forecast.py                                  # every database, report in data/_reports/
+    python forecast.py --db data/alice_at_x.com/warehouse.db --all
+    python forecast.py --workers 4 --every 86400
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime
+
+import pandas as pd
+import yaml
+
+import catalog
+import migrations
+import reliability
+import timestamps
+
+SETTINGS_FILE = "maintenance_settings.yaml"
+REPORT_DIR = os.path.join("data", "_reports")
+DUE_STATUSES = ("Overdue", "Due Soon")
+EMOJI = {"Overdue": "🔴", "Due Soon": "🟠", "On Schedule": "🟢", "Never Serviced": "⚪"}
+
+_COLUMNS = {
+    "Equipment ID": "equipment_id",
+    "Equipment Type": "equipment_type",
+    "Last Maintenance": "last_maintenance",
+    "Interval (days)": "interval_days",
+    "Avg Historical Interval": "avg_interval_days",
+    "Learned Interval (days)": "learned_interval_days",
+    "Next Due": "next_due",
+    "Days Remaining": "days_remaining",
+    "Predicted Status": "status",
+}
+
+
+def load_settings():
+    if os.path.exists(SETTINGS_FILE):
+        with open(SETTINGS_FILE) as f:
+            return yaml.safe_load(f) or {}
+    return {}
+
+
+def working_tables(conn):
+    """Uploaded tables with an equipment ID column."""
+    names = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+    return [t for t in names
+            if t not in migrations.APP_TABLES and not t.startswith("_") and migrations.table_id_column(conn, t)]
+
+
+# --- STORAGE ---
+
+def _source(conn, table, table_settings, use_learned):
+    """What a forecast of ``table`` depends on, compared by ``load``."""
+    return {
+        "as_of": date.today().isoformat(),
+        "log_version": migrations.table_version(conn, "maintenance_log"),
+        "settings": json.dumps(table_settings or {}, sort_keys=True, default=str),
+        "equipment_version": migrations.table_version(conn, table),
+        "use_learned": int(bool(use_learned)),
+    }
+
+
+def store(conn, table, result_df, table_settings, use_learned=True):
+    """Replace the stored forecast of ``table`` with ``result_df`` (the
+    output of ``reliability.predict``). Commits."""
+    source = _source(conn, table, table_settings, use_learned)
+    df = result_df.rename(columns=_COLUMNS)
+    df["id_key"] = df["equipment_id"].astype(str).str.strip().str.lower()
+    df["status"] = df["status"].str.split(" ", n=1).str[1]
+    for col in ("last_maintenance", "next_due"):
+        df[col] = df[col].astype(str).where(df[col].notna(), None)
+    df = df.drop_duplicates("id_key", keep="last")
+    df = df.astype(object).where(df.notna(), None)
+    cols = ["id_key", *_COLUMNS.values()]
+    conn.execute("DELETE FROM maintenance_forecast WHERE table_name = ?", (table,))
+    conn.executemany(
+        f"INSERT INTO maintenance_forecast (table_name, {', '.join(cols)}) VALUES (?{', ?' * len(cols)})",
+        [(table, *row) for row in df[cols].itertuples(index=False)],
+    )
+    conn.execute(
+        """INSERT OR REPLACE INTO maintenance_forecast_state
+           (table_name, computed_at, as_of, log_version, settings, equipment_version, use_learned)
+           VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        (table, timestamps.now(), *source.values()),
+    )
+    conn.commit()
+    return len(df)
+
+
+def state(conn, table):
+    row = conn.execute(
+        "SELECT computed_at, as_of, log_version, settings, equipment_version, use_learned "
+        "FROM maintenance_forecast_state WHERE table_name = ?", (table,)).fetchone()
+    if not row:
+        return None
+    return dict(zip(("computed_at", "as_of", "log_version", "settings", "equipment_version", "use_learned"), row))
+
+
+def load(conn, table, table_settings, use_learned=True):
+    """The stored forecast of ``table`` in ``reliability.predict``'s layout,
+    or None when there is none or it is out of date."""
+    stored = state(conn, table)
+    if not stored:
+        return None
+    current = _source(conn, table, table_settings, use_learned)
+    # No version means no version triggers yet: nothing proves the forecast current
+    if None in (current["log_version"], current["equipment_version"]) or any(stored[k] != v for k, v in current.items()):
+        return None
+    df = pd.read_sql_query(
+        f"SELECT {', '.join(_COLUMNS.values())} FROM maintenance_forecast WHERE table_name = ? ORDER BY rowid",
+        conn, params=[table])
+    for col in ("last_maintenance", "next_due"):
+        df[col] = pd.to_datetime(df[col], errors="coerce").dt.date
+    for col in ("avg_interval_days", "days_remaining"):
+        df[col] = df[col].astype("Int64")
+    df["status"] = df["status"].map(lambda s: f"{EMOJI.get(s, '')} {s}")
+    return df.rename(columns={v: k for k, v in _COLUMNS.items()})
+
+
+def summary(conn, table):
+    """Equipment count per status of the stored forecast (whatever its age)
+    and when it was computed: ({status: count}, computed_at or None)."""
+    stored = state(conn, table)
+    counts = dict(conn.execute(
+        "SELECT status, COUNT(*) FROM maintenance_forecast WHERE table_name = ? GROUP BY status", (table,)))
+    return counts, stored["computed_at"] if stored else None
+
+
+# --- BATCH ---
+
+def forecast_table(conn, table, table_settings, use_learned=True):
+    """Refresh the model of ``table``, predict and store. Returns the forecast."""
+    id_col = migrations.table_id_column(conn, table)
+    type_col = migrations.table_type_column(conn, table)
+    reliability.refresh(conn, table)
+    type_params, asset_params = reliability.load_params(conn, table)
+    cols = ", ".join(f'"{c}"' for c in (id_col, type_col) if c)
+    equipment_df = pd.read_sql_query(f'SELECT {cols} FROM "{table}"', conn)
+    result_df = reliability.predict(equipment_df, id_col, type_col, type_params, asset_params, table_settings, use_learned)
+    store(conn, table, result_df, table_settings, use_learned)
+    return result_df
+
+
+def forecast_database(db_path, settings, use_learned=True):
+    """Runs in a worker process. Returns (db_path, forecast rows, per-table counts)."""
+    # Version triggers on the working tables, which the stored forecasts are keyed on
+    migrations.ensure_triggers(db_path)
+    conn = sqlite3.connect(db_path, timeout=30)
+    frames, counts = [], {}
+    try:
+        for table in working_tables(conn):
+            df = forecast_table(conn, table, settings.get(table, {}), use_learned)
+            counts[table] = df["Predicted Status"].str.split(" ", n=1).str[1].value_counts().to_dict()
+            frames.append(df.assign(table=table))
+    finally:
+        conn.close()
+    rows = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    return db_path, rows, counts
+
+
+def run(databases=None, workers=None, use_learned=True):
+    """Forecast every database in parallel. Returns (combined DataFrame, {db_path: counts or error})."""
+    settings = load_settings()
+    databases = databases or catalog.find_databases()
+    frames, results = [], {}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = {pool.submit(forecast_database, db, settings, use_learned): db for db in databases}
+        for future in as_completed(futures):
+            db_path = futures[future]
+            try:
+                _, rows, counts = future.result()
+            except Exception as e:
+                results[db_path] = f"{type(e).__name__}: {e}"
+                continue
+            results[db_path] = counts
+            if not rows.empty:
+                owner = os.path.basename(os.path.dirname(os.path.abspath(db_path)))
+                frames.append(rows.assign(owner=owner, database=os.path.basename(db_path)))
+    combined = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if not combined.empty:
+        combined = combined[["owner", "database", "table"] + list(_COLUMNS)]
+    return combined, results
+
+
+def write_report(combined, path=None, include_all=False):
+    """Combined CSV of due and overdue equipment (everything with ``include_all``),
+    most overdue first."""
+    path = path or os.path.join(REPORT_DIR, f"forecast-{datetime.now():%Y%m%dT%H%M%S}.csv")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    df = combined
+    if not df.empty:
+        if not include_all:
+            df = df[df["Predicted Status"].str.split(" ", n=1).str[1].isin(DUE_STATUSES)]
+        df = df.sort_values(["Days Remaining", "owner", "database"], na_position="last")
+    df.to_csv(path, index=False)
+    return path, len(df)
+
+
+# --- CLI ---
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute maintenance forecasts for every database.")
+    parser.add_argument("--db", action="append", help="Database to forecast (repeatable; default: all under data/)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--configured", action="store_true", help="Use the configured intervals instead of learned ones")
+    parser.add_argument("--report", help="CSV report path (default data/_reports/forecast-<time>.csv)")
+    parser.add_argument("--all", action="store_true", help="Include on-schedule and never-serviced equipment in the report")
+    parser.add_argument("--every", type=float, help="Repeat every N seconds")
+    args = parser.parse_args()
+
+    while True:
+        t0 = time.perf_counter()
+        combined, results = run(args.db, args.workers, use_learned=not args.configured)
+        for db_path, counts in sorted(results.items()):
+            if isinstance(counts, str):
+                print(f"{db_path}: failed: {counts}")
+                continue
+            for table, by_status in counts.items():
+                detail = ", ".join(f"{by_status.get(s, 0)} {s.lower()}" for s in EMOJI)
+                print(f"{db_path} [{table}]: {detail}")
+        path, rows = write_report(combined, args.report, args.all)
+        print(f"{len(results)} database(s) in {time.perf_counter() - t0:.1f}s; {rows} row(s) -> {path}")
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# fuzzy.py
+"""Fuzzy equipment ID resolution for misread barcodes and typos.
+
+IDs are indexed by their single-character deletions (symmetric-delete
+index): two IDs within one substitution, insertion, deletion or adjacent
+swap share a deletion variant, so a lookup is a handful of dict probes plus
+a cheap check on the few candidates, independent of fleet size. Sharing a
+variant also bounds the distance at 2, which is as far as matches go.
+A BK-tree was the other option, but in pure Python it still computes edit
+distance against a sizeable share of the tree per query.
+
+IDs are compared case-insensitively with separators ignored, so "eqp 001"
+resolves to "EQP-001" at distance 0.
+
+    index = fuzzy.get_index(db_path, table, equipment_df[id_col])
+    index.match("EQP-0O1")   # [("EQP-001", 1)]
+"""
+import re
+import sqlite3
+import threading
+
+import migrations
+
+_SEPARATORS = re.compile(r"[\s\-_./]+")
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def normalize(value):
+    return _SEPARATORS.sub("", str(value)).upper()
+
+
+def _deletes(key):
+    return {key[:i] + key[i + 1:] for i in range(len(key))} | {key}
+
+
+def _within_one(a, b):
+    """True if ``a`` and ``b`` differ by one substitution, insertion,
+    deletion or adjacent swap."""
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(diff) == 1 or (
+            len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]])
+    if abs(len(a) - len(b)) != 1:
+        return False
+    short, long_ = (a, b) if len(a) < len(b) else (b, a)
+    i = next((i for i in range(len(short)) if short[i] != long_[i]), len(short))
+    return short[i:] == long_[i + 1:]
+
+
+def distance(a, b):
+    """Edit distance between two keys that share a deletion variant (0-2)."""
+    if a == b:
+        return 0
+    return 1 if _within_one(a, b) else 2
+
+
+class IDIndex:
+    def __init__(self, ids=()):
+        self._ids = {}        # original ID -> normalized key
+        self._keys = {}       # normalized key -> set of original IDs
+        self._variants = {}   # deletion variant -> set of normalized keys
+        for value in ids:
+            self.add(value)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, value):
+        value = str(value).strip()
+        if not value or value in self._ids:
+            return
+        key = normalize(value)
+        self._ids[value] = key
+        if key not in self._keys:
+            self._keys[key] = set()
+            for variant in _deletes(key):
+                self._variants.setdefault(variant, set()).add(key)
+        self._keys[key].add(value)
+
+    def discard(self, value):
+        value = str(value).strip()
+        key = self._ids.pop(value, None)
+        if key is None:
+            return
+        self._keys[key].discard(value)
+        if not self._keys[key]:
+            del self._keys[key]
+            for variant in _deletes(key):
+                keys = self._variants.get(variant)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._variants[variant]
+
+    def sync(self, ids):
+        """Apply only the difference between the indexed IDs and ``ids``."""
+        current = {str(v).strip() for v in ids}
+        current.discard("")
+        for value in self._ids.keys() - current:
+            self.discard(value)
+        for value in current - self._ids.keys():
+            self.add(value)
+
+    def exact(self, query):
+        """The stored ID equal to ``query`` ignoring case and separators."""
+        matches = self._keys.get(normalize(query))
+        return min(matches) if matches else None
+
+    def match(self, query, limit=5, max_distance=2):
+        """Closest IDs as (id, distance) pairs, nearest first."""
+        key = normalize(query)
+        if not key:
+            return []
+        candidates = set()
+        for variant in _deletes(key):
+            candidates |= self._variants.get(variant, set())
+        scored = []
+        for cand in candidates:
+            d = distance(key, cand)
+            if d <= max_distance:
+                scored.extend((value, d) for value in self._keys[cand])
+        scored.sort(key=lambda m: (m[1], m[0]))
+        return scored[:limit]
+
+
+def _table_version(db_path, table):
+    conn = sqlite3.connect(db_path, timeout=5)
+    try:
+        return migrations.table_version(conn, table)
+    except sqlite3.OperationalError:
+        return None   # not migrated yet: no table_versions
+    finally:
+        conn.close()
+
+
+def get_index(db_path, table, ids):
+    """Process-wide index for one equipment table.
+
+    ``ids`` is the current ID column (or a callable returning it). The index
+    is only re-synced, incrementally, when the table's data version
+    (migrations.table_version) has changed since the last call; writes to
+    other tables, such as audit events, cost one stat and one version read.
+    """
+    stamp = migrations.db_fingerprint(db_path)
+    with _lock:
+        entry = _indexes.get((db_path, table))
+        if entry is not None and entry[1] == stamp:
+            return entry[0]
+        version = _table_version(db_path, table)
+        if entry is None:
+            entry = (IDIndex(ids() if callable(ids) else ids), stamp, version)
+        elif version is None or entry[2] != version:
+            entry[0].sync(ids() if callable(ids) else ids)
+            entry = (entry[0], stamp, version)
+        else:
+            entry = (entry[0], stamp, version)
+        _indexes[(db_path, table)] = entry
+    return entry[0]
@@ -0,0 +1,114 @@
+# job_tasks.py
+"""Long-running operations submitted through jobs.py.
+
+Each task takes a ``jobs.JobContext`` first and returns an artifact path,
+a message, or (path, message). They are module-level so they can run in
+the process pool.
+"""
+import io
+import os
+import sqlite3
+from zipfile import ZipFile
+
+import pandas as pd
+
+import backup
+import data_import
+import db_health
+import db_writer
+import migrations
+import reliability
+
+
+def _connect(db_path):
+    migrations.ensure_schema(db_path)
+    return sqlite3.connect(db_path, timeout=30)
+
+
+# --- IMPORTS ---
+
+def import_file(ctx, file_bytes, filename, db_path, table, mode="upsert", delete_missing=False):
+    ctx.progress(0.05, f"Parsing {filename}")
+    buf = io.BytesIO(file_bytes)
+    buf.name = filename
+    df = data_import.read_upload(buf)
+
+    ctx.progress(0.5, f"Writing {len(df)} rows to '{table}'")
+    if mode == "upsert":
+        result = db_writer.run(db_path, lambda conn: data_import.upsert_table(conn, df, table, delete_missing=delete_missing))
+        db_writer.run(db_path, lambda conn: migrations.ensure_id_index(conn, db_path, table))
+        migrations.ensure_triggers(db_path)
+        return (f"'{table}': {result['inserted']} inserted, {result['updated']} updated, "
+                f"{result['unchanged']} unchanged, {result['deleted']} deleted")
+    db_writer.run(db_path, lambda conn: df.to_sql(table, conn, if_exists="replace", index=False))
+    db_writer.run(db_path, lambda conn: migrations.ensure_id_index(conn, db_path, table, force=True))
+    migrations.ensure_triggers(db_path)
+    return f"Saved {len(df)} rows to '{table}'"
+
+
+def save_table(ctx, db_path, table, df):
+    """Full-table save from the Inventory editor."""
+    ctx.progress(0.1, f"Saving {len(df)} rows to '{table}'")
+
+    def replace_rows(conn):
+        conn.execute(f'DELETE FROM "{table}"')
+        df.to_sql(table, conn, if_exists="append", index=False)
+
+    db_writer.run(db_path, replace_rows)
+    return f"Saved {len(df)} rows to '{table}'"
+
+
+# --- EXPORTS ---
+
+def export_table(ctx, db_path, table, filename=None, chunk_rows=50000):
+    conn = _connect(db_path)
+    path = ctx.artifact_path(filename or f"{table}.csv")
+    try:
+        total = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] or 1
+        written = 0
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            for i, chunk in enumerate(pd.read_sql_query(f'SELECT * FROM "{table}"', conn, chunksize=chunk_rows)):
+                chunk.to_csv(f, index=False, header=i == 0)
+                written += len(chunk)
+                ctx.progress(written / total, f"{written} / {total} rows")
+    finally:
+        conn.close()
+    return path, f"Exported {written} rows from '{table}'"
+
+
+def qr_batch(ctx, prefix, start, count):
+    import qrcode
+
+    path = ctx.artifact_path("qr_batch.zip")
+    with ZipFile(path, "w") as zf:
+        for n, i in enumerate(range(start, start + count), 1):
+            id_code = f"{prefix}-{str(i).zfill(3)}"
+            img_buf = io.BytesIO()
+            qrcode.make(id_code).save(img_buf, format="PNG")
+            zf.writestr(f"{id_code}.png", img_buf.getvalue())
+            if n % 25 == 0:
+                ctx.progress(n / count, f"{n} / {count} codes")
+    return path, f"Generated {count} QR codes"
+
+
+# --- BACKUP ---
+
+def backup_db(ctx, db_path):
+    ctx.progress(0.02, "Copying pages")
+    path = backup.backup_database(db_path, progress=ctx.progress)
+    return path, f"Snapshot {os.path.basename(path)} ({os.path.getsize(path) / 1024:.0f} KB)"
+
+
+def maintain_db(ctx, db_path, convert=True):
+    ctx.progress(0.05, "Checking and analyzing")
+    result = db_health.maintain(db_path, convert=convert,
+                                progress=lambda freed, free: ctx.progress(0.5, f"Freed {freed} pages"))
+    return f"{result['integrity']}; freed {result['freed_pages']} page(s); {result['detail']}"
+
+
+# --- PREDICTIVE ---
+
+def refit_reliability(ctx, db_path, table):
+    ctx.progress(0.1, "Fitting intervals from full maintenance history")
+    refitted = db_writer.run(db_path, lambda conn: reliability.refresh(conn, table, force=True))
+    return f"Refitted {len(refitted)} equipment type(s)"
@@ -0,0 +1,207 @@
+# jobs.py
+"""Background job runner for long-running operations.
+
+Pages submit work here instead of running it on the Streamlit script
+thread, so a rerun can neither kill nor repeat it. Job records live in a
+small SQLite database (``data/jobs.db``) with status, progress, message
+and an optional result artifact, and pages poll them without blocking.
+
+Task functions take a ``JobContext`` as their first argument and must be
+importable module-level functions when ``use_process=True`` (see
+job_tasks.py).
+"""
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import timestamps
+
+JOBS_DB = os.environ.get("SEALTRAIL_JOBS_DB", os.path.join("data", "jobs.db"))
+ARTIFACT_DIR = os.environ.get("SEALTRAIL_JOBS_DIR", os.path.join("data", "_jobs"))
+MAX_THREADS = int(os.environ.get("SEALTRAIL_JOB_THREADS", 4))
+MAX_PROCESSES = int(os.environ.get("SEALTRAIL_JOB_PROCESSES", max(1, (os.cpu_count() or 2) - 1)))
+
+ACTIVE = ("queued", "running")
+
+_threads = None
+_processes = None
+_recovered = False
+
+
+def _now():
+    return timestamps.now()
+
+
+_schema_ready = set()
+
+
+@contextmanager
+def _db(jobs_db=None):
+    path = os.path.abspath(jobs_db or JOBS_DB)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        if path not in _schema_ready:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT,
+                    owner TEXT,
+                    db_path TEXT,
+                    status TEXT,
+                    progress REAL DEFAULT 0,
+                    message TEXT,
+                    result_path TEXT,
+                    error TEXT,
+                    pid INTEGER,
+                    created_at TEXT,
+                    started_at TEXT,
+                    finished_at TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_owner ON jobs(owner, created_at)")
+            _schema_ready.add(path)
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _update(job_id, jobs_db=None, **fields):
+    cols = ", ".join(f"{k} = ?" for k in fields)
+    with _db(jobs_db) as conn:
+        conn.execute(f"UPDATE jobs SET {cols} WHERE id = ?", [*fields.values(), job_id])
+
+
+# --- JOB CONTEXT (passed to tasks, picklable) ---
+
+class JobContext:
+    def __init__(self, job_id, jobs_db, artifact_dir):
+        self.job_id = job_id
+        self.jobs_db = jobs_db
+        self.artifact_dir = artifact_dir
+
+    def progress(self, fraction, message=None):
+        fields = {"progress": max(0.0, min(1.0, float(fraction)))}
+        if message is not None:
+            fields["message"] = message
+        _update(self.job_id, self.jobs_db, **fields)
+
+    def artifact_path(self, filename):
+        folder = os.path.join(self.artifact_dir, self.job_id)
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, filename)
+
+
+def _run(ctx, fn, args, kwargs):
+    _update(ctx.job_id, ctx.jobs_db, status="running", started_at=_now(), pid=os.getpid())
+    try:
+        result = fn(ctx, *args, **kwargs)
+    except Exception as e:
+        _update(ctx.job_id, ctx.jobs_db, status="failed", finished_at=_now(),
+                error=f"{e}\n\n{traceback.format_exc(limit=5)}")
+        return
+    fields = {"status": "done", "progress": 1.0, "finished_at": _now()}
+    # Tasks return an artifact path, a message, or (path, message)
+    if isinstance(result, tuple):
+        fields["result_path"], fields["message"] = result
+    elif isinstance(result, str) and os.path.exists(result):
+        fields["result_path"] = result
+    elif result is not None:
+        fields["message"] = str(result)
+    _update(ctx.job_id, ctx.jobs_db, **fields)
+
+
+# --- SUBMIT / QUERY ---
+
+def _alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _recover():
+    """Jobs left queued/running by a server process that has since exited
+    will never finish; mark them failed once per process. Jobs owned by a
+    live process (another server worker, or its pool) are left alone."""
+    global _recovered
+    if _recovered:
+        return
+    with _db() as conn:
+        orphaned = [
+            (row["id"],) for row in conn.execute("SELECT id, pid FROM jobs WHERE status IN ('queued', 'running')")
+            if not _alive(row["pid"])
+        ]
+        conn.executemany(
+            "UPDATE jobs SET status = 'failed', error = 'Interrupted by server restart', finished_at = ? WHERE id = ?",
+            [(_now(), job_id) for (job_id,) in orphaned],
+        )
+    _recovered = True
+
+
+def submit(kind, fn, *args, owner=None, db_path=None, use_process=False, **kwargs):
+    """Queue ``fn(ctx, *args, **kwargs)`` and return the job id immediately."""
+    global _threads, _processes
+    _recover()
+    job_id = uuid.uuid4().hex[:12]
+    with _db() as conn:
+        conn.execute(
+            "INSERT INTO jobs (id, kind, owner, db_path, status, progress, created_at, pid) VALUES (?, ?, ?, ?, 'queued', 0, ?, ?)",
+            (job_id, kind, owner, db_path, _now(), os.getpid()),
+        )
+    ctx = JobContext(job_id, os.path.abspath(JOBS_DB), os.path.abspath(ARTIFACT_DIR))
+    if use_process:
+        if _processes is None:
+            # Spawned, not forked: a fork would copy the server's held writer and job locks
+            _processes = ProcessPoolExecutor(max_workers=MAX_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+        _processes.submit(_run, ctx, fn, args, kwargs)
+    else:
+        if _threads is None:
+            _threads = ThreadPoolExecutor(max_workers=MAX_THREADS, thread_name_prefix="sealtrail-job")
+        _threads.submit(_run, ctx, fn, args, kwargs)
+    return job_id
+
+
+def get(job_id):
+    with _db() as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def list_jobs(owner=None, kinds=None, limit=20):
+    sql, params = "SELECT * FROM jobs WHERE 1 = 1", []
+    if owner:
+        sql += " AND owner = ?"
+        params.append(owner)
+    if kinds:
+        sql += f" AND kind IN ({', '.join('?' for _ in kinds)})"
+        params.extend(kinds)
+    sql += " ORDER BY created_at DESC LIMIT ?"
+    params.append(limit)
+    with _db() as conn:
+        return [dict(r) for r in conn.execute(sql, params)]
+
+
+def purge(older_than_days=7):
+    """Delete finished job records and their artifacts."""
+    cutoff = timestamps.to_text(datetime.now(timezone.utc) - timedelta(days=older_than_days))
+    with _db() as conn:
+        old = [r[0] for r in conn.execute(
+            "SELECT id FROM jobs WHERE status NOT IN ('queued', 'running') AND created_at < ?", (cutoff,))]
+        conn.executemany("DELETE FROM jobs WHERE id = ?", [(j,) for j in old])
+    for job_id in old:
+        shutil.rmtree(os.path.join(ARTIFACT_DIR, job_id), ignore_errors=True)
+    return len(old)
@@ -0,0 +1,253 @@
+# loadtest.py
+"""Concurrent-session load test.
+
+Drives many simulated users through the real app with Streamlit's
+``AppTest`` (no browser or server): each session signs in on main.py,
+selects its database, then repeatedly scans an item on the Barcode
+Scanner page, logs maintenance, searches and opens the Dashboard.
+Sessions share a handful of synthetic databases so writes contend the way
+they do in production.
+
+AppTest keeps one global runtime per process, so every session runs in
+its own process. Writes from different sessions therefore meet in SQLite's
+file lock rather than in one shared ``db_writer`` queue, which makes the
+lock-error counts a pessimistic bound for a single server process.
+
+The app and its config are copied into a scratch directory first, so
+``data/`` and ``roles.yaml`` of the checkout are never touched.
+
+    python loadtest.py --sessions 50 --users 5 --iterations 3
+    python loadtest.py --sessions 20 --equipment 20000 --scans 200000 --keep
+
+Reports p50/p95/max rerun latency, lock errors and other errors per step.
+"""
+import argparse
+import glob
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import pandas as pd
+import yaml
+
+APP_FILES = ["config.yaml", "roles.yaml"]
+STEPS = ("login", "select db", "scanner", "scan", "maintenance", "log maintenance", "search", "dashboard")
+
+
+# --- SYNTHETIC DATA ---
+
+def make_database(db_path, equipment=2000, scans=20000, maintenance=5000, seed=0):
+    """A database shaped like a real one: an equipment working table plus
+    scan and maintenance history spread over the last year."""
+    import migrations
+    import timestamps
+
+    rng = random.Random(seed)
+    ids = [f"EQP-{i:05d}" for i in range(equipment)]
+    sites = [f"Warehouse {c}" for c in "ABCDEFGH"]
+    today = date.today()
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE equipment (equipment_id TEXT, equipment_type TEXT, status TEXT, location TEXT)")
+        conn.executemany("INSERT INTO equipment VALUES (?, ?, ?, ?)", [
+            (i, rng.choice(["Pump", "Valve", "Motor", "Compressor"]), rng.choice(["active", "repair", "retired"]),
+             rng.choice(sites))
+            for i in ids
+        ])
+    migrations.ensure_schema(db_path)
+    now = pd.Timestamp.now(tz="UTC")
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO scanned_items (equipment_id, location, timestamp, scanned_by) VALUES (?, ?, ?, ?)",
+            [(rng.choice(ids), rng.choice(sites), timestamps.to_text(now - pd.Timedelta(seconds=rng.randrange(365 * 86400))),
+              "seed@example.com") for _ in range(scans)],
+        )
+        conn.executemany(
+            "INSERT INTO maintenance_log (equipment_id, description, date, technician) VALUES (?, ?, ?, ?)",
+            [(rng.choice(ids), "Routine service", str(today - timedelta(days=rng.randrange(365))), "seed")
+             for _ in range(maintenance)],
+        )
+    return ids
+
+
+def prepare(workdir, users, equipment, scans, maintenance):
+    """Copy the app into ``workdir`` and create one database per user.
+    Returns [(email, equipment ids)]."""
+    for path in glob.glob("*.py") + APP_FILES:
+        if os.path.exists(path):
+            shutil.copy(path, workdir)
+    shutil.copytree("pages", os.path.join(workdir, "pages"))
+    os.chdir(workdir)
+    sys.path.insert(0, workdir)
+    roles = {}
+    if os.path.exists("roles.yaml"):
+        with open("roles.yaml") as f:
+            roles = yaml.safe_load(f) or {}
+    roles.setdefault("users", {})
+    accounts = []
+    for n in range(users):
+        email = f"load{n}@example.com"
+        db_path = os.path.join("data", email.replace("@", "_at_"), "synthetic.db")
+        accounts.append((email, make_database(db_path, equipment, scans, maintenance, seed=n)))
+        roles["users"][email] = {"role": "user", "allowed_dbs": ["synthetic.db"]}
+    with open("roles.yaml", "w") as f:
+        yaml.safe_dump(roles, f)
+    return accounts
+
+
+# --- SESSIONS ---
+
+def _widget(elements, label):
+    return next(w for w in elements if w.label == label)
+
+
+def _errors(at):
+    return [str(e.value) for e in at.exception] + [str(e.value) for e in at.error]
+
+
+def _step(results, session, name, action):
+    """Run one rerun and record its latency and errors."""
+    t0 = time.perf_counter()
+    try:
+        at = action()
+        errors = _errors(at)
+    except Exception as e:
+        errors = [f"{type(e).__name__}: {e}"]
+    ms = (time.perf_counter() - t0) * 1000
+    locked = [e for e in errors if "locked" in e.lower() or "busy" in e.lower()]
+    results.append({
+        "session": session, "step": name, "ms": ms,
+        "lock_errors": len(locked), "errors": len(errors) - len(locked),
+        "first_error": errors[0][:200] if errors else None,
+    })
+
+
+def run_session(session, email, ids, iterations, think, timeout, start_at):
+    """One simulated user, in its own process. Returns (step results, writer stats)."""
+    from streamlit.testing.v1 import AppTest
+
+    import db_writer
+
+    rng = random.Random(session)
+    results = []
+    at = AppTest.from_file("main.py", default_timeout=timeout)
+    at.run()
+    # Start the measured part together with the other sessions
+    time.sleep(max(start_at - time.time(), 0))
+
+    def step(name, action):
+        _step(results, session, name, action)
+
+    def login():
+        _widget(at.text_input, "Email").input(email)
+        return at.button[0].click().run()
+
+    step("login", login)
+    step("select db", lambda: at.run())
+    for _ in range(iterations):
+        equipment_id = rng.choice(ids)
+
+        def open_scanner():
+            at.switch_page("pages/3_Barcode_Scanner.py").run()
+            _widget(at.text_input, "Equipment ID (barcode or manual entry)").input(equipment_id)
+            _widget(at.text_input, "Location (optional)").input(f"Dock {rng.randrange(8)}")
+            return at.run()
+
+        step("scanner", open_scanner)
+        step("scan", lambda: _widget(at.button, "✅ Save Entry").click().run())
+
+        def open_maintenance():
+            return at.switch_page("pages/2_Maintenance.py").run()
+
+        def log_maintenance():
+            _widget(at.text_area, "Work Description").input("Load test service")
+            _widget(at.text_input, "Technician Name").input(email)
+            return _widget(at.button, "💾 Save Record").click().run()
+
+        step("maintenance", open_maintenance)
+        step("log maintenance", log_maintenance)
+
+        def search():
+            at.switch_page("pages/5_Search.py").run()
+            return _widget(at.text_input, "Enter keyword to search across all tables:").input(equipment_id[:7]).run()
+
+        def dashboard():
+            return at.switch_page("pages/4_Dashboard.py").run()
+
+        step("search", search)
+        step("dashboard", dashboard)
+        time.sleep(think * rng.random())
+    return results, db_writer.stats()
+
+
+# --- REPORT ---
+
+def report(results):
+    df = pd.DataFrame(results)
+    grouped = df.groupby("step")
+    out = pd.DataFrame({
+        "runs": grouped.size(),
+        "p50_ms": grouped["ms"].quantile(0.50),
+        "p95_ms": grouped["ms"].quantile(0.95),
+        "max_ms": grouped["ms"].max(),
+        "lock_errors": grouped["lock_errors"].sum(),
+        "errors": grouped["errors"].sum(),
+    }).round(1)
+    return out.reindex([s for s in STEPS if s in out.index])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive concurrent simulated sessions through the app.")
+    parser.add_argument("--sessions", type=int, default=20, help="Concurrent sessions (one process each)")
+    parser.add_argument("--users", type=int, default=4, help="Distinct users (one database each); sessions are spread over them")
+    parser.add_argument("--iterations", type=int, default=2, help="Scan/maintenance/search/dashboard rounds per session")
+    parser.add_argument("--think", type=float, default=0.5, help="Max random pause between rounds, seconds")
+    parser.add_argument("--equipment", type=int, default=2000, help="Equipment rows per database")
+    parser.add_argument("--scans", type=int, default=20000, help="Seeded scan rows per database")
+    parser.add_argument("--maintenance", type=int, default=5000, help="Seeded maintenance rows per database")
+    parser.add_argument("--timeout", type=float, default=120, help="Per-rerun timeout, seconds")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="sealtrail-load-")
+    try:
+        print(f"Preparing {args.users} synthetic database(s) in {workdir} ...")
+        accounts = prepare(workdir, args.users, args.equipment, args.scans, args.maintenance)
+        print(f"Running {args.sessions} sessions x {args.iterations} round(s) ...")
+        # Leave time for every process to import the app before the clock starts
+        start_at = time.time() + 10 + args.sessions * 0.2
+        with ProcessPoolExecutor(max_workers=args.sessions) as pool:
+            futures = [
+                pool.submit(run_session, n, *accounts[n % len(accounts)], args.iterations, args.think, args.timeout, start_at)
+                for n in range(args.sessions)
+            ]
+            outcomes = [f.result() for f in futures]
+        elapsed = time.time() - start_at
+
+        results = [r for session_results, _ in outcomes for r in session_results]
+        print(report(results).to_string())
+        print(f"\n{len(results)} reruns in {elapsed:.1f} s ({len(results) / elapsed:.1f} reruns/s)")
+        writers = pd.DataFrame([stats for _, by_db in outcomes for stats in by_db.values()])
+        if not writers.empty:
+            print(f"writes: {writers['ops'].sum()} in {writers['batches'].sum()} batches, "
+                  f"{writers['retries'].sum()} lock retries, {writers['failed'].sum()} failed")
+        failures = [r for r in results if r["first_error"]]
+        if failures:
+            print("\nFirst errors:")
+            for r in failures[:5]:
+                print(f"  [{r['step']}] {r['first_error']}")
+    finally:
+        if args.keep:
+            print(f"Kept {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# locations.py
+"""Where each asset is now, where it has been, and what is where.
+
+``equipment_location`` holds one row per asset (keyed on the lowercased,
+trimmed ID) and is updated by a trigger on every located scan (migration
+3), so these lookups are index probes instead of scans over the whole
+``scanned_items`` history:
+
+* ``current``      primary-key probe on equipment_location
+* ``items_at``     range on idx_equipment_location_location
+* ``occupancy``    GROUP BY over the same index
+* ``history``      range on idx_scanned_items_key, newest first
+"""
+import pandas as pd
+
+import timestamps
+
+
+def current(conn, equipment_id):
+    """Last known location of one asset as a dict, or None."""
+    row = conn.execute(
+        "SELECT equipment_id, location, last_seen, scanned_by FROM equipment_location WHERE equipment_key = LOWER(TRIM(?))",
+        (equipment_id,),
+    ).fetchone()
+    if row is None:
+        return None
+    return dict(zip(("equipment_id", "location", "last_seen", "scanned_by"), row))
+
+
+def items_at(conn, location):
+    """Assets whose last known location is ``location``, most recently seen first."""
+    df = pd.read_sql_query(
+        "SELECT equipment_id, last_seen, scanned_by FROM equipment_location WHERE location = ? ORDER BY last_seen DESC",
+        conn, params=[location],
+    )
+    df["last_seen"] = timestamps.parse(df["last_seen"])
+    return df
+
+
+def occupancy(conn):
+    """Number of assets currently at each location."""
+    df = pd.read_sql_query(
+        "SELECT location, COUNT(*) AS assets, MAX(last_seen) AS last_activity "
+        "FROM equipment_location GROUP BY location ORDER BY assets DESC",
+        conn,
+    )
+    df["last_activity"] = timestamps.parse(df["last_activity"])
+    return df
+
+
+def history(conn, equipment_id, limit=100, moves_only=True):
+    """Scans of one asset, newest first. With ``moves_only`` consecutive scans
+    at the same location are collapsed into the first arrival."""
+    scans = """
+        SELECT timestamp, location, scanned_by
+        FROM scanned_items
+        WHERE LOWER(TRIM(equipment_id)) = LOWER(TRIM(?)) AND TRIM(COALESCE(location, '')) != ''
+        ORDER BY timestamp DESC
+    """
+    if not moves_only:
+        df = pd.read_sql_query(f"{scans} LIMIT ?", conn, params=[equipment_id, limit])
+        df["timestamp"] = timestamps.parse(df["timestamp"])
+        return df
+    df = pd.read_sql_query(f"""
+        SELECT timestamp AS arrived, location, scanned_by FROM (
+            SELECT timestamp, location, scanned_by,
+                   LEAD(location) OVER (ORDER BY timestamp DESC) AS previous_location
+            FROM ({scans})
+        )
+        WHERE previous_location IS NULL OR previous_location != location
+        LIMIT ?
+    """, conn, params=[equipment_id, limit])
+    df["arrived"] = timestamps.parse(df["arrived"])
+    return df
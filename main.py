@@ -1,11 +1,20 @@
 # main.py
 import streamlit as st
+import profiler
 import os
 import pandas as pd
-import sqlite3
 import yaml
+import migrations
+import analytics
+import backup
+import catalog
+import db_writer
+import data_import
+import shared_utils as su
+import snapshots
 
 st.set_page_config(page_title="SealTrail", layout="wide")
+perf = profiler.PageTimer("Main")
 
 # -----------------------------
 # Auth shim + helpers
@@ -80,7 +89,7 @@ def _login_ui():
                 st.session_state["username"] = st.session_state["name"]
                 # Default role on first login until roles.yaml says otherwise
                 st.session_state.setdefault("role", "admin")
-                st.experimental_rerun()
+                st.rerun()
 
 # attach shim
 _attach_user()
@@ -136,7 +145,7 @@ st.session_state["user_role"] = user_role
 st.sidebar.write(f"Role: **{user_role.capitalize()}**")
 
 # list existing DBs for this user
-db_files = [f for f in os.listdir(user_dir) if f.endswith(".db")]
+db_files = catalog.list_databases(user_dir)
 if allowed_dbs != ["all"]:
     db_files = [db for db in db_files if db in allowed_dbs or user_role == "admin"]
 
@@ -166,6 +175,11 @@ if db_files:
         key="selected_db_select"
     )
     st.session_state.selected_db = selected_db
+    selected_info = catalog.info(os.path.join(user_dir, selected_db))
+    st.sidebar.caption(
+        f"{len(selected_info['tables'])} tables · {selected_info['size_bytes'] / 1024 / 1024:.1f} MB"
+        + (f" · modified {selected_info['modified']:%Y-%m-%d %H:%M}" if selected_info["modified"] else "")
+    )
 else:
     st.sidebar.warning("No databases found. Create one above.")
 
@@ -176,7 +190,12 @@ if db_files:
         if deletable:
             db_to_delete = st.selectbox("Delete which?", deletable, key="delete_db_select")
             if st.button("Delete DB", key="delete_db_btn"):
+                db_writer.close(os.path.join(user_dir, db_to_delete))
                 os.remove(os.path.join(user_dir, db_to_delete))
+                migrations.forget(os.path.join(user_dir, db_to_delete))
+                catalog.forget(os.path.join(user_dir, db_to_delete))
+                analytics.forget(os.path.join(user_dir, db_to_delete))
+                snapshots.forget(os.path.join(user_dir, db_to_delete))
                 # prune from roles if present
                 if db_to_delete in roles_config["users"][user_email]["allowed_dbs"]:
                     roles_config["users"][user_email]["allowed_dbs"].remove(db_to_delete)
@@ -200,7 +219,31 @@ db_path = os.path.join(user_dir, st.session_state.selected_db)
 st.session_state.db_path = db_path
 st.markdown(f"**Current DB**: `{st.session_state.selected_db}`")
 
+# Backups (online snapshots, safe while others are writing)
+with st.sidebar.expander("Backups"):
+    if st.button("Back up now", key="backup_now_btn"):
+        import job_tasks
+
+        su.submit_job("backup", job_tasks.backup_db, db_path)
+        su.log_audit("Backup", f"Snapshot of {st.session_state.selected_db} queued")
+    backups = backup.list_backups(db_path)
+    if not backups:
+        st.caption("No backups yet.")
+    for snap in backups[:5]:
+        st.caption(f"{snap['created']:%Y-%m-%d %H:%M} UTC · {snap['size'] / 1024:.0f} KB")
+    if backups and user_role == "admin":
+        to_restore = st.selectbox("Restore from", [s["name"] for s in backups], key="restore_select")
+        confirm = st.checkbox("Overwrite current data", key="restore_confirm")
+        if st.button("Restore", key="restore_btn", disabled=not confirm):
+            try:
+                backup.restore(os.path.join(backup.backup_folder(db_path), to_restore), db_path)
+                su.log_audit("Restore", f"{st.session_state.selected_db} restored from {to_restore}")
+                st.success(f"Restored from {to_restore}.")
+            except Exception as e:
+                st.error(f"Restore failed: {e}")
+
 # Upload to working table
+perf.section("Upload")
 st.subheader("Upload File to Working Table")
 uploaded_file = st.file_uploader(
     "Upload CSV, Excel, JSON or TSV",
@@ -210,41 +253,70 @@ uploaded_file = st.file_uploader(
 
 if uploaded_file:
     try:
-        ext = uploaded_file.name.split(".")[-1].lower()
-        if ext == "csv":
-            df = pd.read_csv(uploaded_file)
-        elif ext == "tsv":
-            df = pd.read_csv(uploaded_file, sep="\t")
-        elif ext in ["xlsx", "xls"]:
-            df = pd.read_excel(uploaded_file)
-        elif ext == "json":
-            df = pd.read_json(uploaded_file)
+        background = st.checkbox(
+            "Import in background",
+            value=uploaded_file.size > su.BACKGROUND_IMPORT_BYTES,
+            help="Parse and save the file on the job runner so the page stays responsive.",
+            key="import_background"
+        )
+        df = None
+        if not background:
+            df = data_import.read_upload(uploaded_file)
+            st.dataframe(df, use_container_width=True, height=380)
         else:
-            st.error("Unsupported file type.")
-            st.stop()
-
-        # Normalize column names
-        df.columns = df.columns.str.strip()
-        if "Asset_ID" in df.columns and "equipment_id" not in df.columns:
-            df.rename(columns={"Asset_ID": "equipment_id"}, inplace=True)
-
-        st.dataframe(df, use_container_width=True, height=380)
+            st.caption(f"{uploaded_file.name} · {uploaded_file.size / 1024 / 1024:.1f} MB (preview skipped)")
 
         table_name = st.text_input("Save to which table?", value=st.session_state.get("active_table", "equipment"))
+        import_mode = st.radio(
+            "Import mode", ["Upsert (merge on equipment_id)", "Replace table"], horizontal=True, key="import_mode"
+        )
+        delete_missing = False
+        if import_mode.startswith("Upsert"):
+            delete_missing = st.checkbox("Delete rows that are not in the file", key="delete_missing")
         if st.button("Save to DB", key="save_to_db_btn") and table_name:
-            with sqlite3.connect(db_path) as conn:
-                df.to_sql(table_name, conn, if_exists="replace", index=False)
-            st.session_state.active_table = table_name
-            st.success(f"Saved to '{table_name}' table.")
+            if background:
+                import job_tasks
+
+                su.submit_job(
+                    "import", job_tasks.import_file,
+                    uploaded_file.getvalue(), uploaded_file.name, db_path, table_name,
+                    "upsert" if import_mode.startswith("Upsert") else "replace", delete_missing,
+                    use_process=True
+                )
+                st.session_state.active_table = table_name
+            else:
+                if import_mode.startswith("Upsert"):
+                    result = db_writer.run(db_path, lambda conn: data_import.upsert_table(
+                        conn, df, table_name, delete_missing=delete_missing))
+                    db_writer.run(db_path, lambda conn: migrations.ensure_id_index(conn, db_path, table_name))
+                else:
+                    db_writer.run(db_path, lambda conn: df.to_sql(table_name, conn, if_exists="replace", index=False))
+                    # replace drops the table's indexes
+                    db_writer.run(db_path, lambda conn: migrations.ensure_id_index(conn, db_path, table_name, force=True))
+                    result = None
+                st.session_state.active_table = table_name
+                if result:
+                    st.success(
+                        f"Merged into '{table_name}': {result['inserted']} inserted, {result['updated']} updated, "
+                        f"{result['unchanged']} unchanged, {result['deleted']} deleted."
+                    )
+                else:
+                    st.success(f"Saved to '{table_name}' table.")
 
     except Exception as e:
         st.error(f"Error processing file: {e}")
 
+su.render_jobs(kinds=["import", "backup"])
+
 # Active table selection
+perf.section("Table selector")
 try:
-    with sqlite3.connect(db_path) as conn:
-        tables = pd.read_sql("SELECT name FROM sqlite_master WHERE type='table'", conn)["name"].tolist()
-    if tables:
+    migrations.ensure_schema(db_path)
+    migrations.ensure_triggers(db_path)
+    # App tables exist in every DB after migration; working tables are listed first
+    tables = catalog.user_tables(db_path)
+    user_tables = [t for t in tables if t not in migrations.APP_TABLES]
+    if user_tables:
         active_table = st.selectbox(
             "Select active working table",
             tables,
@@ -252,6 +324,8 @@ try:
             key="table_selector"
         )
         st.session_state.active_table = active_table
+        with su.get_conn(db_path) as conn:
+            migrations.ensure_id_index(conn, db_path, active_table)
         st.markdown(f"**Active Table**: `{active_table}`")
     else:
         st.info("No tables found. Upload a file to create one.")
@@ -259,12 +333,17 @@ except Exception as e:
     st.warning(f"Error fetching tables: {e}")
 
 # Show current active table
+perf.section("Active table")
+PREVIEW_ROWS = 1000
 if st.session_state.get("active_table"):
     try:
-        with sqlite3.connect(db_path) as conn:
-            current_df = pd.read_sql(f"SELECT * FROM {st.session_state.active_table}", conn)
+        total_rows = catalog.row_count(db_path, st.session_state.active_table)
+        with su.get_conn(db_path) as conn:
+            current_df = pd.read_sql(f"SELECT * FROM {st.session_state.active_table} LIMIT {PREVIEW_ROWS}", conn)
         if not current_df.empty:
             st.subheader("📋 Current Active Table")
+            if total_rows > PREVIEW_ROWS:
+                st.caption(f"Showing the first {PREVIEW_ROWS:,} of {total_rows:,} rows.")
             st.dataframe(current_df, use_container_width=True, height=420)
         else:
             st.info(f"'{st.session_state.active_table}' is empty.")
@@ -272,3 +351,5 @@ if st.session_state.get("active_table"):
         st.warning(f"Could not read active table: {e}")
 else:
     st.info("Select an active table to view its contents.")
+
+perf.finish()
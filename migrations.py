@@ -0,0 +1,526 @@
+# migrations.py
+"""Versioned schema migrations keyed on ``PRAGMA user_version``.
+
+Each entry in ``MIGRATIONS`` moves a database one version forward and is
+either a list of SQL statements or a callable taking the connection. The
+runner is invoked once per database per process (``ensure_schema``), so
+pages no longer issue their own ``CREATE TABLE IF NOT EXISTS`` on every
+rerun.
+"""
+import importlib
+import os
+import sqlite3
+import threading
+
+# Tables owned by the app itself (as opposed to uploaded working tables)
+APP_TABLES = (
+    "scanned_items", "maintenance_log", "audit_log",
+    "reliability_type_params", "reliability_asset_params", "reliability_state",
+    "equipment_location", "change_log", "maintenance_forecast", "maintenance_forecast_state",
+    "facet_values", "facet_columns", "db_maintenance", "table_versions", "change_capture",
+)
+
+# Modules that register working-table trigger hooks when imported (see ensure_triggers)
+TRIGGER_MODULES = ("cdc", "facets")
+
+ID_COLUMNS = ("asset_id", "equipment_id")
+TYPE_COLUMNS = ("equipment_type", "type")
+
+
+def _canonical_timestamps(conn):
+    # Imported on use: timestamps pulls in pandas, which the runner otherwise doesn't need
+    import timestamps
+    timestamps.migrate_existing(conn)
+
+
+def _facet_index(conn):
+    import facets
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS facet_values (
+            tbl TEXT NOT NULL,
+            col TEXT NOT NULL,
+            value,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (tbl, col, value)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS facet_columns (
+            tbl TEXT NOT NULL,
+            col TEXT NOT NULL,
+            PRIMARY KEY (tbl, col)
+        )
+    """)
+    facets.create_app_facets(conn)
+
+
+# Audit actions whose detail names one asset as "... equipment <id>[ at <location>]"
+_AUDIT_EQUIPMENT_ACTIONS = ("Add Record", "Update Record", "Scan Recorded", "Add Maintenance")
+
+
+def _audit_equipment(conn):
+    if "equipment_id" not in [row[1] for row in conn.execute("PRAGMA table_info(audit_log)")]:
+        conn.execute("ALTER TABLE audit_log ADD COLUMN equipment_id TEXT")
+    marks = ", ".join("?" for _ in _AUDIT_EQUIPMENT_ACTIONS)
+    conn.execute(f"""
+        UPDATE audit_log SET equipment_id = CASE WHEN INSTR(rest, ' ') > 0 THEN SUBSTR(rest, 1, INSTR(rest, ' ') - 1) ELSE rest END
+        FROM (SELECT id AS audit_id, SUBSTR(detail, INSTR(detail, 'equipment ') + 10) AS rest
+              FROM audit_log WHERE action IN ({marks}) AND INSTR(detail, 'equipment ') > 0)
+        WHERE audit_log.id = audit_id AND audit_log.equipment_id IS NULL
+    """, _AUDIT_EQUIPMENT_ACTIONS)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_log_equipment ON audit_log(LOWER(TRIM(equipment_id)), timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_maintenance_log_key ON maintenance_log(LOWER(TRIM(equipment_id)), date)")
+
+
+def _table_versions(conn):
+    import snapshots
+    conn.execute("CREATE TABLE IF NOT EXISTS table_versions (tbl TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+    snapshots.new_epoch(conn)
+    for table in ("scanned_items", "maintenance_log", "audit_log"):
+        version_triggers(conn, table)
+
+
+MIGRATIONS = [
+    # 1: canonical app tables and the indexes their access paths need
+    [
+        """
+        CREATE TABLE IF NOT EXISTS scanned_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            equipment_id TEXT,
+            location TEXT,
+            timestamp TEXT,
+            scanned_by TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS maintenance_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            equipment_id TEXT,
+            description TEXT,
+            date TEXT,
+            technician TEXT,
+            logged_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS audit_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            user TEXT,
+            action TEXT,
+            detail TEXT
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_scanned_items_equipment ON scanned_items(equipment_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_scanned_items_timestamp ON scanned_items(timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_maintenance_log_equipment ON maintenance_log(equipment_id, date)",
+        "CREATE INDEX IF NOT EXISTS idx_maintenance_log_date ON maintenance_log(date)",
+        "CREATE INDEX IF NOT EXISTS idx_audit_log_timestamp ON audit_log(timestamp)",
+    ],
+    # 2: stored parameters of the fleet reliability model (reliability.py)
+    [
+        """
+        CREATE TABLE IF NOT EXISTS reliability_type_params (
+            table_name TEXT,
+            equipment_type TEXT,
+            n_intervals INTEGER,
+            mean_days REAL,
+            std_days REAL,
+            asset_prior REAL,
+            fitted_at TEXT,
+            PRIMARY KEY (table_name, equipment_type)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS reliability_asset_params (
+            table_name TEXT,
+            id_key TEXT,
+            equipment_type TEXT,
+            n_intervals INTEGER,
+            mean_days REAL,
+            last_date TEXT,
+            fitted_at TEXT,
+            PRIMARY KEY (table_name, id_key)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS reliability_state (
+            table_name TEXT PRIMARY KEY,
+            last_log_id INTEGER
+        )
+        """,
+    ],
+    # 3: last known location per asset, kept current by a trigger on scans (locations.py)
+    [
+        """
+        CREATE TABLE IF NOT EXISTS equipment_location (
+            equipment_key TEXT PRIMARY KEY,
+            equipment_id TEXT,
+            location TEXT,
+            last_seen TEXT,
+            scanned_by TEXT,
+            scan_id INTEGER
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_equipment_location_location ON equipment_location(location, last_seen)",
+        "CREATE INDEX IF NOT EXISTS idx_scanned_items_key ON scanned_items(LOWER(TRIM(equipment_id)), timestamp)",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_scanned_items_location
+        AFTER INSERT ON scanned_items
+        WHEN NEW.equipment_id IS NOT NULL AND TRIM(COALESCE(NEW.location, '')) != ''
+        BEGIN
+            INSERT INTO equipment_location (equipment_key, equipment_id, location, last_seen, scanned_by, scan_id)
+            VALUES (LOWER(TRIM(NEW.equipment_id)), TRIM(NEW.equipment_id), TRIM(NEW.location),
+                    NEW.timestamp, NEW.scanned_by, NEW.id)
+            ON CONFLICT(equipment_key) DO UPDATE SET
+                equipment_id = excluded.equipment_id,
+                location = excluded.location,
+                last_seen = excluded.last_seen,
+                scanned_by = excluded.scanned_by,
+                scan_id = excluded.scan_id
+            WHERE excluded.last_seen >= equipment_location.last_seen OR equipment_location.last_seen IS NULL;
+        END
+        """,
+        # Backfill from existing history; SQLite takes the bare columns from the MAX(timestamp) row
+        """
+        INSERT OR REPLACE INTO equipment_location (equipment_key, equipment_id, location, last_seen, scanned_by, scan_id)
+        SELECT LOWER(TRIM(equipment_id)), TRIM(equipment_id), TRIM(location), MAX(timestamp), scanned_by, id
+        FROM scanned_items
+        WHERE equipment_id IS NOT NULL AND TRIM(COALESCE(location, '')) != ''
+        GROUP BY LOWER(TRIM(equipment_id))
+        """,
+    ],
+    # 4: canonical ISO-8601 UTC timestamps for existing rows (timestamps.py)
+    _canonical_timestamps,
+    # 5: change-data capture log; cdc.py installs its triggers when capture is enabled
+    [
+        """
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            tbl TEXT NOT NULL,
+            op TEXT NOT NULL,
+            row_key TEXT,
+            data TEXT
+        )
+        """,
+    ],
+    # 6: precomputed next-due forecasts per working table (forecast.py)
+    [
+        """
+        CREATE TABLE IF NOT EXISTS maintenance_forecast (
+            table_name TEXT,
+            id_key TEXT,
+            equipment_id TEXT,
+            equipment_type TEXT,
+            last_maintenance TEXT,
+            interval_days INTEGER,
+            avg_interval_days INTEGER,
+            learned_interval_days INTEGER,
+            next_due TEXT,
+            days_remaining INTEGER,
+            status TEXT,
+            PRIMARY KEY (table_name, id_key)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_maintenance_forecast_status ON maintenance_forecast(table_name, status, days_remaining)",
+        """
+        CREATE TABLE IF NOT EXISTS maintenance_forecast_state (
+            table_name TEXT PRIMARY KEY,
+            computed_at TEXT,
+            as_of TEXT,
+            log_id INTEGER,
+            settings TEXT,
+            equipment_rows INTEGER,
+            use_learned INTEGER
+        )
+        """,
+    ],
+    # 7: distinct-value counts per column for dropdowns and filters (facets.py)
+    _facet_index,
+    # 8: log of maintenance passes (db_health.py)
+    [
+        """
+        CREATE TABLE IF NOT EXISTS db_maintenance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_at TEXT,
+            seconds REAL,
+            integrity TEXT,
+            freed_pages INTEGER,
+            checkpoint TEXT,
+            detail TEXT
+        )
+        """,
+    ],
+    # 9: structured equipment_id on audit events and per-asset indexes for the timeline (timeline.py)
+    _audit_equipment,
+    # 10: per-table data versions keying the shared table snapshots (snapshots.py)
+    _table_versions,
+    # 11: stored forecasts keyed on data versions instead of row counts (forecast.py); recomputed on next use
+    [
+        "DROP TABLE IF EXISTS maintenance_forecast_state",
+        """
+        CREATE TABLE maintenance_forecast_state (
+            table_name TEXT PRIMARY KEY,
+            computed_at TEXT,
+            as_of TEXT,
+            log_version TEXT,
+            settings TEXT,
+            equipment_version TEXT,
+            use_learned INTEGER
+        )
+        """,
+    ],
+    # 12: per-database change-capture switch (cdc.py); off until the database is first synced
+    [
+        """
+        CREATE TABLE IF NOT EXISTS change_capture (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            enabled INTEGER NOT NULL,
+            changed_at TEXT
+        )
+        """,
+        "INSERT OR IGNORE INTO change_capture (id, enabled) VALUES (1, 0)",
+    ],
+    # 13: reliability fits keyed on data versions as well as the log watermark (reliability.py); refit on next use
+    [
+        "ALTER TABLE reliability_state ADD COLUMN log_version TEXT",
+        "ALTER TABLE reliability_state ADD COLUMN equipment_version TEXT",
+    ],
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+_migrated = set()
+_indexed = set()
+_columns = {}
+_trigger_hooks = {}
+_triggers_checked = {}
+_lock = threading.Lock()
+
+
+# --- RUNNER ---
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Bring ``conn`` up to SCHEMA_VERSION. Returns the versions applied."""
+    if get_version(conn) >= SCHEMA_VERSION:
+        return []
+
+    applied = []
+    conn.commit()
+    # IMMEDIATE takes the write lock up front so two sessions opening the
+    # same fresh DB can't both run a migration; re-read the version after.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = get_version(conn)
+        for target in range(version + 1, SCHEMA_VERSION + 1):
+            step = MIGRATIONS[target - 1]
+            if callable(step):
+                step(conn)
+            else:
+                for sql in step:
+                    conn.execute(sql)
+            conn.execute(f"PRAGMA user_version = {target}")
+            applied.append(target)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return applied
+
+
+def ensure_schema(db_path):
+    """Run pending migrations the first time this process opens ``db_path``."""
+    key = os.path.abspath(db_path)
+    if key in _migrated:
+        return
+    with _lock:
+        if key in _migrated:
+            return
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            # auto_vacuum can only be set before the first table; db_health.py reclaims free pages with it
+            if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            migrate(conn)
+        finally:
+            conn.close()
+        _migrated.add(key)
+
+
+def forget(db_path):
+    """Drop cached state for a database that was deleted or replaced."""
+    key = os.path.abspath(db_path)
+    _migrated.discard(key)
+    for entry in [e for e in _indexed if e[0] == key]:
+        _indexed.discard(entry)
+    for entry in [e for e in _columns if e[0] == key]:
+        _columns.pop(entry, None)
+    _triggers_checked.pop(key, None)
+
+
+# --- CHANGE DETECTION ---
+
+def db_fingerprint(db_path):
+    """Cheap "has this database changed" token: mtime and size of the file
+    and its WAL. Commits in WAL mode only touch the -wal file."""
+    stamps = []
+    for path in (db_path, f"{db_path}-wal"):
+        try:
+            st = os.stat(path)
+            stamps.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamps.append(None)
+    return tuple(stamps)
+
+
+# --- SCHEMA CACHE ---
+
+def table_columns(conn, table):
+    """Column names of ``table`` from PRAGMA table_info, cached until the
+    database's schema_version changes (any CREATE/ALTER/DROP bumps it)."""
+    db_file = conn.execute("PRAGMA database_list").fetchone()[2]
+    schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+    key = (db_file, table)
+    cached = _columns.get(key)
+    if cached and cached[0] == schema_version:
+        return cached[1]
+    cols = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+    if db_file:  # in-memory / temp databases have no stable identity
+        _columns[key] = (schema_version, cols)
+    return cols
+
+
+# --- WORKING TABLE INDEXES ---
+
+def table_id_column(conn, table):
+    return next((col for col in table_columns(conn, table) if col.lower() in ID_COLUMNS), None)
+
+
+def table_type_column(conn, table):
+    return next((col for col in table_columns(conn, table) if col.lower() in TYPE_COLUMNS), None)
+
+
+def ensure_id_index(conn, db_path, table, force=False):
+    """Index LOWER(id) on an uploaded working table.
+
+    Lookups on working tables are case-insensitive (``LOWER(col) = LOWER(?)``),
+    so the index is on the same expression. Uploads that replace the table
+    drop its indexes; call again with ``force=True`` afterwards.
+    """
+    key = (os.path.abspath(db_path), table)
+    if key in _indexed and not force:
+        return
+    id_col = table_id_column(conn, table)
+    if id_col:
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_{id_col}_nocase" ON "{table}"(LOWER("{id_col}"))')
+        conn.commit()
+    _indexed.add(key)
+
+
+# --- WORKING TABLE TRIGGERS ---
+#
+# Several features keep derived state current with triggers on every working
+# table: per-table data versions (below), change capture (cdc.py), facet
+# counts (facets.py). Uploads create and replace working tables at any time,
+# so each feature registers a hook here and ``ensure_triggers`` runs the
+# hooks whenever the database's schema_version moves.
+
+def working_tables(conn):
+    """Uploaded tables, as opposed to APP_TABLES (``_`` prefixes are scratch tables)."""
+    names = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+    return [n for n in names if n not in APP_TABLES and not n.startswith(("_", "sqlite_"))]
+
+
+def register_triggers(name, hook):
+    """Run ``hook(conn, working_tables)`` on each database whose schema
+    changed since it last ran. The hook returns the tables whose triggers
+    it (re)created and leaves committing to the caller."""
+    _trigger_hooks[name] = hook
+
+
+def replace_triggers(conn, table, prefix, expected):
+    """Make the ``<prefix>_*`` triggers on ``table`` exactly ``expected``
+    ({name: CREATE TRIGGER statement}). Returns True when they changed."""
+    current = dict(conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ? AND name LIKE ? ESCAPE '\\'",
+        (table, prefix + "\\_%"),
+    ).fetchall())
+    if current == expected:
+        return False
+    for name in current:
+        conn.execute(f'DROP TRIGGER "{name}"')
+    for sql in expected.values():
+        conn.execute(sql)
+    return True
+
+
+def _run_hooks(conn):
+    tables = working_tables(conn)
+    changed = {name: hook(conn, tables) for name, hook in list(_trigger_hooks.items())}
+    conn.commit()
+    return conn.execute("PRAGMA schema_version").fetchone()[0], changed
+
+
+def ensure_triggers(db_path, conn=None):
+    """Bring the registered triggers of ``db_path`` in step with its schema.
+    One stat while the file is unchanged, one ``PRAGMA schema_version``
+    (on ``conn`` if given) after other writes; the hooks only run, on the
+    database's writer, when the schema or the set of hooks changed."""
+    import db_writer
+    for module in TRIGGER_MODULES:
+        importlib.import_module(module)
+
+    key = os.path.abspath(db_path)
+    ensure_schema(db_path)
+    stamp = db_fingerprint(key)
+    hooks = frozenset(_trigger_hooks)
+    checked = _triggers_checked.get(key)
+    if checked and checked[2] == hooks and checked[0] == stamp:
+        return
+    reader = conn or sqlite3.connect(db_path, timeout=30)
+    try:
+        schema_version = reader.execute("PRAGMA schema_version").fetchone()[0]
+    finally:
+        if conn is None:
+            reader.close()
+    if not (checked and checked[2] == hooks and checked[1] == schema_version):
+        schema_version, _ = db_writer.run(db_path, _run_hooks)
+        stamp = db_fingerprint(key)
+    _triggers_checked[key] = (stamp, schema_version, hooks)
+
+
+# --- TABLE VERSIONS ---
+
+def version_triggers(conn, table):
+    """Triggers bumping ``table_versions`` on every insert, update and
+    delete of ``table``. Returns True when they were (re)created."""
+    conn.execute("INSERT OR IGNORE INTO table_versions (tbl, version) VALUES (?, 0)", (table,))
+    bump = f"UPDATE table_versions SET version = version + 1 WHERE tbl = '{table}';"
+    return replace_triggers(conn, table, "version", {
+        f"version_{table}_{op.lower()}": f'CREATE TRIGGER "version_{table}_{op.lower()}" AFTER {op} ON "{table}" BEGIN {bump} END'
+        for op in ("INSERT", "UPDATE", "DELETE")
+    })
+
+
+def table_version(conn, table):
+    """Data version of ``table``: changes with every write to it and with
+    every schema change of the database. None for tables without version
+    triggers (views, tables created since the last ``ensure_triggers``)."""
+    row = conn.execute("SELECT version FROM table_versions WHERE tbl = ?", (table,)).fetchone()
+    if row is None:
+        return None
+    return f"{row[0]}-{conn.execute('PRAGMA schema_version').fetchone()[0]}"
+
+
+def _versions_hook(conn, tables):
+    changed = [t for t in tables if version_triggers(conn, t)]
+    conn.execute(
+        "DELETE FROM table_versions WHERE tbl != '*' AND tbl NOT IN (SELECT name FROM sqlite_master WHERE type = 'table')")
+    return changed
+
+
+register_triggers("versions", _versions_hook)
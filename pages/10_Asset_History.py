@@ -0,0 +1,75 @@
+import streamlit as st
+import profiler
+import pandas as pd
+import shared_utils as su
+import timeline
+
+st.set_page_config(page_title="Asset History", layout="wide")
+st.title("Asset History")
+perf = profiler.PageTimer("Asset History")
+
+# --- Session Info ---
+user_email = st.session_state.get("user_email", "unknown@example.com")
+user_role = st.session_state.get("user_role", "guest")
+db_path = su.get_db_path()
+active_table = su.get_active_table()
+
+st.sidebar.markdown(f"Role: {user_role}  \n📧 Email: {user_email}")
+st.sidebar.info(f"Active Table: `{active_table}`")
+
+# --- Asset ---
+perf.section("Asset")
+equipment_id = st.text_input("Equipment ID", placeholder="e.g., EQP-001", key="history_equipment_id").strip()
+if not equipment_id:
+    st.info("Enter an equipment ID to see its maintenance, scans and audit events.")
+    perf.finish()
+    st.stop()
+
+equipment_df = su.load_equipment()
+id_col = su.get_id_column(equipment_df)
+if id_col and not equipment_df.empty:
+    id_index = su.id_index(equipment_df, id_col)
+    resolved = id_index.exact(equipment_id)
+    if resolved is not None:
+        equipment_id = resolved
+    else:
+        suggestions = [sid for sid, _ in id_index.match(equipment_id)]
+        if suggestions:
+            st.caption(f"`{equipment_id}` is not in `{active_table}`. Similar IDs: {', '.join(suggestions)}")
+
+kinds = st.sidebar.multiselect("Show", list(timeline.KINDS), default=list(timeline.KINDS))
+page_size = st.sidebar.selectbox("Events per page", [25, 50, 100, 250], index=1)
+
+# Cursor stack per asset and filter: one entry per page already shown
+nav_key = (equipment_id.lower(), tuple(kinds), page_size)
+if st.session_state.get("history_nav_key") != nav_key:
+    st.session_state.history_nav_key = nav_key
+    st.session_state.history_cursors = [None]
+cursors = st.session_state.history_cursors
+
+# --- Timeline ---
+perf.section("Timeline")
+with su.load_connection() as conn:
+    totals = timeline.counts(conn, equipment_id)
+    events, next_cursor = timeline.page(conn, equipment_id, page_size, cursors[-1], kinds) if kinds else (pd.DataFrame(), None)
+
+st.subheader(f"`{equipment_id}`")
+cols = st.columns(len(totals))
+for col, (kind, n) in zip(cols, totals.items()):
+    col.metric(kind.title(), n)
+
+if events.empty:
+    st.info("No events recorded for this asset.")
+else:
+    st.caption(f"Page {len(cursors)}, newest first")
+    st.dataframe(events.drop(columns=["ts", "id"]), use_container_width=True, hide_index=True)
+
+c1, c2 = st.columns(2)
+if c1.button("⬅️ Newer", disabled=len(cursors) == 1):
+    cursors.pop()
+    st.rerun()
+if c2.button("Older ➡️", disabled=next_cursor is None):
+    cursors.append(next_cursor)
+    st.rerun()
+
+perf.finish()
@@ -1,12 +1,15 @@
 import streamlit as st
+import profiler
 import pandas as pd
 import yaml
 import os
 from datetime import datetime
 import shared_utils as su
+import facets
 
 st.set_page_config(page_title="Inventory Management", layout="wide")
 st.title("📦 Inventory Management")
+perf = profiler.PageTimer("Inventory")
 
 # --- Session Info ---
 user_email = st.session_state.get("user_email", "unknown@example.com")
@@ -18,6 +21,7 @@ st.sidebar.markdown(f"🔐 Role: {user_role} | 📧 Email: {user_email}")
 st.sidebar.info(f"📦 Active Table: `{active_table}`")
 
 # --- Load Data ---
+perf.section("Load Data")
 df = su.load_equipment()
 
 # --- Template File ---
@@ -32,6 +36,7 @@ table_key = f"{user_email}_{os.path.basename(db_path)}_{active_table}"
 template = templates.get(table_key, {})
 
 # --- Admin: Add Column ---
+perf.section("Admin: Add Column")
 if user_role == "admin":
     st.subheader("🔧 Admin Tools")
     with st.expander("➕ Add New Column"):
@@ -39,8 +44,7 @@ if user_role == "admin":
         col_type = st.selectbox("Column Type", ["TEXT", "INTEGER", "REAL"])
         if st.button("Add Column") and new_col:
             try:
-                with su.load_connection() as conn:
-                    conn.execute(f"ALTER TABLE {active_table} ADD COLUMN {new_col} {col_type}")
+                su.run_write(lambda conn: conn.execute(f"ALTER TABLE {active_table} ADD COLUMN {new_col} {col_type}"))
                 su.log_audit("Add Column", f"{new_col} ({col_type}) added to {active_table}")
                 st.success(f"Column `{new_col}` added.")
                 st.rerun()
@@ -48,14 +52,17 @@ if user_role == "admin":
                 st.error(f"Failed to add column: {e}")
 
 # --- Add New Item Using Template ---
+perf.section("Add New Item")
 if not df.empty:
     st.subheader("➕ Add New Item")
     col_names = df.columns.drop(["selected"], errors="ignore")
     new_data = {}
 
+    # Distinct values from the facet index; a column that isn't faceted has too many for a dropdown
+    options = facets.options(db_path, active_table, list(col_names))
     cols = st.columns(len(col_names))
     for i, col in enumerate(col_names):
-        unique_vals = df[col].dropna().unique().tolist()
+        unique_vals = options.get(col, [])
         default = template.get(col, "")
         if 1 < len(unique_vals) < 20:
             new_data[col] = cols[i].selectbox(
@@ -70,10 +77,9 @@ if not df.empty:
 
     if st.button("Add to Inventory"):
         try:
-            with su.load_connection() as conn:
-                values = tuple(new_data[col] for col in col_names)
-                placeholders = ', '.join('?' for _ in values)
-                conn.execute(f"INSERT INTO {active_table} ({', '.join(col_names)}) VALUES ({placeholders})", values)
+            values = tuple(new_data[col] for col in col_names)
+            placeholders = ', '.join('?' for _ in values)
+            su.run_write(lambda conn: conn.execute(f"INSERT INTO {active_table} ({', '.join(col_names)}) VALUES ({placeholders})", values))
             su.log_audit("Add Item", f"New item added to {active_table}")
             st.success("✅ Item added!")
             st.rerun()
@@ -81,6 +87,7 @@ if not df.empty:
             st.error(f"Failed to add item: {e}")
 
 # --- Edit/Delete Table ---
+perf.section("Edit & Delete")
 st.subheader("📝 Edit & Delete Items")
 if df.empty:
     st.info("No inventory yet.")
@@ -97,12 +104,20 @@ else:
     with col1:
         if st.button("💾 Save Changes"):
             try:
-                with su.load_connection() as conn:
-                    conn.execute(f"DELETE FROM {active_table}")
-                    editable_df.drop(columns=["selected"]).to_sql(active_table, conn, if_exists="append", index=False)
-                su.log_audit("Save Changes", f"Table {active_table} fully updated")
-                st.success("Saved successfully.")
-                st.rerun()
+                to_save = editable_df.drop(columns=["selected"])
+                if len(to_save) > su.BACKGROUND_ROWS:
+                    import job_tasks
+
+                    su.submit_job("save_table", job_tasks.save_table, db_path, active_table, to_save)
+                    su.log_audit("Save Changes", f"Table {active_table} full update queued")
+                else:
+                    def replace_rows(conn):
+                        conn.execute(f"DELETE FROM {active_table}")
+                        to_save.to_sql(active_table, conn, if_exists="append", index=False)
+                    su.run_write(replace_rows)
+                    su.log_audit("Save Changes", f"Table {active_table} fully updated")
+                    st.success("Saved successfully.")
+                    st.rerun()
             except Exception as e:
                 st.error(f"Failed to save changes: {e}")
 
@@ -111,10 +126,11 @@ else:
             try:
                 to_delete = editable_df[editable_df["selected"] == True]
                 if not to_delete.empty:
-                    with su.load_connection() as conn:
+                    def delete_rows(conn):
                         for _, row in to_delete.iterrows():
                             condition = ' AND '.join([f"{col} = ?" for col in to_delete.columns if col != 'selected'])
                             conn.execute(f"DELETE FROM {active_table} WHERE {condition}", tuple(row[col] for col in to_delete.columns if col != 'selected'))
+                    su.run_write(delete_rows)
                     su.log_audit("Delete Items", f"{len(to_delete)} rows deleted from {active_table}")
                     st.success(f"Deleted {len(to_delete)} item(s).")
                     st.rerun()
@@ -134,3 +150,7 @@ else:
                 st.warning("Please select one row.")
             else:
                 st.warning("Select only one row.")
+
+su.render_jobs(kinds=["save_table"], limit=3)
+
+perf.finish()
@@ -1,11 +1,15 @@
 import streamlit as st
+import profiler
 import pandas as pd
 import os
 from datetime import datetime
 import shared_utils as su
+import data_import
+import migrations
 
 st.set_page_config(page_title="🛠 Maintenance Log", layout="wide")
 st.title("🛠 Maintenance Log")
+perf = profiler.PageTimer("Maintenance")
 
 # --- Session Info ---
 user_email = st.session_state.get("user_email", "unknown@example.com")
@@ -17,15 +21,23 @@ st.sidebar.markdown(f"Role: {user_role}  \n📧 Email: {user_email}")
 st.sidebar.info(f"Active Table: `{active_table}`")
 
 # --- Load Data ---
+perf.section("Load Data")
 equipment_df = su.load_equipment()
 maintenance_df = su.load_maintenance()
 
 # --- Maintenance Log Display ---
+perf.section("Maintenance Log Display")
 if not maintenance_df.empty:
     st.subheader("🧾 Maintenance History")
     st.dataframe(maintenance_df, use_container_width=True)
-    csv = maintenance_df.to_csv(index=False).encode("utf-8")
-    st.download_button("📥 Download Maintenance Log", csv, "maintenance_log.csv", mime="text/csv")
+    if len(maintenance_df) <= su.BACKGROUND_ROWS:
+        csv = maintenance_df.to_csv(index=False).encode("utf-8")
+        st.download_button("📥 Download Maintenance Log", csv, "maintenance_log.csv", mime="text/csv")
+    elif st.button("📥 Prepare Maintenance Log export"):
+        import job_tasks
+
+        su.submit_job("export", job_tasks.export_table, db_path, "maintenance_log", "maintenance_log.csv")
+    su.render_jobs(kinds=["export"], limit=3)
 else:
     st.info("No maintenance records yet.")
 
@@ -34,6 +46,7 @@ id_col = su.get_id_column(equipment_df)
 item_options = equipment_df[id_col].dropna().astype(str).tolist()
 
 # --- Add Maintenance Entry ---
+perf.section("Add Maintenance Entry")
 st.subheader("➕ Add Maintenance Record")
 
 with st.form("maintenance_entry_form"):
@@ -44,6 +57,7 @@ with st.form("maintenance_entry_form"):
         equipment_id = st.selectbox("Choose Equipment", item_options)
     elif input_mode == "Manual Entry":
         equipment_id = st.text_input("Enter Equipment ID Manually").strip()
+        allow_unknown = st.checkbox("Log even if the ID is not in the equipment table")
 
     description = st.text_area("Work Description")
     date_performed = st.date_input("Date Performed", value=datetime.today())
@@ -51,30 +65,30 @@ with st.form("maintenance_entry_form"):
 
     submit_log = st.form_submit_button("💾 Save Record")
 
+if submit_log and equipment_id and input_mode == "Manual Entry" and id_col:
+    # Manual IDs are often one character off; map them onto the known ID
+    id_index = su.id_index(equipment_df, id_col)
+    resolved = id_index.exact(equipment_id)
+    if resolved is not None:
+        equipment_id = resolved
+    elif not allow_unknown:
+        suggestions = [sid for sid, _ in id_index.match(equipment_id)]
+        hint = f" Did you mean: {', '.join(suggestions)}?" if suggestions else ""
+        st.error(f"`{equipment_id}` is not in `{active_table}`.{hint}")
+        submit_log = False
+
 if submit_log and equipment_id and description:
     try:
-        with su.load_connection() as conn:
-            # Ensure table exists
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS maintenance_log (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    equipment_id TEXT,
-                    description TEXT,
-                    date TEXT,
-                    technician TEXT,
-                    logged_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+        def save_record(conn):
             conn.execute("""
                 INSERT INTO maintenance_log (equipment_id, description, date, technician) 
                 VALUES (?, ?, ?, ?)
             """, (equipment_id, description, str(date_performed), technician))
 
             # Update last_maintenance_date in main equipment table
-            df_equipment = pd.read_sql_query(f"SELECT * FROM {active_table}", conn)
-            id_column = su.get_id_column(df_equipment)
+            id_column = migrations.table_id_column(conn, active_table)
             if id_column:
-                if "last_maintenance_date" not in df_equipment.columns:
+                if "last_maintenance_date" not in migrations.table_columns(conn, active_table):
                     conn.execute(f"ALTER TABLE {active_table} ADD COLUMN last_maintenance_date TEXT")
                 conn.execute(f"""
                     UPDATE {active_table}
@@ -82,9 +96,31 @@ if submit_log and equipment_id and description:
                     WHERE LOWER({id_column}) = LOWER(?)
                 """, (str(date_performed), equipment_id))
 
-            conn.commit()
+        su.run_write(save_record)
 
-        su.log_audit("Add Maintenance", f"Logged maintenance for equipment {equipment_id}")
+        su.log_audit("Add Maintenance", f"Logged maintenance for equipment {equipment_id}", equipment_id=equipment_id)
         st.success("✅ Maintenance record added.")
     except Exception as e:
         st.error(f"❌ Error saving record: {e}")
+
+# --- Bulk Import ---
+perf.section("Bulk Import")
+with st.expander("📥 Bulk Import Maintenance Records"):
+    st.caption("CSV or Excel with columns: equipment_id (or Asset_ID), description, date, technician.")
+    bulk_file = st.file_uploader("Upload maintenance file", type=["csv", "xlsx", "xls", "tsv"], key="maintenance_bulk_upload")
+    if bulk_file:
+        try:
+            records, rejected = data_import.prepare_maintenance(data_import.read_upload(bulk_file))
+            st.dataframe(records.head(200), use_container_width=True)
+            st.write(f"{len(records)} valid record(s), {len(rejected)} skipped (missing equipment ID or date).")
+            if not rejected.empty:
+                st.download_button("⬇️ Download skipped rows", rejected.to_csv(index=False).encode("utf-8"), "skipped_maintenance.csv")
+
+            if st.button(f"Import {len(records)} record(s)", disabled=records.empty, key="maintenance_bulk_btn"):
+                result = su.run_write(lambda conn: data_import.import_maintenance(conn, records, active_table))
+                su.log_audit("Bulk Maintenance Import", f"Imported {result['inserted']} records, updated {result['assets_updated']} assets")
+                st.success(f"✅ Imported {result['inserted']} record(s); last maintenance date updated on {result['assets_updated']} asset(s).")
+        except Exception as e:
+            st.error(f"❌ Import failed: {e}")
+
+perf.finish()
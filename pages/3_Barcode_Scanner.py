@@ -1,15 +1,17 @@
 import streamlit as st
+import profiler
 import pandas as pd
-import qrcode
 import io
 import os
-from zipfile import ZipFile
-import altair as alt
 from datetime import datetime
 import shared_utils as su
+import catalog
+import locations
+import timestamps
 
 st.set_page_config(page_title="Barcode Scanner", layout="wide")
 st.title("Scan & Track Equipment")
+perf = profiler.PageTimer("Barcode Scanner")
 
 # --- Session Info ---
 user_email = st.session_state.get("user_email", "unknown@example.com")
@@ -20,20 +22,8 @@ active_table = su.get_active_table()
 st.sidebar.markdown(f"Role: {user_role}  \n📧 Email: {user_email}")
 st.sidebar.info(f"Active Table: `{active_table}`")
 
-# --- Ensure scanned_items table exists ---
-with su.load_connection() as conn:
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS scanned_items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            equipment_id TEXT,
-            location TEXT,
-            timestamp TEXT,
-            scanned_by TEXT
-        )
-    """)
-    conn.commit()
-
 # --- Load Equipment ---
+perf.section("Load Equipment")
 equipment_df = su.load_equipment()
 id_col = su.get_id_column(equipment_df)
 if id_col:
@@ -52,36 +42,120 @@ equipment_id = st.text_input("Equipment ID (barcode or manual entry)", placehold
 location = st.text_input("Location (optional)", placeholder="e.g., Warehouse A").strip()
 
 # --- QR Code Preview ---
+perf.section("QR Code Preview")
 if equipment_id:
+    import qrcode
+
     qr = qrcode.make(equipment_id)
     buf = io.BytesIO()
     qr.save(buf)
     st.image(buf.getvalue(), caption="QR Code", width=150)
 
 # --- QR Batch Mode ---
+perf.section("QR Batch Mode")
 with st.expander("Generate QR Batch"):
     prefix = st.text_input("Prefix", value="EQP")
     start = st.number_input("Start Number", min_value=1, value=1)
     count = st.number_input("How many?", min_value=1, value=5)
     if st.button("Generate Batch QR Codes"):
-        qr_zip = io.BytesIO()
-        with ZipFile(qr_zip, 'w') as zf:
-            for i in range(start, start + count):
-                id_code = f"{prefix}-{str(i).zfill(3)}"
-                qr_img = qrcode.make(id_code)
-                img_buf = io.BytesIO()
-                qr_img.save(img_buf, format="PNG")
-                zf.writestr(f"{id_code}.png", img_buf.getvalue())
-        st.download_button("⬇️ Download QR ZIP", qr_zip.getvalue(), "qr_batch.zip")
+        import job_tasks
+
+        su.submit_job("qr_batch", job_tasks.qr_batch, prefix, int(start), int(count))
+    su.render_jobs(kinds=["qr_batch"], limit=3)
+
+# --- Bulk Photo Ingest ---
+perf.section("Bulk Photo Ingest")
+with st.expander("📷 Bulk Scan from Photos"):
+    import photo_scan
+
+    photos = st.file_uploader(
+        "Tag photos or a ZIP of them", type=["zip", *photo_scan.IMAGE_TYPES], accept_multiple_files=True, key="bulk_photos"
+    )
+    bulk_location = st.text_input("Location for these scans", placeholder="e.g., Site 12", key="bulk_location").strip()
+    if photos and st.button("Decode Photos"):
+        images = photo_scan.read_uploads(photos)
+        bar = st.progress(0.0, text=f"Decoding {len(images)} image(s)")
+        results, stats = photo_scan.decode_batch(
+            images, progress=lambda done, total: bar.progress(done / total, text=f"{done} / {total} images")
+        )
+        bar.empty()
+        st.session_state.bulk_decode = (results, stats)
+
+    if "bulk_decode" in st.session_state:
+        results, stats = st.session_state.bulk_decode
+        st.caption(f"{stats['decoded']} of {stats['images']} image(s) decoded in {stats['seconds']} s "
+                   f"({stats['images_per_sec']} images/s)")
+        codes = photo_scan.unique_codes(results)
+        if id_col and not equipment_df.empty and not codes.empty:
+            # Canonical spelling of IDs that exist; misreads are flagged rather than added
+            index = su.id_index(equipment_df, id_col)
+            codes["equipment_id"] = [index.exact(c) for c in codes["code"]]
+        else:
+            codes["equipment_id"] = None
+        codes["in table"] = codes["equipment_id"].notna()
+        st.dataframe(codes, use_container_width=True, hide_index=True)
+
+        failed = results[results["error"].notna()]
+        if not failed.empty:
+            with st.expander(f"❌ {len(failed)} image(s) not decoded"):
+                st.dataframe(failed[["image", "error"]], use_container_width=True, hide_index=True)
+
+        include_unknown = st.checkbox("Also record codes that are not in the table", key="bulk_unknown")
+        to_record = codes if include_unknown else codes[codes["in table"]]
+        if not bulk_location:
+            st.caption("Enter the location for these scans to record them.")
+        if not to_record.empty and st.button(f"Record {len(to_record)} scan(s)", disabled=not bulk_location):
+            now = timestamps.now()
+            rows = [(eid if eid is not None else code, bulk_location, now, user_email)
+                    for code, eid in zip(to_record["code"], to_record["equipment_id"])]
+            su.submit_write(
+                "INSERT INTO scanned_items (equipment_id, location, timestamp, scanned_by) VALUES (?, ?, ?, ?)",
+                rows, many=True,
+            ).result()
+            su.log_audit("Bulk Scan", f"{len(rows)} scans from {stats['images']} photos at {bulk_location}")
+            del st.session_state.bulk_decode
+            st.success(f"Recorded {len(rows)} scan(s).")
 
 # --- Load Existing Record (for editing) ---
+perf.section("Record Lookup")
 record = None
+if equipment_id and id_col and not equipment_df.empty:
+    # Misread or mistyped labels: resolve to an existing ID before the insert path creates a new one
+    id_index = su.id_index(equipment_df, id_col)
+    resolved = id_index.exact(equipment_id)
+    if resolved is None:
+        suggestions = id_index.match(equipment_id)
+        if suggestions:
+            st.warning(f"`{equipment_id}` is not in `{active_table}`. Did you mean one of these?")
+            new_label = f"➕ Keep `{equipment_id}` as a new item"
+            choice = st.radio(
+                "Use equipment ID",
+                [sid for sid, _ in suggestions] + [new_label],
+                key=f"id_suggest_{equipment_id}"
+            )
+            if choice != new_label:
+                resolved = choice
+    if resolved is not None:
+        equipment_id = resolved
+
 if equipment_id and not equipment_df.empty:
     match_row = equipment_df[equipment_df["equipment_id"].str.lower() == equipment_id.lower()]
     if not match_row.empty:
         record = match_row.iloc[0].to_dict()
 
+# --- Location ---
+if equipment_id:
+    with su.get_conn(db_path) as conn:
+        where = locations.current(conn, equipment_id)
+        moves = locations.history(conn, equipment_id, limit=20)
+    if where:
+        st.info(f"📍 Last seen at **{where['location']}** on {timestamps.local_text(where['last_seen'])} by {where['scanned_by']}")
+    if not moves.empty:
+        with st.expander(f"Movement history ({len(moves)} most recent moves)"):
+            st.dataframe(moves, use_container_width=True, hide_index=True)
+
 # --- Edit/Add Form ---
+perf.section("Edit/Add Form")
 if equipment_id:
     st.markdown("### Edit or Add Entry")
     with st.form("update_form"):
@@ -96,68 +170,94 @@ if equipment_id:
 
     if submit:
         try:
-            with su.load_connection() as conn:
-                if record is not None:
-                    clause = ", ".join([f"{k}=?" for k in updated.keys()])
-                    conn.execute(
-                        f"UPDATE {active_table} SET {clause} WHERE LOWER({id_col}) = LOWER(?)",
-                        list(updated.values()) + [equipment_id]
-                    )
-                    st.success("Record updated.")
-                    su.log_audit("Update Record", f"Updated equipment {equipment_id}")
-                else:
-                    columns = f"{id_col}, " + ", ".join(updated.keys())
-                    placeholders = ", ".join(["?"] * (len(updated) + 1))
-                    conn.execute(
-                        f"INSERT INTO {active_table} ({columns}) VALUES ({placeholders})",
-                        [equipment_id] + list(updated.values())
-                    )
-                    st.success("New record added.")
-                    su.log_audit("Add Record", f"Added new equipment {equipment_id}")
-
-                conn.execute("""
-                    INSERT INTO scanned_items (equipment_id, location, timestamp, scanned_by) 
-                    VALUES (?, ?, ?, ?)""",
-                    (equipment_id, location, str(datetime.now()), user_email))
-                conn.commit()
-
-                su.log_audit("Scan Recorded", f"Scanned equipment {equipment_id} at {location}")
-                st.success("Scan recorded.")
+            # Both statements go through the DB's single writer and are committed
+            # together with whatever other sessions queued at the same moment
+            if record is not None:
+                clause = ", ".join([f"{k}=?" for k in updated.keys()])
+                record_write = su.submit_write(
+                    f"UPDATE {active_table} SET {clause} WHERE LOWER({id_col}) = LOWER(?)",
+                    list(updated.values()) + [equipment_id]
+                )
+            else:
+                columns = f"{id_col}, " + ", ".join(updated.keys())
+                placeholders = ", ".join(["?"] * (len(updated) + 1))
+                record_write = su.submit_write(
+                    f"INSERT INTO {active_table} ({columns}) VALUES ({placeholders})",
+                    [equipment_id] + list(updated.values())
+                )
+            scan_write = su.submit_write("""
+                INSERT INTO scanned_items (equipment_id, location, timestamp, scanned_by) 
+                VALUES (?, ?, ?, ?)""",
+                (equipment_id, location, timestamps.now(), user_email))
+
+            record_write.result()
+            if record is not None:
+                st.success("Record updated.")
+                su.log_audit("Update Record", f"Updated equipment {equipment_id}", equipment_id=equipment_id)
+            else:
+                st.success("New record added.")
+                su.log_audit("Add Record", f"Added new equipment {equipment_id}", equipment_id=equipment_id)
+
+            scan_write.result()
+            su.log_audit("Scan Recorded", f"Scanned equipment {equipment_id} at {location}", equipment_id=equipment_id)
+            st.success("Scan recorded.")
         except Exception as e:
             st.error(f"Failed to save: {e}")
 
 # --- Scan Log ---
+perf.section("Scan Log")
 st.markdown("### Scan Log & Analytics")
-scan_df = su.load_scans()
+# Row count from the catalog; the full history is only loaded when a view needs every row
+scan_count = catalog.row_count(db_path, "scanned_items")
 
 # --- Filters ---
 filter_col1, filter_col2 = st.columns(2)
 filter_date = filter_col1.date_input("📅 Filter by Date", value=datetime.today())
 filter_id = filter_col2.text_input("Filter by Equipment ID", "")
 
-filtered = scan_df.copy()
-if filter_date:
-    filtered = filtered[filtered["timestamp"].dt.date == filter_date]
+filtered = su.load_scans(filter_date, filter_date) if filter_date else su.load_scans()
 if filter_id:
     filtered = filtered[filtered["equipment_id"].str.contains(filter_id, case=False, na=False)]
 
 st.dataframe(filtered, use_container_width=True)
 
 # --- Scan Trend Chart ---
-if not scan_df.empty:
-    scan_trend = scan_df.groupby(scan_df["timestamp"].dt.date).size().reset_index(name="scans")
+perf.section("Scan Trend Chart")
+if scan_count:
+    import altair as alt
+
+    import charts
+
+    scan_trend, used = charts.time_series(db_path, "scanned_items", "timestamp")
     chart = alt.Chart(scan_trend).mark_bar().encode(
-        x="timestamp:T", y="scans:Q"
-    ).properties(title="Scans Over Time")
+        x=alt.X("bucket:T", title=used.title()), y=alt.Y("count:Q", title="Scans")
+    ).properties(title=f"Scans Over Time (per {used})")
     st.altair_chart(chart, use_container_width=True)
 
 # --- Group Summary ---
-with st.expander("Group Summary"):
-    by = st.selectbox("Group scans by:", ["scanned_by", "location"])
-    summary = scan_df.groupby(by).size().reset_index(name="count")
-    st.bar_chart(summary.set_index(by))
+perf.section("Group Summary")
+summary_panel = st.expander("Group Summary", on_change="rerun", key="group_summary_open")
+with summary_panel:
+    # Queried only while open, so a closed panel costs neither the query nor the chart
+    if summary_panel.open:
+        import analytics
+
+        by = st.selectbox("Group scans by:", ["scanned_by", "location"])
+        summary = analytics.query(
+            db_path, "scanned_items", f"SELECT {by}, COUNT(*) AS count FROM scanned_items GROUP BY 1 ORDER BY 1"
+        )
+        st.bar_chart(summary.set_index(by))
 
 # --- Export ---
+perf.section("Export")
 with st.expander("📤 Export Logs"):
-    csv_data = scan_df.to_csv(index=False).encode("utf-8")
-    st.download_button("⬇️ Download CSV", csv_data, "scans.csv", mime="text/csv")
+    if scan_count <= su.BACKGROUND_ROWS:
+        csv_data = su.load_scans().to_csv(index=False).encode("utf-8")
+        st.download_button("⬇️ Download CSV", csv_data, "scans.csv", mime="text/csv")
+    elif st.button("Prepare CSV export"):
+        import job_tasks
+
+        su.submit_job("export", job_tasks.export_table, db_path, "scanned_items", "scans.csv")
+    su.render_jobs(kinds=["export"], limit=3)
+
+perf.finish()
@@ -1,13 +1,18 @@
 import streamlit as st
+import profiler
 import pandas as pd
-import altair as alt
+import numpy as np
 import os
 from datetime import datetime
 import yaml
 import shared_utils as su
+import charts
+import forecast
+import timestamps
 
 st.set_page_config(page_title="Dashboard", layout="wide")
 st.title("Dashboard")
+perf = profiler.PageTimer("Dashboard")
 
 # --- Session Info ---
 user_email = st.session_state.get("user_email", "unknown@example.com")
@@ -19,6 +24,7 @@ st.sidebar.markdown(f"Role: {user_role} | 📧 Email: {user_email}")
 st.sidebar.info(f"Active Table: `{active_table}`")
 
 # --- Sidebar Layout Toggles ---
+perf.section("Sidebar Layout Toggles")
 layout_file = f"layout_{user_email.replace('@','_at_')}.yaml"
 if os.path.exists(layout_file):
     with open(layout_file) as f:
@@ -27,10 +33,12 @@ else:
     st.session_state.visible_widgets = {
         "kpis": True,
         "status_chart": True,
+        "forecast": True,
         "inventory_table": True,
         "maintenance_chart": user_role == "admin",
         "scans_chart": user_role == "admin"
     }
+st.session_state.visible_widgets.setdefault("forecast", True)
 
 st.sidebar.subheader("Dashboard Sections")
 for key in st.session_state.visible_widgets:
@@ -45,6 +53,7 @@ chart_type = st.sidebar.radio("Select chart type", ["Bar", "Pie"])
 st.sidebar.subheader("Date Filter")
 start_date = st.sidebar.date_input("Start Date", datetime.today().replace(day=1))
 end_date = st.sidebar.date_input("End Date", datetime.today())
+bucket = st.sidebar.selectbox("Time bucket", ["auto"] + list(charts.BUCKETS))
 
 if st.sidebar.checkbox("Auto Refresh"):
     st.rerun()
@@ -52,35 +61,18 @@ if st.sidebar.checkbox("Auto Refresh"):
 with open(layout_file, "w") as f:
     yaml.dump(st.session_state.visible_widgets, f)
 
-# --- Load Tables centrally ---
-equipment_df = su.load_equipment()
-maintenance_df = su.load_maintenance()
-scans_df = su.load_scans()
-
-# --- Merge Maintenance Info ---
-if not maintenance_df.empty:
-    id_col = su.get_id_column(equipment_df)
-    latest_maintenance = (
-        maintenance_df.sort_values("date")
-        .dropna(subset=["equipment_id"])
-        .drop_duplicates(subset=["equipment_id"], keep="last")[["equipment_id", "date"]]
-    )
-    equipment_df = equipment_df.merge(
-        latest_maintenance, how="left",
-        left_on=id_col, right_on="equipment_id"
-    )
-    equipment_df["maintenance_status"] = equipment_df["date"].apply(
-        lambda d: "🟢 Recent" if pd.notna(d) and (datetime.today() - d).days <= 30
-        else ("🔴 Old" if pd.notna(d) else "⚪ Never")
-    )
-else:
-    equipment_df["maintenance_status"] = "⚪ Never"
+# --- Data (loaded by the sections that are shown) ---
+data = su.LazyData(equipment=su.load_equipment, latest_maintenance=su.load_latest_maintenance)
+visible = st.session_state.visible_widgets
 
 # --- Audit logging for dashboard access ---
+perf.section("Audit")
 su.log_audit("View Dashboard", f"Loaded dashboard for table {active_table}")
 
 # --- KPI ---
-if st.session_state.visible_widgets.get("kpis"):
+perf.section("KPIs")
+if visible.get("kpis"):
+    equipment_df = data["equipment"]
     st.subheader("Key Stats")
     col1, col2, col3 = st.columns(3)
     col1.metric("Total Records", len(equipment_df))
@@ -94,10 +86,14 @@ if st.session_state.visible_widgets.get("kpis"):
                 col3.metric("2nd Type", top_types.index[1])
 
 # --- Status Chart ---
-if st.session_state.visible_widgets.get("status_chart"):
+perf.section("Status Chart")
+if visible.get("status_chart"):
+    equipment_df = data["equipment"]
     st.subheader("Equipment Status")
     status_col = next((col for col in equipment_df.columns if col.lower() == "status"), None)
     if status_col:
+        import altair as alt
+
         status_data = equipment_df[status_col].dropna().astype(str).str.title().value_counts().reset_index()
         status_data.columns = ["status", "count"]
         if chart_type == "Bar":
@@ -106,32 +102,68 @@ if st.session_state.visible_widgets.get("status_chart"):
             chart = alt.Chart(status_data).mark_arc().encode(theta="count:Q", color="status:N")
         st.altair_chart(chart, use_container_width=True)
 
-# --- Inventory Table ---
-if st.session_state.visible_widgets.get("inventory_table"):
+# --- Maintenance Forecast (precomputed by forecast.py / the Predictive page) ---
+perf.section("Maintenance Forecast")
+if visible.get("forecast"):
+    with su.load_connection() as conn:
+        counts, computed_at = forecast.summary(conn, active_table)
+    st.subheader("Maintenance Forecast")
+    if computed_at is None:
+        st.info("No forecast yet. Open Predictive Maintenance or run `python forecast.py`.")
+    else:
+        cols = st.columns(len(forecast.EMOJI))
+        for col, (status, emoji) in zip(cols, forecast.EMOJI.items()):
+            col.metric(f"{emoji} {status}", counts.get(status, 0))
+        st.caption(f"As of {timestamps.local_text(computed_at)}")
+
+# --- Inventory Table (with maintenance info) ---
+perf.section("Inventory Table")
+if visible.get("inventory_table"):
+    equipment_df = data["equipment"]
+    latest_maintenance = data["latest_maintenance"].rename(columns={"date": "last_maintenance"})
+    id_col = su.get_id_column(equipment_df)
+    if not latest_maintenance.empty and id_col:
+        equipment_df = equipment_df.merge(
+            latest_maintenance, how="left",
+            left_on=id_col, right_on="equipment_id", suffixes=("", "_maint")
+        )
+        age = (pd.Timestamp(datetime.today()) - equipment_df["last_maintenance"]).dt.days
+        equipment_df["maintenance_status"] = np.select(
+            [equipment_df["last_maintenance"].isna(), age <= 30], ["⚪ Never", "🟢 Recent"], default="🔴 Old"
+        )
+    else:
+        equipment_df = equipment_df.assign(maintenance_status="⚪ Never")
     st.subheader("Current Active Table")
     st.dataframe(equipment_df, use_container_width=True)
 
 # --- Maintenance Chart ---
-if st.session_state.visible_widgets.get("maintenance_chart") and not maintenance_df.empty:
-    st.subheader("Maintenance Logs Over Time")
-    filtered = maintenance_df[
-        (maintenance_df["date"] >= pd.to_datetime(start_date)) &
-        (maintenance_df["date"] <= pd.to_datetime(end_date))
-    ]
-    chart = alt.Chart(filtered).mark_bar().encode(
-        x="date:T", y="count():Q"
-    ).transform_aggregate(count="count()", groupby=["date"])
-    st.altair_chart(chart, use_container_width=True)
+perf.section("Maintenance Chart")
+if visible.get("maintenance_chart"):
+    series, used = charts.time_series(db_path, "maintenance_log", "date", start_date, end_date, bucket, dates=True)
+    st.subheader(f"Maintenance Logs Over Time (per {used})")
+    if series.empty:
+        st.info("No maintenance records in this date range.")
+    else:
+        import altair as alt
+
+        chart = alt.Chart(series).mark_bar().encode(
+            x=alt.X("bucket:T", title=used.title()), y=alt.Y("count:Q", title="Records")
+        )
+        st.altair_chart(chart, use_container_width=True)
 
 # --- Scans Chart ---
-if st.session_state.visible_widgets.get("scans_chart") and not scans_df.empty:
-    st.subheader("Scans Over Time")
-    filtered = scans_df[
-        (scans_df["timestamp"].dt.date >= start_date) &
-        (scans_df["timestamp"].dt.date <= end_date)
-    ]
-    scan_data = filtered.groupby("timestamp").size().reset_index(name="count")
-    chart = alt.Chart(scan_data).mark_line(point=True).encode(
-        x="timestamp:T", y="count:Q"
-    )
-    st.altair_chart(chart, use_container_width=True)
+perf.section("Scans Chart")
+if visible.get("scans_chart"):
+    series, used = charts.time_series(db_path, "scanned_items", "timestamp", start_date, end_date, bucket)
+    st.subheader(f"Scans Over Time (per {used})")
+    if series.empty:
+        st.info("No scans in this date range.")
+    else:
+        import altair as alt
+
+        chart = alt.Chart(series).mark_line(point=len(series) <= 60).encode(
+            x=alt.X("bucket:T", title=used.title()), y=alt.Y("count:Q", title="Scans")
+        )
+        st.altair_chart(chart, use_container_width=True)
+
+perf.finish()
@@ -1,11 +1,17 @@
 import streamlit as st
+import profiler
 import pandas as pd
 import os
 from datetime import datetime
 import shared_utils as su
+import catalog
+import facets
+import locations
+import timestamps
 
 st.set_page_config(page_title="Global Search & Filters", layout="wide")
 st.title("Search & Filters")
+perf = profiler.PageTimer("Search")
 
 # --- Session Info ---
 user_email = st.session_state.get("user_email", "unknown@example.com")
@@ -16,15 +22,15 @@ active_table = su.get_active_table()
 st.sidebar.markdown(f"Role: {user_role}  \n📧 Email: {user_email}")
 st.sidebar.info(f"Active Table: `{active_table}`")
 
-# --- Load Data Centrally ---
-equipment_df = su.load_equipment()
-maintenance_df = su.load_maintenance()
-scans_df = su.load_scans()
+# --- Data (each section loads what it needs, when it is shown) ---
+data = su.LazyData(equipment=su.load_equipment, maintenance=su.load_maintenance, scans=su.load_scans)
 
 # --- Audit log entry for search access ---
+perf.section("Audit")
 su.log_audit("View Search Page", f"Accessed global search for table {active_table}")
 
 # --- Global Search ---
+perf.section("Global Search")
 st.subheader("🔎 Global Search")
 search_term = st.text_input("Enter keyword to search across all tables:")
 
@@ -32,6 +38,8 @@ if search_term:
     st.markdown("### Search Results:")
     found_any = False
 
+    equipment_df, maintenance_df, scans_df = data["equipment"], data["maintenance"], data["scans"]
+
     # Equipment Search
     if not equipment_df.empty:
         results = equipment_df[equipment_df.apply(lambda row: row.astype(str).str.contains(search_term, case=False, na=False).any(), axis=1)]
@@ -64,68 +72,130 @@ st.divider()
 st.subheader("Advanced Filters")
 
 # --- Equipment Filters ---
-if not equipment_df.empty:
-    with st.expander("🔧 Equipment Filters"):
-        cols_lower = {col.lower(): col for col in equipment_df.columns}
-        type_col = cols_lower.get("equipment_type") or cols_lower.get("type")
-        status_col = cols_lower.get("status")
-        location_col = cols_lower.get("location")
-
-        f1, f2, f3 = st.columns(3)
-        type_choice = f1.selectbox("Type", ["All"] + sorted(equipment_df[type_col].dropna().unique().tolist()) if type_col else ["All"])
-        status_choice = f2.selectbox("Status", ["All"] + sorted(equipment_df[status_col].dropna().unique().tolist()) if status_col else ["All"])
-        location_choice = f3.selectbox("Location", ["All"] + sorted(equipment_df[location_col].dropna().unique().tolist()) if location_col else ["All"])
-
-        filtered = equipment_df.copy()
-        if type_choice != "All" and type_col:
-            filtered = filtered[filtered[type_col] == type_choice]
-        if status_choice != "All" and status_col:
-            filtered = filtered[filtered[status_col] == status_choice]
-        if location_choice != "All" and location_col:
-            filtered = filtered[filtered[location_col] == location_choice]
-
-        st.dataframe(filtered, use_container_width=True)
-        st.download_button("Export Equipment Results", filtered.to_csv(index=False), "equipment_results.csv")
+perf.section("Equipment Filters")
+equipment_panel = st.expander("🔧 Equipment Filters", on_change="rerun", key="equipment_filters_open")
+with equipment_panel:
+    if equipment_panel.open:
+        equipment_df = data["equipment"]
+        if equipment_df.empty:
+            st.info("No equipment records.")
+        else:
+            cols_lower = {col.lower(): col for col in equipment_df.columns}
+            type_col = cols_lower.get("equipment_type") or cols_lower.get("type")
+            status_col = cols_lower.get("status")
+            location_col = cols_lower.get("location")
+
+            # Options come from the facet index (facets.py); columns too varied to be faceted fall back to a pass
+            options = facets.options(db_path, active_table, [c for c in (type_col, status_col, location_col) if c])
+
+            def choices(col):
+                if not col:
+                    return ["All"]
+                return ["All"] + (options[col] if col in options else sorted(equipment_df[col].dropna().unique().tolist()))
+
+            f1, f2, f3 = st.columns(3)
+            type_choice = f1.selectbox("Type", choices(type_col))
+            status_choice = f2.selectbox("Status", choices(status_col))
+            location_choice = f3.selectbox("Location", choices(location_col))
+
+            filtered = equipment_df.copy()
+            if type_choice != "All" and type_col:
+                filtered = filtered[filtered[type_col] == type_choice]
+            if status_choice != "All" and status_col:
+                filtered = filtered[filtered[status_col] == status_choice]
+            if location_choice != "All" and location_col:
+                filtered = filtered[filtered[location_col] == location_choice]
+
+            st.dataframe(filtered, use_container_width=True)
+            st.download_button("Export Equipment Results", filtered.to_csv(index=False), "equipment_results.csv")
 
 # --- Maintenance Filters ---
-if not maintenance_df.empty:
-    with st.expander("🛠 Maintenance Filters"):
-        techs = ["All"] + sorted(maintenance_df["technician"].dropna().unique().tolist())
-        tech_choice = st.selectbox("Technician", techs)
-        date_range = st.date_input("Maintenance Date Range", [datetime.today().replace(day=1), datetime.today()])
-
-        filtered = maintenance_df.copy()
-        filtered["date"] = pd.to_datetime(filtered["date"], errors="coerce")
-        if tech_choice != "All":
-            filtered = filtered[filtered["technician"] == tech_choice]
-        filtered = filtered[
-            (filtered["date"] >= pd.to_datetime(date_range[0])) &
-            (filtered["date"] <= pd.to_datetime(date_range[1]))
-        ]
-
-        st.dataframe(filtered, use_container_width=True)
-        st.download_button("Export Maintenance Results", filtered.to_csv(index=False), "maintenance_results.csv")
+perf.section("Maintenance Filters")
+maintenance_panel = st.expander("🛠 Maintenance Filters", on_change="rerun", key="maintenance_filters_open")
+with maintenance_panel:
+    if maintenance_panel.open:
+        maintenance_df = data["maintenance"]
+        if maintenance_df.empty:
+            st.info("No maintenance records.")
+        else:
+            techs = ["All"] + facets.options(db_path, "maintenance_log", ["technician"]).get("technician", [])
+            tech_choice = st.selectbox("Technician", techs)
+            date_range = st.date_input("Maintenance Date Range", [datetime.today().replace(day=1), datetime.today()])
+
+            filtered = maintenance_df.copy()
+            filtered["date"] = pd.to_datetime(filtered["date"], errors="coerce")
+            if tech_choice != "All":
+                filtered = filtered[filtered["technician"] == tech_choice]
+            filtered = filtered[
+                (filtered["date"] >= pd.to_datetime(date_range[0])) &
+                (filtered["date"] <= pd.to_datetime(date_range[1]))
+            ]
+
+            st.dataframe(filtered, use_container_width=True)
+            st.download_button("Export Maintenance Results", filtered.to_csv(index=False), "maintenance_results.csv")
 
 # --- Scan Filters ---
-if not scans_df.empty:
-    with st.expander("Scan Filters"):
-        users = ["All"] + sorted(scans_df["scanned_by"].dropna().unique().tolist())
-        locations = ["All"] + sorted(scans_df["location"].dropna().unique().tolist())
-
-        c1, c2 = st.columns(2)
-        user_choice = c1.selectbox("User", users)
-        loc_choice = c2.selectbox("Location", locations)
-        scan_range = st.date_input("Scan Date Range", [datetime.today().replace(day=1), datetime.today()])
-
-        filtered = scans_df.copy()
-        if user_choice != "All":
-            filtered = filtered[filtered["scanned_by"] == user_choice]
-        if loc_choice != "All":
-            filtered = filtered[filtered["location"] == loc_choice]
-        filtered = filtered[
-            (filtered["timestamp"].dt.date >= scan_range[0]) &
-            (filtered["timestamp"].dt.date <= scan_range[1])
-        ]
-
-        st.dataframe(filtered, use_container_width=True)
-        st.download_button("Export Scan Results", filtered.to_csv(index=False), "scans_results.csv")
+perf.section("Scan Filters")
+scan_panel = st.expander("Scan Filters", on_change="rerun", key="scan_filters_open")
+with scan_panel:
+    if scan_panel.open:
+        import analytics
+
+        # Options come from the facet index, matches from the engine (analytics.py); no full scan load
+        if not catalog.row_count(db_path, "scanned_items"):
+            st.info("No scans recorded.")
+        else:
+            scan_options = facets.options(db_path, "scanned_items", ["scanned_by", "location"])
+            users = ["All"] + scan_options.get("scanned_by", [])
+            scan_locations = ["All"] + scan_options.get("location", [])
+
+            c1, c2 = st.columns(2)
+            user_choice = c1.selectbox("User", users)
+            loc_choice = c2.selectbox("Location", scan_locations)
+            scan_range = st.date_input("Scan Date Range", [datetime.today().replace(day=1), datetime.today()])
+
+            where, params = timestamps.where_between("timestamp", scan_range[0], scan_range[-1])
+            if user_choice != "All":
+                where += " AND scanned_by = ?"
+                params.append(user_choice)
+            if loc_choice != "All":
+                where += " AND location = ?"
+                params.append(loc_choice)
+            filtered = analytics.query(
+                db_path, "scanned_items", f"SELECT * FROM scanned_items WHERE {where} ORDER BY timestamp", params
+            )
+            filtered["timestamp"] = timestamps.parse(filtered["timestamp"])
+
+            st.dataframe(filtered, use_container_width=True)
+            st.download_button("Export Scan Results", filtered.to_csv(index=False), "scans_results.csv")
+
+# --- Locations ---
+perf.section("Locations")
+location_panel = st.expander("📍 Locations", on_change="rerun", key="locations_open")
+with location_panel:
+    if location_panel.open:
+        with su.get_conn(db_path) as conn:
+            occupancy = locations.occupancy(conn)
+        if occupancy.empty:
+            st.info("No located scans yet.")
+        else:
+            c1, c2 = st.columns(2)
+            c1.dataframe(occupancy, use_container_width=True, hide_index=True)
+            where = c2.selectbox("What's at", occupancy["location"].tolist())
+            with su.get_conn(db_path) as conn:
+                here = locations.items_at(conn, where)
+            c2.dataframe(here, use_container_width=True, hide_index=True)
+            c2.download_button("Export Location List", here.to_csv(index=False), "location_items.csv")
+
+        asset = st.text_input("Where is equipment ID…", key="where_is")
+        if asset:
+            with su.get_conn(db_path) as conn:
+                found = locations.current(conn, asset)
+                moves = locations.history(conn, asset)
+            if found:
+                st.success(f"`{found['equipment_id']}` was last seen at **{found['location']}** on {timestamps.local_text(found['last_seen'])}.")
+                st.dataframe(moves, use_container_width=True, hide_index=True)
+            else:
+                st.warning(f"No located scans for `{asset}`.")
+
+perf.finish()
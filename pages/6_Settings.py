@@ -1,10 +1,12 @@
 import streamlit as st
+import profiler
 import pandas as pd
 import os
 import shared_utils as su
 
 st.set_page_config(page_title="Settings", layout="wide")
 st.title("⚙Maintenance Interval Settings")
+perf = profiler.PageTimer("Settings")
 
 # --- Session Info ---
 user_email = st.session_state.get("user_email", "unknown@example.com")
@@ -16,6 +18,7 @@ st.sidebar.markdown(f"Role: {user_role} | 📧 Email: {user_email}")
 st.sidebar.info(f"Active Table: `{active_table}`")
 
 # --- Load Data ---
+perf.section("Load Data")
 equipment_df = su.load_equipment()
 type_col = su.get_type_column(equipment_df)
 
@@ -31,6 +34,7 @@ if active_table not in settings:
     settings[active_table] = {}
 
 # --- Settings Form ---
+perf.section("Settings Form")
 st.subheader("🔧 Configure Default Maintenance Intervals (in days)")
 
 with st.form("settings_form"):
@@ -45,3 +49,5 @@ if submit:
     su.save_settings_yaml(settings)
     su.log_audit("Update Maintenance Settings", f"Updated intervals for {active_table}")
     st.success("✅ Settings successfully saved.")
+
+perf.finish()
@@ -1,11 +1,15 @@
 import streamlit as st
+import profiler
 import pandas as pd
 import os
-from datetime import datetime, timedelta
 import shared_utils as su
+import reliability
+import db_writer
+import forecast
 
 st.set_page_config(page_title="Predictive Maintenance", layout="wide")
 st.title("Predictive Maintenance Engine")
+perf = profiler.PageTimer("Predictive Maintenance")
 
 # --- Session Info ---
 user_email = st.session_state.get("user_email", "unknown@example.com")
@@ -17,8 +21,8 @@ st.sidebar.markdown(f"Role: {user_role}  \n📧 Email: {user_email}")
 st.sidebar.info(f"Active Table: `{active_table}`")
 
 # --- Load Data using centralized shared_utils ---
+perf.section("Load Data")
 equipment_df = su.load_equipment()
-maintenance_df = su.load_maintenance()
 
 # --- Load YAML settings ---
 settings = su.load_settings_yaml()
@@ -33,53 +37,40 @@ if id_col is None:
     st.stop()
 
 # --- Predictive Logic ---
-results = []
-
-for _, row in equipment_df.iterrows():
-    equip_id = row[id_col]
-    equip_type = str(row.get(type_col, "")).strip()
-
-    # Historical maintenance lookup
-    history = maintenance_df[maintenance_df["equipment_id"] == equip_id].sort_values("date").dropna(subset=["date"])
-
-    # Calculate average interval from history
-    avg_interval = int(history["date"].diff().dt.days[1:].mean()) if len(history) >= 2 else None
-
-    # Use user-defined interval or default to 90
-    interval_setting = table_settings.get(equip_type, 90)
-    last_maint = history["date"].max() if not history.empty else None
-
-    # Predictive next due calculation
-    if pd.notna(last_maint):
-        predicted_next = last_maint + timedelta(days=interval_setting)
-        days_remaining = (predicted_next - datetime.today()).days
-
-        if days_remaining < 0:
-            status = "🔴 Overdue"
-        elif days_remaining <= 30:
-            status = "🟠 Due Soon"
-        else:
-            status = "🟢 On Schedule"
-    else:
-        predicted_next, days_remaining, status = None, None, "⚪ Never Serviced"
-
-    results.append({
-        "Equipment ID": equip_id,
-        "Equipment Type": equip_type,
-        "Last Maintenance": last_maint.date() if pd.notna(last_maint) else None,
-        "Interval (days)": interval_setting,
-        "Avg Historical Interval": avg_interval,
-        "Next Due": predicted_next.date() if predicted_next else None,
-        "Days Remaining": days_remaining,
-        "Predicted Status": status
-    })
+perf.section("Predictive Logic")
+st.sidebar.subheader("Interval Source")
+use_learned = st.sidebar.radio(
+    "Predict next due from", ["Learned (fleet history)", "Configured (Settings)"]
+) == "Learned (fleet history)"
+if user_role == "admin" and st.sidebar.button("Refit model from full history"):
+    import job_tasks
+
+    su.submit_job("refit_model", job_tasks.refit_reliability, db_path, active_table)
+
+# A forecast precomputed by forecast.py (or an earlier visit) is used while still current
+with su.load_connection() as conn:
+    result_df = forecast.load(conn, active_table, table_settings, use_learned)
+refitted = []
+if result_df is None:
+    # Refit only the types that received new maintenance records, then predict from stored parameters
+    refitted = db_writer.run(db_path, lambda conn: reliability.refresh(conn, active_table))
+    with su.load_connection() as conn:
+        type_params, asset_params = reliability.load_params(conn, active_table)
+
+    result_df = reliability.predict(equipment_df, id_col, type_col, type_params, asset_params, table_settings, use_learned)
+    if use_learned:
+        db_writer.run(db_path, lambda conn: forecast.store(conn, active_table, result_df, table_settings), wait=False)
 
 # --- Display ---
-result_df = pd.DataFrame(results)
+perf.section("Display")
 st.subheader("Predictive Maintenance Table")
+if refitted:
+    st.caption(f"Model refreshed for: {', '.join(t or '(no type)' for t in refitted)}")
 st.dataframe(result_df, use_container_width=True)
+su.render_jobs(kinds=["refit_model"], limit=2)
 
 # --- Filters ---
+perf.section("Filters")
 st.sidebar.subheader("Filter by Status")
 status_filter = st.sidebar.selectbox("Status", ["All", "Overdue", "Due Soon", "On Schedule", "Never Serviced"])
 
@@ -89,4 +80,7 @@ if status_filter != "All":
     st.dataframe(filtered_df, use_container_width=True)
 
 # ✅ Log audit entry
+perf.section("Audit")
 su.log_audit("View Predictive Maintenance")
+
+perf.finish()
@@ -0,0 +1,124 @@
+import streamlit as st
+import profiler
+import pandas as pd
+import db_writer
+import snapshots
+
+st.set_page_config(page_title="Performance", layout="wide")
+st.title("Performance")
+
+# --- Session Info ---
+user_email = st.session_state.get("user_email", "unknown@example.com")
+user_role = st.session_state.get("user_role", "guest")
+
+st.sidebar.markdown(f"Role: {user_role} | 📧 {user_email}")
+
+# --- Permissions ---
+if user_role != "admin":
+    st.warning("You do not have permission to view performance data.")
+    st.stop()
+
+# --- Controls ---
+st.sidebar.subheader("Profiler")
+# Per session: the process-wide SLOW_QUERY_MS decides what the slow log keeps for everyone
+slow_query_ms = st.sidebar.number_input(
+    "Slow query threshold (ms)", min_value=1.0, value=float(profiler.SLOW_QUERY_MS), step=50.0, key="slow_query_ms"
+)
+if st.sidebar.button("Clear collected data"):
+    profiler.clear()
+    st.rerun()
+
+events_df = pd.DataFrame(profiler.events())
+if events_df.empty:
+    st.info("No profiling data yet. Open a few pages and come back.")
+    st.stop()
+
+st.caption(f"{len(events_df)} events since {events_df['ts'].min():%Y-%m-%d %H:%M:%S}")
+
+
+def latency_table(df, by):
+    grouped = df.groupby(by)["duration_ms"]
+    out = pd.DataFrame({
+        "runs": grouped.size(),
+        "p50_ms": grouped.quantile(0.50),
+        "p95_ms": grouped.quantile(0.95),
+        "max_ms": grouped.max(),
+    })
+    return out.round(1).sort_values("p95_ms", ascending=False).reset_index()
+
+
+# --- Pages ---
+st.subheader("Page Render Latency")
+pages_df = events_df[events_df["kind"] == "page"]
+if pages_df.empty:
+    st.info("No completed page runs recorded yet.")
+else:
+    st.dataframe(latency_table(pages_df, "name").rename(columns={"name": "page"}), use_container_width=True)
+
+# --- Startup ---
+st.subheader(f"Cold Start (budget {profiler.STARTUP_BUDGET_MS:.0f} ms)")
+startup_df = pd.DataFrame(profiler.startup_report())
+if startup_df.empty:
+    st.caption("No first page runs recorded in this server process.")
+else:
+    st.dataframe(startup_df.sort_values("total_ms", ascending=False), use_container_width=True, hide_index=True)
+    over = startup_df[~startup_df["within_budget"]]
+    if not over.empty:
+        st.warning(f"Over budget: {', '.join(over['page'])}")
+imports_df = events_df[events_df["kind"] == "import"]
+if not imports_df.empty:
+    with st.expander("Module Imports"):
+        st.dataframe(
+            imports_df.sort_values("duration_ms", ascending=False)[["page", "name", "duration_ms", "ts"]].head(50),
+            use_container_width=True, hide_index=True,
+        )
+
+# --- Sections ---
+with st.expander("Slowest Page Sections"):
+    sections_df = events_df[events_df["kind"] == "section"]
+    if not sections_df.empty:
+        st.dataframe(latency_table(sections_df, "name").rename(columns={"name": "section"}).head(50), use_container_width=True)
+
+# --- Loads ---
+st.subheader("Table Loads")
+loads_df = events_df[events_df["kind"] == "load"]
+if not loads_df.empty:
+    loads = latency_table(loads_df, ["db", "name"]).rename(columns={"name": "table"})
+    stats = loads_df.groupby(["db", "name"]).agg(
+        avg_rows=("rows", "mean"),
+        cache_hit_rate=("cache_hit", "mean"),
+        snapshot_rate=("source", lambda s: s.isin(["mapped", "snapshot"]).mean()),
+    )
+    loads = loads.merge(stats.round(2).reset_index().rename(columns={"name": "table"}), on=["db", "table"])
+    st.dataframe(loads, use_container_width=True)
+with st.expander("Mapped Snapshots"):
+    snapshot_df = snapshots.stats()
+    if snapshot_df.empty:
+        st.caption("No table snapshots mapped in this server process yet.")
+    else:
+        st.dataframe(snapshot_df, use_container_width=True)
+
+# --- Queries ---
+st.subheader("Slowest Queries")
+sql_df = events_df[events_df["kind"] == "sql"]
+if not sql_df.empty:
+    queries = latency_table(sql_df, "name").rename(columns={"name": "statement"})
+    st.dataframe(queries.head(50), use_container_width=True)
+
+st.subheader(f"Slow Query Log (≥ {slow_query_ms:.0f} ms)")
+slow_df = pd.DataFrame(profiler.slow_queries(slow_query_ms))
+if slow_df.empty:
+    st.success("No queries above the threshold.")
+else:
+    st.dataframe(
+        slow_df.sort_values("ts", ascending=False)[["ts", "duration_ms", "rows", "page", "db", "name"]],
+        use_container_width=True,
+    )
+
+# --- Writers ---
+st.subheader("Database Writers")
+writer_stats = db_writer.stats()
+if writer_stats:
+    st.dataframe(pd.DataFrame.from_dict(writer_stats, orient="index"), use_container_width=True)
+else:
+    st.caption("No writes in this server process yet.")
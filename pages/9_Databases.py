@@ -0,0 +1,82 @@
+import streamlit as st
+import profiler
+import pandas as pd
+import catalog
+import db_health
+import jobs
+import migrations
+import shared_utils as su
+
+st.set_page_config(page_title="Databases", layout="wide")
+st.title("Databases")
+perf = profiler.PageTimer("Databases")
+
+# --- Session Info ---
+user_email = st.session_state.get("user_email", "unknown@example.com")
+user_role = st.session_state.get("user_role", "guest")
+
+st.sidebar.markdown(f"Role: {user_role} | 📧 {user_email}")
+
+# --- Permissions ---
+if user_role != "admin":
+    st.warning("You do not have permission to view the database overview.")
+    st.stop()
+
+# --- Overview ---
+perf.section("Overview")
+overview_df = pd.DataFrame(catalog.overview())
+if overview_df.empty:
+    st.info("No databases found under data/.")
+    perf.finish()
+    st.stop()
+
+col1, col2, col3 = st.columns(3)
+col1.metric("Databases", len(overview_df))
+col2.metric("Owners", overview_df["owner"].nunique())
+col3.metric("Total Size (MB)", f"{overview_df['size_mb'].sum():,.1f}")
+
+owner = st.selectbox("Owner", ["All"] + sorted(overview_df["owner"].unique().tolist()))
+shown = overview_df if owner == "All" else overview_df[overview_df["owner"] == owner]
+st.dataframe(shown.sort_values("size_mb", ascending=False), use_container_width=True, hide_index=True)
+
+errors = shown[shown["error"].notna()]
+if not errors.empty:
+    st.error(f"{len(errors)} database(s) could not be read: {', '.join(errors['database'])}")
+
+# --- Tables ---
+perf.section("Tables")
+st.subheader("Tables")
+choice = st.selectbox("Database", shown["path"].tolist())
+if choice:
+    entry = catalog.info(choice)
+    tables_df = pd.DataFrame(
+        [{"table": name, "rows": rows, "app table": name in migrations.APP_TABLES}
+         for name, rows in catalog.row_counts(choice).items()]
+    )
+    st.caption(f"Schema v{entry['user_version']} · hash `{entry['schema_hash']}`")
+    st.dataframe(tables_df, use_container_width=True, hide_index=True)
+
+# --- Health ---
+perf.section("Health")
+st.subheader("Health")
+health_df = db_health.overview(shown["path"].tolist())
+st.dataframe(health_df.drop(columns="path").sort_values("free_pct", ascending=False),
+             use_container_width=True, hide_index=True)
+if choice:
+    c1, c2 = st.columns(2)
+    if c1.button("Check fragmentation", help="Reads every page of the selected database"):
+        health = db_health.report(choice, detailed=True)
+        for label, key in (("Fragmentation", "fragmentation_pct"), ("Unused space in pages", "unused_pct")):
+            c1.metric(label, "n/a" if health[key] is None else f"{health[key]}%")
+    if c2.button("Run maintenance now", help="Analyze, reclaim free pages and checkpoint. The one-time VACUUM "
+                 "into incremental auto_vacuum is left to the idle scheduler (db_health.py)."):
+        # No full VACUUM from here: it would hold the write lock while the app and scan ingest are writing
+        import job_tasks
+
+        jobs.submit("maintenance", job_tasks.maintain_db, choice, convert=False, owner=user_email, db_path=choice)
+        st.toast("Maintenance started in the background.")
+    su.render_jobs(kinds=["maintenance"], limit=3)
+    with st.expander("Maintenance history"):
+        st.dataframe(db_health.history(choice), use_container_width=True, hide_index=True)
+
+perf.finish()
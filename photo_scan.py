@@ -0,0 +1,223 @@
+# photo_scan.py
+"""Barcode and QR decoding for batches of asset-tag photos.
+
+Field crews photograph tags where live scanning isn't possible and upload
+the photos (or a ZIP of them) on the Barcode Scanner page. Each image is
+decoded in a worker process:
+
+1. decode to grayscale and downscale so the long side is at most
+   ``MAX_SIDE`` pixels (phone photos are 12+ MP; tags are not);
+2. try the plain image, then Otsu and adaptive thresholds (glare,
+   shadows, faded print), then the full-resolution image for small tags;
+3. stop at the first attempt that finds a code.
+
+pyzbar (libzbar) does the decoding when it is installed; otherwise
+OpenCV's QR and 1-D barcode detectors are used.
+
+    results, stats = photo_scan.decode_batch(photo_scan.read_uploads(files))
+    codes = photo_scan.unique_codes(results)
+"""
+import io
+import multiprocessing
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+IMAGE_TYPES = ("jpg", "jpeg", "png", "bmp", "tif", "tiff", "webp")
+MAX_SIDE = 1600
+MAX_WORKERS = int(os.environ.get("SEALTRAIL_DECODE_PROCESSES", os.cpu_count() or 2))
+
+_pool = None
+_pyzbar = None
+
+
+# --- INPUT ---
+
+def read_uploads(files):
+    """[(name, bytes)] from uploaded files; ZIP archives are expanded and
+    anything that isn't an image is skipped."""
+    images = []
+    for f in files:
+        data = f.getvalue() if hasattr(f, "getvalue") else f.read()
+        if f.name.lower().endswith(".zip"):
+            with zipfile.ZipFile(io.BytesIO(data)) as zf:
+                for info in zf.infolist():
+                    base = os.path.basename(info.filename)
+                    if info.is_dir() or base.startswith(".") or "__MACOSX" in info.filename:
+                        continue
+                    if base.lower().rsplit(".", 1)[-1] in IMAGE_TYPES:
+                        images.append((info.filename, zf.read(info)))
+        elif f.name.lower().rsplit(".", 1)[-1] in IMAGE_TYPES:
+            images.append((f.name, data))
+    return images
+
+
+# --- DECODING (worker processes) ---
+
+def _zbar():
+    """pyzbar's decode, or None when libzbar is not installed."""
+    global _pyzbar
+    if _pyzbar is None:
+        try:
+            from pyzbar import pyzbar
+            _pyzbar = pyzbar.decode
+        except ImportError:
+            _pyzbar = False
+    return _pyzbar or None
+
+
+def _decode_opencv(img):
+    import cv2
+
+    found = []
+    ok, texts, _, _ = cv2.QRCodeDetector().detectAndDecodeMulti(img)
+    if ok:
+        found.extend(t for t in texts if t)
+    ok, texts, _, _ = cv2.barcode.BarcodeDetector().detectAndDecodeWithType(img)
+    if ok:
+        found.extend(t for t in texts if t)
+    return found
+
+
+def _decode(img):
+    zbar = _zbar()
+    if zbar:
+        return [s.data.decode("utf-8", "replace") for s in zbar(img)]
+    return _decode_opencv(img)
+
+
+def _attempts(gray):
+    """(name, image) variants in the order they are tried."""
+    import cv2
+
+    h, w = gray.shape
+    scale = MAX_SIDE / max(h, w)
+    small = cv2.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA) if scale < 1 else gray
+    yield "plain", small
+    yield "otsu", cv2.threshold(cv2.GaussianBlur(small, (3, 3), 0), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+    yield "adaptive", cv2.adaptiveThreshold(small, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10)
+    if scale < 1:
+        yield "full size", gray
+
+
+def decode_image(name, data):
+    """Decode one photo. Returns a dict with image, codes, attempt and error."""
+    import cv2
+    import numpy as np
+
+    t0 = time.perf_counter()
+    result = {"image": name, "codes": [], "attempt": None, "error": None}
+    try:
+        gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            result["error"] = "not a readable image"
+        else:
+            for attempt, img in _attempts(gray):
+                codes = list(dict.fromkeys(c.strip() for c in _decode(img) if c.strip()))
+                if codes:
+                    result.update(codes=codes, attempt=attempt)
+                    break
+            else:
+                result["error"] = "no barcode found"
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    return result
+
+
+def _decode_chunk(chunk):
+    return [decode_image(name, data) for name, data in chunk]
+
+
+# --- BATCH ---
+
+def _new_pool(workers):
+    # Spawned, not forked: the Streamlit server has writer, job and analytics threads whose locks a fork would copy
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = _new_pool(MAX_WORKERS)
+    return _pool
+
+
+def _replace_pool(pool, workers):
+    """A fresh pool in place of a broken one (the shared pool is reset too)."""
+    global _pool
+    pool.shutdown(wait=False)
+    if workers:
+        return _new_pool(workers)
+    _pool = None
+    return _get_pool()
+
+
+def decode_batch(images, progress=None, workers=None):
+    """Decode [(name, bytes)] across the process pool. Returns (results
+    DataFrame with one row per image, stats dict with images/sec).
+
+    If a worker dies (out of memory, a crash in the native decoder) the
+    pool is replaced and the unfinished chunks are retried one at a time;
+    a chunk that breaks the pool again is reported as failed images.
+    """
+    t0 = time.perf_counter()
+    results = []
+    if images:
+        pool = _new_pool(workers) if workers else _get_pool()
+        # Small chunks keep every worker busy while amortising the pickling of each call
+        size = max(1, min(8, len(images) // ((workers or MAX_WORKERS) * 4)))
+        chunks = [images[i:i + size] for i in range(0, len(images), size)]
+        done = 0
+        try:
+            try:
+                for chunk_results in pool.map(_decode_chunk, chunks):
+                    results.extend(chunk_results)
+                    done += 1
+                    if progress:
+                        progress(len(results), len(images))
+            except BrokenProcessPool:
+                pool = _replace_pool(pool, workers)
+                for chunk in chunks[done:]:
+                    try:
+                        results.extend(pool.submit(_decode_chunk, chunk).result())
+                    except BrokenProcessPool:
+                        pool = _replace_pool(pool, workers)
+                        results.extend(
+                            {"image": name, "codes": [], "attempt": None, "error": "decoder process crashed", "ms": None}
+                            for name, _ in chunk
+                        )
+                    if progress:
+                        progress(len(results), len(images))
+        finally:
+            if workers:
+                pool.shutdown()
+    seconds = time.perf_counter() - t0
+    df = pd.DataFrame(results, columns=["image", "codes", "attempt", "error", "ms"])
+    stats = {
+        "images": len(df),
+        "decoded": int(df["error"].isna().sum()),
+        "failed": int(df["error"].notna().sum()),
+        "seconds": round(seconds, 2),
+        "images_per_sec": round(len(df) / seconds, 1) if seconds and len(df) else 0.0,
+    }
+    return df, stats
+
+
+def unique_codes(results):
+    """One row per distinct code (case and surrounding space ignored), with
+    the photos it was read from."""
+    rows = results[results["error"].isna()].explode("codes")
+    if rows.empty:
+        return pd.DataFrame(columns=["code", "photos", "images"])
+    rows = rows.assign(key=rows["codes"].str.strip().str.lower())
+    grouped = rows.groupby("key", sort=False)
+    return pd.DataFrame({
+        "code": grouped["codes"].first(),
+        "photos": grouped.size(),
+        "images": grouped["image"].agg(lambda s: ", ".join(s)),
+    }).reset_index(drop=True)
@@ -0,0 +1,250 @@
+# profiler.py
+"""Lightweight query and render profiler.
+
+Every ``shared_utils`` load, every SQL statement run through a profiled
+connection and every page section is recorded into an in-process ring
+buffer. Statements slower than ``SLOW_QUERY_MS`` are also kept in a
+separate slow-query log. The admin Performance page reads both.
+
+Module imports are timed too: the first run of each page in a process
+records its import time and first-render time (``startup_report``), and
+imports deferred into a feature show up as ``import`` events of the page
+that triggered them.
+"""
+import builtins
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger("sealtrail.profiler")
+
+SLOW_QUERY_MS = float(os.environ.get("SEALTRAIL_SLOW_QUERY_MS", 250))
+STARTUP_BUDGET_MS = float(os.environ.get("SEALTRAIL_STARTUP_BUDGET_MS", 1500))
+PROCESS_START = time.perf_counter()
+
+_events = deque(maxlen=int(os.environ.get("SEALTRAIL_PROFILE_EVENTS", 20000)))
+_slow = deque(maxlen=1000)
+_lock = threading.Lock()
+
+
+# --- RECORDING ---
+
+def record(kind, name, duration_ms, rows=None, cache_hit=False, page=None, db=None, source=None):
+    event = {
+        "ts": datetime.now(),
+        "kind": kind,
+        "name": name,
+        "duration_ms": round(duration_ms, 3),
+        "rows": rows,
+        "cache_hit": cache_hit,
+        "page": page or _current_page(),
+        "db": os.path.basename(db) if db else None,
+        "source": source,
+    }
+    with _lock:
+        _events.append(event)
+        if kind == "sql" and duration_ms >= SLOW_QUERY_MS:
+            _slow.append(event)
+    if kind == "sql" and duration_ms >= SLOW_QUERY_MS:
+        logger.warning("slow query (%.1f ms): %s", duration_ms, name)
+    return event
+
+
+@contextmanager
+def timed(kind, name, **info):
+    """Time a block. The yielded dict can be filled with ``rows`` / ``cache_hit`` / ``source``."""
+    t0 = time.perf_counter()
+    try:
+        yield info
+    finally:
+        record(kind, name, (time.perf_counter() - t0) * 1000, **info)
+
+
+def events(kind=None):
+    with _lock:
+        items = list(_events)
+    return [e for e in items if kind is None or e["kind"] == kind]
+
+
+def slow_queries(threshold_ms=None):
+    """SQL events at or above ``threshold_ms`` (default SLOW_QUERY_MS). The
+    slow log only holds statements over SLOW_QUERY_MS; a lower threshold
+    adds the faster ones still in the recent-events buffer."""
+    threshold = SLOW_QUERY_MS if threshold_ms is None else threshold_ms
+    with _lock:
+        items = list(_slow)
+        if threshold < SLOW_QUERY_MS:
+            items += [e for e in _events if e["kind"] == "sql" and threshold <= e["duration_ms"] < SLOW_QUERY_MS]
+    return [e for e in items if e["duration_ms"] >= threshold]
+
+
+def clear():
+    with _lock:
+        _events.clear()
+        _slow.clear()
+        _startup.clear()
+
+
+# --- IMPORT TIMING ---
+
+_local = threading.local()
+_startup = {}
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    """``builtins.__import__`` that times the outermost import of a module
+    not loaded yet. Already-loaded modules cost one dict lookup."""
+    if level or name in sys.modules or getattr(_local, "importing", False):
+        return _real_import(name, globals, locals, fromlist, level)
+    _local.importing = True
+    t0 = time.perf_counter()
+    try:
+        return _real_import(name, globals, locals, fromlist, level)
+    finally:
+        _local.importing = False
+        pending = getattr(_local, "imports", None)
+        if pending is None:
+            pending = _local.imports = []
+        pending.append((name, (time.perf_counter() - t0) * 1000))
+
+
+def _drain_imports(page):
+    """Record the imports made on this thread since the last drain under
+    ``page``; returns their total time."""
+    pending, _local.imports = getattr(_local, "imports", None) or [], []
+    for name, ms in pending:
+        record("import", name, ms, page=page)
+    return sum(ms for _, ms in pending)
+
+
+if os.environ.get("SEALTRAIL_PROFILE_IMPORTS", "1") != "0" and not hasattr(builtins.__import__, "_sealtrail"):
+    _real_import = builtins.__import__
+    _timed_import._sealtrail = True
+    builtins.__import__ = _timed_import
+
+
+def startup_report():
+    """First run of each page in this process: import_ms (modules first
+    loaded by the page's own imports), render_ms (the run itself, including
+    deferred imports), total_ms and whether it is within STARTUP_BUDGET_MS."""
+    with _lock:
+        rows = [dict(page=page, **info) for page, info in _startup.items()]
+    for row in rows:
+        row["within_budget"] = row["total_ms"] <= STARTUP_BUDGET_MS
+    return rows
+
+
+# --- PAGE / SECTION TIMING ---
+
+
+def _current_page():
+    timer = getattr(_local, "timer", None)
+    return timer.page if timer else None
+
+
+class PageTimer:
+    """Splits one script run into named sections.
+
+    perf = PageTimer("Dashboard")
+    perf.section("KPIs")
+    ...
+    perf.finish()
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.start = time.perf_counter()
+        self._section = None
+        self._mark = self.start
+        self.import_ms = _drain_imports(page)
+        _local.timer = self
+
+    def section(self, name):
+        self._close_section()
+        self._section = name
+        self._mark = time.perf_counter()
+
+    def _close_section(self):
+        if self._section is not None:
+            record("section", f"{self.page} / {self._section}", (time.perf_counter() - self._mark) * 1000, page=self.page)
+            self._section = None
+
+    def finish(self):
+        self._close_section()
+        render_ms = (time.perf_counter() - self.start) * 1000
+        _drain_imports(self.page)
+        record("page", self.page, render_ms, page=self.page)
+        with _lock:
+            first = self.page not in _startup
+            if first:
+                _startup[self.page] = {
+                    "import_ms": round(self.import_ms, 1),
+                    "render_ms": round(render_ms, 1),
+                    "total_ms": round(self.import_ms + render_ms, 1),
+                    "process_age_s": round(self.start - PROCESS_START, 1),
+                }
+        if first and self.import_ms + render_ms > STARTUP_BUDGET_MS:
+            logger.warning("slow first render of %s (%.0f ms)", self.page, self.import_ms + render_ms)
+        if getattr(_local, "timer", None) is self:
+            _local.timer = None
+
+
+# --- PROFILED SQLITE CONNECTION ---
+
+def _statement_name(sql):
+    return " ".join(str(sql).split())[:300]
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        t0 = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._record(sql, t0)
+
+    def executemany(self, sql, seq_of_parameters):
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._record(sql, t0)
+
+    def executescript(self, sql_script):
+        t0 = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self._record(sql_script, t0)
+
+    def _record(self, sql, t0):
+        rows = self.rowcount if self.rowcount >= 0 else None
+        record("sql", _statement_name(sql), (time.perf_counter() - t0) * 1000, rows=rows, db=self.connection.db_path)
+
+
+class ProfiledConnection(sqlite3.Connection):
+    def __init__(self, database, *args, **kwargs):
+        super().__init__(database, *args, **kwargs)
+        self.db_path = str(database)
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def connect(db_path, **kwargs):
+    return sqlite3.connect(db_path, factory=ProfiledConnection, **kwargs)
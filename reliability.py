@@ -0,0 +1,259 @@
+# reliability.py
+"""Fleet reliability model for maintenance intervals.
+
+Service intervals are learned from the whole ``maintenance_log``:
+
+* per type: mean interval across every asset of that type, blended with the
+  configured interval from maintenance_settings.yaml when the type has few
+  observed intervals;
+* per asset: the asset's own mean interval shrunk toward its type's interval,
+  with the shrinkage strength estimated per type (within-asset variance over
+  between-asset variance).
+
+Fitting is vectorized over all types at once and the raw statistics are stored
+in ``reliability_*`` tables. ``refresh`` only refits types whose maintenance
+records or assets changed since the last fit; ``predict`` reads the stored
+parameters.
+"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import migrations
+import timestamps
+
+DEFAULT_INTERVAL = 90
+# Weight of the configured interval, in "observed intervals", when blending a type mean
+SETTINGS_PRIOR = 5
+# Fallback asset shrinkage strength when a type has too few assets to estimate it
+DEFAULT_ASSET_PRIOR = 3.0
+DUE_SOON_DAYS = 30
+
+
+# --- FITTING ---
+
+def fit(history):
+    """Fit type and asset parameters from maintenance history.
+
+    ``history`` has columns id_key, equipment_type, date. Returns
+    (type_params, asset_params) DataFrames.
+    """
+    h = history.dropna(subset=["date"]).sort_values(["id_key", "date"])
+    h["interval"] = h.groupby("id_key")["date"].diff().dt.days
+
+    assets = h.groupby("id_key").agg(equipment_type=("equipment_type", "last"), last_date=("date", "max"))
+    # Same-day duplicates are not service intervals
+    iv = h[h["interval"] > 0]
+    asset_stats = iv.groupby("id_key")["interval"].agg(n_intervals="size", mean_days="mean", var_days="var")
+    assets = assets.join(asset_stats)
+    assets["n_intervals"] = assets["n_intervals"].fillna(0).astype(int)
+
+    types = iv.groupby("equipment_type")["interval"].agg(n_intervals="size", mean_days="mean", std_days="std")
+
+    # Empirical-Bayes shrinkage strength per type: k = sigma^2_within / tau^2_between
+    a = assets[assets["n_intervals"] > 0]
+    dof = (a["n_intervals"] - 1).clip(lower=0)
+    within = ((dof * a["var_days"].fillna(0)).groupby(a["equipment_type"]).sum()
+              / dof.groupby(a["equipment_type"]).sum().replace(0, np.nan))
+    between = a.groupby("equipment_type")["mean_days"].var()
+    n_bar = a.groupby("equipment_type")["n_intervals"].mean()
+    tau2 = between - within / n_bar
+    prior = (within / tau2.where(tau2 > 0)).clip(0.5, 50)
+    types["asset_prior"] = prior.reindex(types.index).fillna(DEFAULT_ASSET_PRIOR)
+
+    return types.reset_index(), assets.drop(columns="var_days").reset_index()
+
+
+# --- STORAGE ---
+
+def _history(conn, table, id_col, type_col, types=None):
+    type_expr = f'TRIM(COALESCE(e."{type_col}", \'\'))' if type_col else "''"
+    sql = f"""
+        SELECT DISTINCT m.id, LOWER(TRIM(m.equipment_id)) AS id_key, {type_expr} AS equipment_type, m.date
+        FROM maintenance_log m
+        JOIN "{table}" e ON LOWER(e."{id_col}") = LOWER(TRIM(m.equipment_id))
+    """
+    params = []
+    if types is not None:
+        sql += f" WHERE {type_expr} IN ({', '.join('?' for _ in types)})"
+        params = list(types)
+    df = pd.read_sql_query(sql, conn, params=params)
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    return df
+
+
+def _appended_only(conn, last_log_id, old_version, new_version):
+    """True when maintenance_log only gained rows after ``last_log_id``
+    between the two versions: each inserted, updated or deleted row bumps
+    the data version once, so any edit or delete leaves a surplus."""
+    if old_version is None or new_version is None:
+        return False
+    # table_version() is "<data version>-<schema version>"
+    (old_data, old_schema), (new_data, new_schema) = old_version.split("-"), new_version.split("-")
+    if old_schema != new_schema:
+        return False
+    appended = conn.execute("SELECT COUNT(*) FROM maintenance_log WHERE id > ?", (last_log_id,)).fetchone()[0]
+    return int(new_data) - int(old_data) == appended
+
+
+def _retyped(conn, table, id_col, type_expr):
+    """Types whose asset membership changed since the last fit: fitted
+    assets that were removed or retyped (old and new type), and assets with
+    history that were not part of the fit yet."""
+    return [r[0] for r in conn.execute(f"""
+        SELECT a.equipment_type
+        FROM reliability_asset_params a
+        LEFT JOIN "{table}" e ON LOWER(e."{id_col}") = a.id_key
+        WHERE a.table_name = ? AND (e."{id_col}" IS NULL OR {type_expr} IS NOT a.equipment_type)
+        UNION
+        SELECT {type_expr}
+        FROM reliability_asset_params a
+        JOIN "{table}" e ON LOWER(e."{id_col}") = a.id_key
+        WHERE a.table_name = ? AND {type_expr} IS NOT a.equipment_type
+        UNION
+        SELECT {type_expr}
+        FROM maintenance_log m
+        JOIN "{table}" e ON LOWER(e."{id_col}") = LOWER(TRIM(m.equipment_id))
+        WHERE LOWER(TRIM(m.equipment_id)) NOT IN (SELECT id_key FROM reliability_asset_params WHERE table_name = ?)
+    """, (table, table, table))]
+
+
+def refresh(conn, table, force=False):
+    """Refit the types whose data changed since the last fit (or all types
+    with ``force``). Returns the list of refitted types.
+
+    The fit is keyed on the data versions of maintenance_log and ``table``.
+    Appended maintenance records refit their types and working-table edits
+    the types of added, removed or retyped assets; log edits, deletes and
+    schema changes refit everything.
+    """
+    id_col = migrations.table_id_column(conn, table)
+    if not id_col:
+        return []
+    type_col = migrations.table_type_column(conn, table)
+    type_expr = f'TRIM(COALESCE(e."{type_col}", \'\'))' if type_col else "''"
+
+    log_version = migrations.table_version(conn, "maintenance_log")
+    equipment_version = migrations.table_version(conn, table)
+    row = conn.execute(
+        "SELECT last_log_id, log_version, equipment_version FROM reliability_state WHERE table_name = ?", (table,)
+    ).fetchone()
+    if row and not force and None not in (log_version, equipment_version) and row[1:] == (log_version, equipment_version):
+        return []
+    max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM maintenance_log").fetchone()[0]
+
+    if force or not row or equipment_version is None or not _appended_only(conn, row[0], row[1], log_version):
+        types = None
+    else:
+        changed = set()
+        if log_version != row[1]:
+            changed.update(r[0] for r in conn.execute(f"""
+                SELECT DISTINCT {type_expr}
+                FROM maintenance_log m
+                JOIN "{table}" e ON LOWER(e."{id_col}") = LOWER(TRIM(m.equipment_id))
+                WHERE m.id > ?
+            """, (row[0],)))
+        if equipment_version != row[2]:
+            changed.update(_retyped(conn, table, id_col, type_expr))
+        types = sorted(changed)
+
+    if types == []:
+        refitted = []
+    else:
+        history = _history(conn, table, id_col, type_col, types)
+        type_params, asset_params = fit(history)
+        refitted = type_params["equipment_type"].tolist() if types is None else types
+        _store(conn, table, type_params, asset_params, refitted if types is not None else None)
+
+    conn.execute(
+        "INSERT INTO reliability_state (table_name, last_log_id, log_version, equipment_version) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(table_name) DO UPDATE SET last_log_id = excluded.last_log_id, "
+        "log_version = excluded.log_version, equipment_version = excluded.equipment_version",
+        (table, max_id, log_version, equipment_version),
+    )
+    conn.commit()
+    return refitted
+
+
+def _store(conn, table, type_params, asset_params, types):
+    fitted_at = timestamps.now()
+    if types is None:
+        conn.execute("DELETE FROM reliability_type_params WHERE table_name = ?", (table,))
+        conn.execute("DELETE FROM reliability_asset_params WHERE table_name = ?", (table,))
+    else:
+        marks = ", ".join("?" for _ in types)
+        conn.execute(f"DELETE FROM reliability_type_params WHERE table_name = ? AND equipment_type IN ({marks})", [table, *types])
+        conn.execute(f"DELETE FROM reliability_asset_params WHERE table_name = ? AND equipment_type IN ({marks})", [table, *types])
+
+    type_rows = type_params.astype(object).where(type_params.notna(), None)
+    conn.executemany(
+        """INSERT INTO reliability_type_params
+           (table_name, equipment_type, n_intervals, mean_days, std_days, asset_prior, fitted_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        [(table, r.equipment_type, int(r.n_intervals), r.mean_days, r.std_days, r.asset_prior, fitted_at)
+         for r in type_rows.itertuples(index=False)],
+    )
+    asset_rows = asset_params.assign(last_date=asset_params["last_date"].dt.strftime("%Y-%m-%d"))
+    asset_rows = asset_rows.astype(object).where(asset_rows.notna(), None)
+    conn.executemany(
+        """INSERT OR REPLACE INTO reliability_asset_params
+           (table_name, id_key, equipment_type, n_intervals, mean_days, last_date, fitted_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        [(table, r.id_key, r.equipment_type, int(r.n_intervals), r.mean_days, r.last_date, fitted_at)
+         for r in asset_rows.itertuples(index=False)],
+    )
+
+
+def load_params(conn, table):
+    types = pd.read_sql_query("SELECT * FROM reliability_type_params WHERE table_name = ?", conn, params=[table])
+    assets = pd.read_sql_query("SELECT * FROM reliability_asset_params WHERE table_name = ?", conn, params=[table])
+    assets["last_date"] = pd.to_datetime(assets["last_date"], errors="coerce")
+    return types, assets
+
+
+# --- PREDICTION ---
+
+def predict(equipment_df, id_col, type_col, type_params, asset_params, table_settings, use_learned=True, today=None):
+    """Next-due predictions for every asset, vectorized over the fleet."""
+    today = pd.Timestamp(today or datetime.today())
+    res = pd.DataFrame({
+        "Equipment ID": equipment_df[id_col],
+        "Equipment Type": equipment_df[type_col].fillna("").astype(str).str.strip() if type_col else "",
+    })
+    res["id_key"] = res["Equipment ID"].astype(str).str.strip().str.lower()
+
+    assets = asset_params[["id_key", "n_intervals", "mean_days", "last_date"]].rename(
+        columns={"n_intervals": "asset_n", "mean_days": "asset_mean"})
+    types = type_params[["equipment_type", "n_intervals", "mean_days", "asset_prior"]].rename(
+        columns={"equipment_type": "Equipment Type", "n_intervals": "type_n", "mean_days": "type_mean"})
+    res = res.merge(assets, on="id_key", how="left").merge(types, on="Equipment Type", how="left")
+
+    configured = res["Equipment Type"].map(table_settings).fillna(DEFAULT_INTERVAL).astype(float)
+    type_n = res["type_n"].fillna(0)
+    type_interval = (type_n * res["type_mean"].fillna(0) + SETTINGS_PRIOR * configured) / (type_n + SETTINGS_PRIOR)
+    asset_n = res["asset_n"].fillna(0)
+    k = res["asset_prior"].fillna(DEFAULT_ASSET_PRIOR)
+    learned = (asset_n * res["asset_mean"].fillna(0) + k * type_interval) / (asset_n + k)
+
+    interval = learned if use_learned else configured
+    next_due = res["last_date"] + pd.to_timedelta(interval.round(), unit="D")
+    days_remaining = (next_due - today).dt.days
+
+    status = np.select(
+        [res["last_date"].isna(), days_remaining < 0, days_remaining <= DUE_SOON_DAYS],
+        ["⚪ Never Serviced", "🔴 Overdue", "🟠 Due Soon"],
+        default="🟢 On Schedule",
+    )
+
+    return pd.DataFrame({
+        "Equipment ID": res["Equipment ID"],
+        "Equipment Type": res["Equipment Type"],
+        "Last Maintenance": res["last_date"].dt.date,
+        "Interval (days)": configured.astype(int),
+        "Avg Historical Interval": res["asset_mean"].round().astype("Int64"),
+        "Learned Interval (days)": learned.round().astype(int),
+        "Next Due": next_due.dt.date,
+        "Days Remaining": days_remaining.astype("Int64"),
+        "Predicted Status": status,
+    })
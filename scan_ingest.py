@@ -0,0 +1,336 @@
+# scan_ingest.py
+"""Standalone HTTP ingest service for fixed RFID / barcode readers.
+
+Dock-door gates POST scans here instead of going through the Streamlit
+scanner page. Rows land in the same ``scanned_items`` table used by
+pages/3_Barcode_Scanner.py.
+
+    python scan_ingest.py --db data/alice_at_x.com/warehouse.db --port 8765
+
+    POST /scans            {"equipment_id": "EQP-001", "location": "Dock 3"}
+    POST /scans/<db name>  [{...}, {...}]   or   {"scans": [{...}, ...]}
+    GET  /stats            queue depth, batch sizes, p50/p99 latency
+    GET  /health
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque
+
+import db_writer
+import timestamps
+
+INSERT_SCANS = "INSERT INTO scanned_items (equipment_id, location, timestamp, scanned_by) VALUES (?, ?, ?, ?)"
+
+REASONS = {
+    200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 413: "Payload Too Large", 503: "Service Unavailable",
+}
+
+
+class Busy(Exception):
+    pass
+
+
+# --- LATENCY ---
+
+class LatencyTracker:
+    """Rolling window of request latencies (receive -> commit), in ms."""
+
+    def __init__(self, window=10000):
+        self.samples = deque(maxlen=window)
+
+    def add(self, ms):
+        self.samples.append(ms)
+
+    def percentile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return round(ordered[idx], 2)
+
+    def summary(self):
+        return {"p50_ms": self.percentile(50), "p99_ms": self.percentile(99), "samples": len(self.samples)}
+
+
+# --- SINGLE WRITER PER DB ---
+
+class ScanWriter:
+    """Buffers scans for one database and hands them to the database's
+    single writer thread (db_writer) in grouped executemany batches."""
+
+    def __init__(self, db_path, batch_rows=500, flush_interval=0.05, max_pending_rows=20000):
+        self.db_path = db_path
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.max_pending_rows = max_pending_rows
+        self.queue = asyncio.Queue()
+        self.pending_rows = 0
+        self.latency = LatencyTracker()
+        self.stats = {"committed_rows": 0, "batches": 0, "rejected_requests": 0, "failed_batches": 0}
+        self._task = None
+
+    async def start(self):
+        db_writer.get_writer(self.db_path)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            await self.queue.join()
+            self._task.cancel()
+        await asyncio.get_running_loop().run_in_executor(None, db_writer.close, self.db_path)
+
+    def submit(self, rows):
+        # Back-pressure: refuse new work instead of letting the buffer grow unbounded
+        if self.pending_rows + len(rows) > self.max_pending_rows:
+            self.stats["rejected_requests"] += 1
+            raise Busy()
+        fut = asyncio.get_running_loop().create_future()
+        self.pending_rows += len(rows)
+        self.queue.put_nowait((rows, fut, time.perf_counter()))
+        return fut
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            n_rows = len(items[0][0])
+            deadline = loop.time() + self.flush_interval
+            # Group whatever arrives within the flush window into one transaction
+            while n_rows < self.batch_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                items.append(item)
+                n_rows += len(item[0])
+
+            rows = [row for batch, _, _ in items for row in batch]
+            try:
+                await asyncio.wrap_future(db_writer.submit(self.db_path, INSERT_SCANS, rows, many=True))
+                self.stats["committed_rows"] += len(rows)
+                self.stats["batches"] += 1
+                error = None
+            except Exception as e:
+                self.stats["failed_batches"] += 1
+                error = e
+
+            now = time.perf_counter()
+            for batch, fut, t0 in items:
+                self.pending_rows -= len(batch)
+                if not fut.done():
+                    if error is None:
+                        fut.set_result(len(batch))
+                    else:
+                        fut.set_exception(error)
+                self.latency.add((now - t0) * 1000)
+                self.queue.task_done()
+
+    def snapshot(self):
+        avg = self.stats["committed_rows"] / self.stats["batches"] if self.stats["batches"] else 0
+        return {
+            "db": self.db_path,
+            "queued_requests": self.queue.qsize(),
+            "pending_rows": self.pending_rows,
+            "avg_batch_rows": round(avg, 1),
+            **self.stats,
+            **self.latency.summary(),
+        }
+
+
+# --- PAYLOAD PARSING ---
+
+def parse_scans(payload, default_scanned_by="reader"):
+    if isinstance(payload, dict) and "scans" in payload:
+        payload = payload["scans"]
+    if isinstance(payload, dict):
+        payload = [payload]
+    if not isinstance(payload, list) or not payload:
+        raise ValueError("expected a scan object, a list of scans or {\"scans\": [...]}")
+
+    rows = []
+    for i, scan in enumerate(payload):
+        if not isinstance(scan, dict):
+            raise ValueError(f"scan #{i} is not an object")
+        equipment_id = str(scan.get("equipment_id") or scan.get("Asset_ID") or "").strip()
+        if not equipment_id:
+            raise ValueError(f"scan #{i} has no equipment_id")
+        try:
+            ts = timestamps.to_text(scan.get("timestamp")) or timestamps.now()
+        except (ValueError, TypeError):
+            raise ValueError(f"scan #{i} has an invalid timestamp")
+        rows.append((
+            equipment_id,
+            str(scan.get("location") or "").strip(),
+            ts,
+            str(scan.get("scanned_by") or default_scanned_by),
+        ))
+    return rows
+
+
+# --- HTTP SERVER ---
+
+class IngestService:
+    def __init__(self, db_paths, host="0.0.0.0", port=8765, max_body=5 * 1024 * 1024, **writer_opts):
+        if not db_paths:
+            raise ValueError("at least one database is required")
+        self.host = host
+        self.port = port
+        self.max_body = max_body
+        self.writers = {}
+        for path in db_paths:
+            name = os.path.splitext(os.path.basename(path))[0]
+            self.writers[name] = ScanWriter(path, **writer_opts)
+        self.default = next(iter(self.writers)) if len(self.writers) == 1 else None
+        self.server = None
+
+    async def start(self):
+        for writer in self.writers.values():
+            await writer.start()
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        # port=0 picks a free port; expose the real one for local tests
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        for writer in self.writers.values():
+            await writer.stop()
+
+    def stats(self):
+        return {name: writer.snapshot() for name, writer in self.writers.items()}
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "malformed request line"}, keep_alive=False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._respond(writer, 400, {"error": "malformed content-length"}, keep_alive=False)
+                    break
+                if length > self.max_body:
+                    await self._respond(writer, 413, {"error": "payload too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                status, payload, extra = await self._route(method, target.split("?", 1)[0], headers, body)
+                await self._respond(writer, status, payload, keep_alive, extra)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, headers, body):
+        parts = [p for p in path.split("/") if p]
+        if parts == ["health"]:
+            return 200, {"status": "ok"}, None
+        if parts == ["stats"]:
+            return 200, self.stats(), None
+        if not parts or parts[0] != "scans" or len(parts) > 2:
+            return 404, {"error": "not found"}, None
+        if method != "POST":
+            return 405, {"error": "use POST"}, None
+
+        name = parts[1] if len(parts) == 2 else self.default
+        scan_writer = self.writers.get(name)
+        if scan_writer is None:
+            return 404, {"error": f"unknown database '{name}'", "databases": list(self.writers)}, None
+
+        try:
+            rows = parse_scans(json.loads(body or b"null"), headers.get("x-reader-id", "reader"))
+        except (ValueError, json.JSONDecodeError) as e:
+            return 400, {"error": str(e)}, None
+
+        try:
+            fut = scan_writer.submit(rows)
+        except Busy:
+            return 503, {"error": "ingest buffer full, retry later"}, {"Retry-After": "1"}
+
+        try:
+            accepted = await fut
+        except Exception as e:
+            return 503, {"error": f"write failed: {e}"}, {"Retry-After": "1"}
+        return 201, {"accepted": accepted}, None
+
+    async def _respond(self, writer, status, payload, keep_alive=True, extra_headers=None):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        head = [
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        for key, value in (extra_headers or {}).items():
+            head.append(f"{key}: {value}")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve(db_paths, host, port, stats_interval=0, **writer_opts):
+    service = IngestService(db_paths, host, port, **writer_opts)
+    await service.start()
+    print(f"Scan ingest listening on http://{host}:{service.port} for {', '.join(service.writers)}")
+    try:
+        while True:
+            await asyncio.sleep(stats_interval or 3600)
+            if stats_interval:
+                for name, snap in service.stats().items():
+                    print(f"[{name}] rows={snap['committed_rows']} batches={snap['batches']} "
+                          f"p50={snap['p50_ms']}ms p99={snap['p99_ms']}ms pending={snap['pending_rows']}")
+    finally:
+        await service.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP scan ingest for fixed RFID/barcode readers")
+    parser.add_argument("--db", action="append", required=True, help="SQLite database to write to (repeatable)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--batch-rows", type=int, default=500, help="max rows per transaction")
+    parser.add_argument("--flush-ms", type=int, default=50, help="how long to wait to fill a batch")
+    parser.add_argument("--max-pending", type=int, default=20000, help="buffered rows before returning 503")
+    parser.add_argument("--stats-interval", type=int, default=0, help="print stats every N seconds")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(
+            args.db, args.host, args.port, args.stats_interval,
+            batch_rows=args.batch_rows,
+            flush_interval=args.flush_ms / 1000,
+            max_pending_rows=args.max_pending,
+        ))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,15 @@ import streamlit as st
 import sqlite3
 import pandas as pd
 import os
+import functools
 import yaml
-from datetime import datetime
+import profiler
+import migrations
+import jobs
+import db_writer
+import fuzzy
+import snapshots
+import timestamps
 
 # --- SESSION SAFE GETTERS ---
 
@@ -21,23 +28,37 @@ def get_active_table():
 
 def load_connection():
     db_path = get_db_path()
-    return sqlite3.connect(db_path)
+    migrations.ensure_schema(db_path)
+    return profiler.connect(db_path)
 
 def get_conn(db_path=None):
     if not db_path:
         db_path = get_db_path()
-    return sqlite3.connect(db_path)
+    migrations.ensure_schema(db_path)
+    return profiler.connect(db_path)
+
+def run_write(fn, db_path=None):
+    """Run ``fn(conn)`` on the database's single writer thread and wait for it."""
+    return db_writer.run(db_path or get_db_path(), fn)
+
+def submit_write(sql, params=(), many=False, db_path=None):
+    """Queue one statement on the writer; statements from concurrent sessions
+    are grouped into one transaction. Returns a Future."""
+    return db_writer.submit(db_path or get_db_path(), sql, params, many)
 
 # --- UNIVERSAL LOADERS ---
 
 def load_table(table):
     conn = load_connection()
-    try:
-        df = pd.read_sql_query(f"SELECT * FROM {table}", conn)
-    except:
-        df = pd.DataFrame()
-    finally:
-        conn.close()
+    with profiler.timed("load", table, db=conn.db_path) as info:
+        try:
+            # Served from the table's shared memory-mapped snapshot while its data version is unchanged
+            df = snapshots.load(conn, conn.db_path, table, info)
+        except:
+            df = pd.DataFrame()
+        finally:
+            conn.close()
+        info["rows"] = len(df)
 
     if "equipment_id" in df.columns:
         df["equipment_id"] = df["equipment_id"].astype(str).str.strip()
@@ -46,31 +67,84 @@ def load_table(table):
 def load_equipment():
     return load_table(get_active_table())
 
-def load_maintenance():
-    df = load_table("maintenance_log")
+def load_range(table, column, start=None, end=None, dates=False):
+    """Rows of ``table`` whose ``column`` falls on local days ``start`` ..
+    ``end``, filtered in SQL on the canonical text (timestamps.py) so the
+    column's index is used."""
+    where, params = timestamps.where_between(column, start, end, dates=dates)
+    conn = load_connection()
+    with profiler.timed("load", f"{table} (range)", db=conn.db_path) as info:
+        try:
+            df = pd.read_sql_query(f"SELECT * FROM {table} WHERE {where} ORDER BY {column}", conn, params=params)
+        finally:
+            conn.close()
+        info["rows"] = len(df)
+    return df
+
+def load_maintenance(start=None, end=None):
+    df = load_range("maintenance_log", "date", start, end, dates=True) if start or end else load_table("maintenance_log")
     if not df.empty:
         df["equipment_id"] = df["equipment_id"].astype(str).str.strip()
-        df["date"] = pd.to_datetime(df["date"], errors="coerce")
+        df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d", errors="coerce")
     return df
 
-def load_scans():
-    df = load_table("scanned_items")
+def load_scans(start=None, end=None):
+    df = load_range("scanned_items", "timestamp", start, end) if start or end else load_table("scanned_items")
     if not df.empty:
         df["equipment_id"] = df["equipment_id"].astype(str).str.strip()
-        df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
+        df["timestamp"] = timestamps.parse(df["timestamp"])
     return df
 
-def load_audit():
-    df = load_table("audit_log")
+def load_audit(start=None, end=None):
+    df = load_range("audit_log", "timestamp", start, end) if start or end else load_table("audit_log")
     if not df.empty:
-        df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
+        df["timestamp"] = timestamps.parse(df["timestamp"])
+    return df
+
+def load_latest_maintenance():
+    """Latest maintenance date per equipment ID, aggregated in SQL instead of
+    loading the whole log."""
+    conn = load_connection()
+    with profiler.timed("load", "maintenance_log (latest)", db=conn.db_path) as info:
+        try:
+            df = pd.read_sql_query(
+                "SELECT TRIM(equipment_id) AS equipment_id, MAX(date) AS date FROM maintenance_log "
+                "WHERE equipment_id IS NOT NULL GROUP BY 1", conn)
+        finally:
+            conn.close()
+        info["rows"] = len(df)
+    df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d", errors="coerce")
     return df
 
+class LazyData:
+    """Tables a page needs, loaded on first access and at most once per rerun.
+
+        data = su.LazyData(equipment=su.load_equipment, scans=su.load_scans)
+        if section_visible:
+            df = data["scans"]   # only now is scanned_items read
+    """
+
+    def __init__(self, **loaders):
+        self._loaders = loaders
+        self._frames = {}
+
+    def __getitem__(self, name):
+        if name not in self._frames:
+            self._frames[name] = self._loaders[name]()
+        return self._frames[name]
+
+    def loaded(self):
+        return list(self._frames)
+
 # --- IDENTIFIER NORMALIZATION ---
 
 def get_id_column(df):
     return next((col for col in df.columns if col.lower() in ["asset_id", "equipment_id"]), None)
 
+def id_index(equipment_df, id_col):
+    """Fuzzy ID index (fuzzy.py) for the active table, kept in sync incrementally."""
+    return fuzzy.get_index(get_db_path(), get_active_table(), lambda: equipment_df[id_col].dropna())
+
 def get_type_column(df):
     return next((col for col in df.columns if col.lower() in ["equipment_type", "type"]), None)
 
@@ -91,22 +165,73 @@ def save_settings_yaml(settings):
 
 # --- AUDIT LOGGER ---
 
-def log_audit(db_path, user, action, detail=""):
-    try:
-        with sqlite3.connect(db_path) as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS audit_log (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT,
-                    user TEXT,
-                    action TEXT,
-                    detail TEXT
-                )
-            """)
-            conn.execute("""
-                INSERT INTO audit_log (timestamp, user, action, detail)
-                VALUES (?, ?, ?, ?)
-            """, (datetime.utcnow().isoformat(), user, action, detail))
-            conn.commit()
-    except Exception as e:
-        print(f"Failed to log audit: {e}")
+def log_audit(action, detail="", db_path=None, user=None, equipment_id=None):
+    db_path = db_path or st.session_state.get("db_path")
+    user = user or st.session_state.get("user_email", "unknown")
+    if not db_path:
+        return
+    # Fire-and-forget through the DB's single writer; a page view never waits on the audit insert
+    future = db_writer.submit(db_path, """
+        INSERT INTO audit_log (timestamp, user, action, detail, equipment_id)
+        VALUES (?, ?, ?, ?, ?)
+    """, (timestamps.now(), user, action, detail, equipment_id))
+    future.add_done_callback(
+        lambda f: f.exception() and print(f"Failed to log audit: {f.exception()}")
+    )
+
+# --- BACKGROUND JOBS ---
+
+# Above this many rows, full-table saves and imports go to the job runner
+BACKGROUND_ROWS = 5000
+BACKGROUND_IMPORT_BYTES = 5 * 1024 * 1024
+
+JOB_ICONS = {"queued": "🕓", "running": "⏳", "done": "✅", "failed": "❌"}
+
+def submit_job(kind, fn, *args, **kwargs):
+    job_id = jobs.submit(
+        kind, fn, *args,
+        owner=st.session_state.get("user_email"),
+        db_path=st.session_state.get("db_path"),
+        **kwargs
+    )
+    st.toast(f"{kind.replace('_', ' ').title()} started in the background.")
+    return job_id
+
+def _read_artifact(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def _show_jobs(recent):
+    if not recent:
+        return
+    st.caption("Background jobs")
+    for job in recent:
+        label = f"{JOB_ICONS.get(job['status'], '')} **{job['kind']}** · {job['created_at'][:19].replace('T', ' ')} UTC"
+        st.markdown(label + (f" — {job['message']}" if job["message"] else ""))
+        if job["status"] in jobs.ACTIVE:
+            st.progress(job["progress"] or 0.0)
+        elif job["status"] == "failed":
+            st.error((job["error"] or "").split("\n")[0])
+        elif job["result_path"] and os.path.exists(job["result_path"]):
+            # The artifact (a backup, a full export) is read only when the button is clicked
+            st.download_button(
+                f"⬇️ {os.path.basename(job['result_path'])}",
+                functools.partial(_read_artifact, job["result_path"]),
+                os.path.basename(job["result_path"]), key=f"job_dl_{job['id']}"
+            )
+
+@st.fragment(run_every=3)
+def _live_jobs(kinds, limit):
+    recent = jobs.list_jobs(owner=st.session_state.get("user_email"), kinds=kinds, limit=limit)
+    _show_jobs(recent)
+    if not any(job["status"] in jobs.ACTIVE for job in recent):
+        # Nothing left to poll: one full rerun shows the results and stops the timer
+        st.rerun()
+
+def render_jobs(kinds=None, limit=5):
+    """Recent jobs of the current user; polls every 3 s while one is active."""
+    recent = jobs.list_jobs(owner=st.session_state.get("user_email"), kinds=kinds, limit=limit)
+    if any(job["status"] in jobs.ACTIVE for job in recent):
+        _live_jobs(kinds, limit)
+    else:
+        _show_jobs(recent)
@@ -0,0 +1,254 @@
+# snapshots.py
+"""Shared, memory-mapped snapshots of loaded tables.
+
+Each session used to read whole tables out of SQLite into its own pandas
+frame on every rerun. ``load`` instead keeps one Arrow IPC (Feather v2,
+uncompressed) file per table version under ``data/_snapshots/`` and
+memory-maps it: processes on a host share the file's pages through the OS
+page cache, a process holds only the mapping between reruns, and a cold
+process reads a snapshot instead of querying SQLite.
+
+A snapshot is keyed on the table's data version:
+
+    <epoch>-<version>-<schema>
+
+* ``version`` comes from ``table_versions``, bumped by a trigger on every
+  insert, update and delete (``migrations.table_version``);
+* ``schema`` is ``PRAGMA schema_version``, so an ALTER, an upload that
+  replaces a table or a migration changes every key;
+* ``epoch`` is re-rolled by ``forget`` after a restore, whose versions
+  could otherwise repeat ones seen before.
+
+Version and rows are read in one read transaction, so a snapshot never
+mixes two versions. Writing a new version removes the table's older
+files, and ``gc`` (run every ``GC_SECONDS``) drops snapshots of deleted
+databases and the least recently used files beyond ``MAX_MB``. Tables
+pyarrow cannot store (mixed-type columns) are read from SQLite as before,
+and so are ``VOLATILE`` tables, which change on nearly every page view or
+scan and would be rewritten on each load.
+
+Frames share the mapping instead of copying it: text columns come back as
+``string[pyarrow_numpy]`` (missing values are NaN, as with object columns)
+wrapping the mapped buffers, so N sessions on a table hold one copy of its
+strings. Numeric columns are copied; they are small and stay writable.
+Set ``SEALTRAIL_SNAPSHOTS=off`` to disable.
+"""
+import os
+import random
+import shutil
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+import catalog
+import db_writer
+import migrations
+
+ENABLED = os.environ.get("SEALTRAIL_SNAPSHOTS", "on") != "off"
+SNAPSHOT_DIR = os.path.join("data", "_snapshots")
+MAX_MB = int(os.environ.get("SEALTRAIL_SNAPSHOT_MB", 2048))
+GC_SECONDS = 600
+SUFFIX = ".arrow"
+VOLATILE = ("audit_log", "scanned_items")
+
+_tables = {}        # (db, table) -> (key, memory-mapped pyarrow.Table)
+_unstorable = {}    # (db, table) -> key pyarrow could not convert
+_last_gc = [0.0]
+_lock = threading.Lock()
+
+
+# --- EPOCH ---
+
+def new_epoch(conn):
+    conn.execute("INSERT OR REPLACE INTO table_versions (tbl, version) VALUES ('*', ?)", (random.getrandbits(62),))
+
+
+# --- FILES ---
+
+def snapshot_folder(db_path, table=None):
+    db_path = os.path.abspath(db_path)
+    user_dir = os.path.basename(os.path.dirname(db_path))
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    folder = os.path.join(SNAPSHOT_DIR, user_dir, stem)
+    return os.path.join(folder, table) if table else folder
+
+
+def _version_key(conn, table):
+    """Snapshot key of ``table``, or None when it has no data version."""
+    version = migrations.table_version(conn, table)
+    if version is None:
+        return None
+    epoch = conn.execute("SELECT version FROM table_versions WHERE tbl = '*'").fetchone()
+    return f"{epoch[0] if epoch else 0}-{version}"
+
+
+def _map(path):
+    import pyarrow as pa
+
+    with pa.memory_map(path, "r") as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def _write(folder, key, df):
+    """Write ``df`` as the snapshot for ``key`` and remove older versions.
+    Returns the path."""
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, key + SUFFIX)
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), tmp, compression="uncompressed")
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    # Processes still mapping an older version keep it until they unmap it (POSIX unlink)
+    for name in os.listdir(folder):
+        if name != key + SUFFIX and name.endswith(SUFFIX):
+            try:
+                os.remove(os.path.join(folder, name))
+            except OSError:
+                pass
+    return path
+
+
+# --- LOADING ---
+
+def _string_dtype(arrow_type):
+    import pyarrow as pa
+
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return pd.StringDtype("pyarrow_numpy")
+    return None
+
+
+def _frame(mapped):
+    """DataFrame over a mapped table; text columns reference its buffers."""
+    return mapped.to_pandas(types_mapper=_string_dtype)
+
+
+def load(conn, db_path, table, info=None):
+    """``SELECT * FROM table`` as a DataFrame, served from the table's
+    snapshot when one matches its current version. ``info`` (a
+    profiler.timed dict) gets ``cache_hit`` and ``source``."""
+    info = info if info is not None else {}
+    if not ENABLED or table in VOLATILE:
+        info["source"] = "sqlite"
+        return pd.read_sql_query(f'SELECT * FROM "{table}"', conn)
+    migrations.ensure_triggers(db_path, conn)
+    cache_key = (os.path.abspath(db_path), table)
+
+    conn.execute("BEGIN")
+    try:
+        key = _version_key(conn, table)
+        cached = _tables.get(cache_key)
+        if key is not None and cached and cached[0] == key:
+            info.update(cache_hit=True, source="mapped")
+            return _frame(cached[1])
+        folder = snapshot_folder(db_path, table)
+        path = os.path.join(folder, f"{key}{SUFFIX}")
+        if key is not None and os.path.exists(path):
+            try:
+                mapped = _map(path)
+            except (OSError, ValueError):
+                mapped = None   # removed or half-written by another process; re-read below
+            if mapped is not None:
+                _tables[cache_key] = (key, mapped)
+                info.update(cache_hit=True, source="snapshot")
+                return _frame(mapped)
+        df = pd.read_sql_query(f'SELECT * FROM "{table}"', conn)
+    finally:
+        conn.commit()
+
+    info.update(cache_hit=False, source="sqlite")
+    if key is None or _unstorable.get(cache_key) == key:
+        return df
+    try:
+        mapped = _map(_write(folder, key, df))
+    except (ImportError, ValueError, TypeError, OSError):
+        # pyarrow.ArrowException subclasses ValueError/TypeError: mixed-type object columns
+        _unstorable[cache_key] = key
+        return df
+    _tables[cache_key] = (key, mapped)
+    _maybe_gc()
+    return _frame(mapped)
+
+
+# --- GARBAGE COLLECTION ---
+
+def forget(db_path):
+    """Drop the snapshots of ``db_path`` and re-roll its epoch (after a
+    restore or delete)."""
+    folder = snapshot_folder(db_path)
+    key = os.path.abspath(db_path)
+    for cache_key in [k for k in _tables if k[0] == key]:
+        _tables.pop(cache_key, None)
+    for cache_key in [k for k in _unstorable if k[0] == key]:
+        _unstorable.pop(cache_key, None)
+    shutil.rmtree(folder, ignore_errors=True)
+    if os.path.exists(db_path):
+        db_writer.run(db_path, new_epoch)
+
+
+def gc(root=SNAPSHOT_DIR, max_mb=MAX_MB):
+    """Remove snapshots of databases that no longer exist, then the least
+    recently used files until the total is under ``max_mb``. Returns the
+    number of files removed."""
+    removed = 0
+    files = []
+    if not os.path.isdir(root):
+        return 0
+    for user_dir in os.listdir(root):
+        if not os.listdir(os.path.join(root, user_dir)):
+            os.rmdir(os.path.join(root, user_dir))
+            continue
+        for stem in os.listdir(os.path.join(root, user_dir)):
+            folder = os.path.join(root, user_dir, stem)
+            if not os.path.exists(os.path.join(catalog.DATA_DIR, user_dir, stem + ".db")):
+                shutil.rmtree(folder, ignore_errors=True)
+                continue
+            for dirpath, _, names in os.walk(folder):
+                for name in names:
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    if name.endswith(".tmp") and time.time() - st.st_mtime > GC_SECONDS:
+                        os.remove(path)
+                        removed += 1
+                    elif name.endswith(SUFFIX):
+                        files.append((max(st.st_atime, st.st_mtime), st.st_size, path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_mb * 1024 * 1024:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def _maybe_gc():
+    now = time.monotonic()
+    with _lock:
+        if now - _last_gc[0] < GC_SECONDS:
+            return
+        _last_gc[0] = now
+    threading.Thread(target=gc, name="snapshot-gc", daemon=True).start()
+
+
+def stats():
+    """Snapshots mapped by this process: one row per table."""
+    return pd.DataFrame([
+        {"database": os.path.basename(db), "table": table, "key": key,
+         "rows": mapped.num_rows, "mapped_mb": round(mapped.nbytes / 1024 / 1024, 2)}
+        for (db, table), (key, mapped) in list(_tables.items())
+    ])
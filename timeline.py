@@ -0,0 +1,82 @@
+# timeline.py
+"""One asset's full history: maintenance, scans and audit events.
+
+A page of the timeline is one UNION ALL over the three tables, each branch
+a range read on its per-asset index (migrations 3 and 9)::
+
+    maintenance_log  idx_maintenance_log_key  (LOWER(TRIM(equipment_id)), date)
+    scanned_items    idx_scanned_items_key    (LOWER(TRIM(equipment_id)), timestamp)
+    audit_log        idx_audit_log_equipment  (LOWER(TRIM(equipment_id)), timestamp)
+
+Pages are newest first and keyset-paginated: ``page`` returns a cursor
+(sort key, kind, id of the last row) and the next call starts below it, so
+every page costs the same however deep the history goes. Each branch reads
+at most ``limit`` rows.
+
+Maintenance sorts on its calendar date (``YYYY-MM-DD``), which orders
+before the timestamped events of the same day.
+"""
+import pandas as pd
+
+import timestamps
+
+KINDS = {
+    "audit": """
+        SELECT 'audit' AS kind, id, timestamp AS ts, user AS who,
+               action || CASE WHEN COALESCE(detail, '') != '' THEN ': ' || detail ELSE '' END AS summary,
+               NULL AS location
+        FROM audit_log WHERE LOWER(TRIM(equipment_id)) = LOWER(TRIM(:equipment_id)) AND timestamp IS NOT NULL
+    """,
+    "maintenance": """
+        SELECT 'maintenance' AS kind, id, date AS ts, technician AS who, description AS summary, NULL AS location
+        FROM maintenance_log WHERE LOWER(TRIM(equipment_id)) = LOWER(TRIM(:equipment_id)) AND date IS NOT NULL
+    """,
+    "scan": """
+        SELECT 'scan' AS kind, id, timestamp AS ts, scanned_by AS who, 'Scanned' AS summary, location
+        FROM scanned_items WHERE LOWER(TRIM(equipment_id)) = LOWER(TRIM(:equipment_id)) AND timestamp IS NOT NULL
+    """,
+}
+SORT_COLUMN = {"audit": "timestamp", "maintenance": "date", "scan": "timestamp"}
+
+
+def _below(kind, cursor):
+    """Condition keeping rows of ``kind`` that sort after ``cursor`` (newest
+    first, ties broken by kind then id)."""
+    if cursor is None:
+        return ""
+    col = SORT_COLUMN[kind]
+    _, cursor_kind, _ = cursor
+    if kind == cursor_kind:
+        return f" AND ({col} < :ts OR ({col} = :ts AND id < :id))"
+    # At the cursor's sort key, only kinds ordered after it (kind DESC) are left
+    return f" AND {col} < :ts" if kind > cursor_kind else f" AND {col} <= :ts"
+
+
+def page(conn, equipment_id, limit=50, cursor=None, kinds=tuple(KINDS)):
+    """Up to ``limit`` events of one asset, newest first, starting below
+    ``cursor``. Returns (DataFrame, cursor for the next page or None)."""
+    branches = [
+        f"SELECT * FROM ({KINDS[k]}{_below(k, cursor)} ORDER BY {SORT_COLUMN[k]} DESC, id DESC LIMIT :limit)"
+        for k in kinds
+    ]
+    params = {"equipment_id": equipment_id, "limit": limit + 1}
+    if cursor is not None:
+        params.update(ts=cursor[0], id=cursor[2])
+    df = pd.read_sql_query(
+        " UNION ALL ".join(branches) + " ORDER BY ts DESC, kind DESC, id DESC LIMIT :limit", conn, params=params
+    )
+    next_cursor = None
+    if len(df) > limit:
+        df = df.head(limit).copy()
+        last = df.iloc[-1]
+        next_cursor = (last["ts"], last["kind"], int(last["id"]))
+    df["when"] = [timestamps.local_text(t) if "T" in t else t for t in df["ts"]]
+    return df[["when", "kind", "summary", "who", "location", "ts", "id"]], next_cursor
+
+
+def counts(conn, equipment_id):
+    """{kind: number of events} for one asset; each an index-only count."""
+    return {
+        kind: conn.execute(f"SELECT COUNT(*) FROM ({sql})", {"equipment_id": equipment_id}).fetchone()[0]
+        for kind, sql in KINDS.items()
+    }
@@ -0,0 +1,131 @@
+# timestamps.py
+"""Canonical timestamp storage.
+
+Event timestamps (``scanned_items.timestamp``, ``audit_log.timestamp``,
+``equipment_location.last_seen``) are stored as fixed-width ISO-8601 UTC
+text with millisecond precision::
+
+    2025-03-01T14:05:09.123Z
+
+Fixed width means text order is time order, so range filters are plain
+``col >= ? AND col < ?`` comparisons that use the column's index, and
+SQLite's date functions read the values directly. Calendar dates
+(``maintenance_log.date``) stay ISO dates (``YYYY-MM-DD``).
+
+Naive datetimes are taken to be server-local time, which is what
+``str(datetime.now())`` used to store; migration 4 converts existing rows.
+"""
+from datetime import date, datetime, time, timedelta, timezone
+
+import pandas as pd
+from dateutil import tz
+
+SQL_FORMAT = "%Y-%m-%dT%H:%M:%fZ"   # strftime() in SQLite; %f is SS.SSS
+GLOB = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]T[0-9][0-9]:[0-9][0-9]:[0-9][0-9].[0-9][0-9][0-9]Z"
+LOCAL = tz.tzlocal()
+
+
+def _utc(dt):
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=LOCAL)
+    return dt.astimezone(timezone.utc)
+
+
+def to_text(value):
+    """Canonical UTC text for a datetime, date (local midnight) or
+    parseable string. Returns None for empty values; raises ValueError
+    for text that is not a timestamp."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        value = pd.Timestamp(value).to_pydatetime()
+    elif isinstance(value, pd.Timestamp):
+        value = value.to_pydatetime()
+    elif isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime.combine(value, time())
+    elif not isinstance(value, datetime):
+        raise TypeError(f"not a timestamp: {value!r}")
+    dt = _utc(value)
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.") + f"{dt.microsecond // 1000:03d}Z"
+
+
+def now():
+    return to_text(datetime.now(timezone.utc))
+
+
+def local_text(value, fmt="%Y-%m-%d %H:%M"):
+    """Canonical text -> server-local display string."""
+    if not value:
+        return ""
+    return pd.Timestamp(value).tz_convert(LOCAL).strftime(fmt)
+
+
+def parse(series):
+    """Canonical text -> naive local datetimes for display and filtering."""
+    parsed = pd.to_datetime(series, format="ISO8601", utc=True, errors="coerce")
+    return parsed.dt.tz_convert(LOCAL).dt.tz_localize(None)
+
+
+def day_range(start, end):
+    """UTC bounds covering local calendar days ``start`` .. ``end`` inclusive,
+    for ``col >= lo AND col < hi``. Either side may be None."""
+    lo = to_text(start) if start is not None else None
+    hi = to_text(end + timedelta(days=1)) if end is not None else None
+    return lo, hi
+
+
+def where_between(col, start, end, dates=False):
+    """(sql, params) filtering ``col`` to local days ``start`` .. ``end``.
+    ``dates=True`` for calendar-date columns such as maintenance_log.date."""
+    if dates:
+        lo = str(start) if start is not None else None
+        hi = str(end + timedelta(days=1)) if end is not None else None
+    else:
+        lo, hi = day_range(start, end)
+    clauses, params = [], []
+    if lo is not None:
+        clauses.append(f"{col} >= ?")
+        params.append(lo)
+    if hi is not None:
+        clauses.append(f"{col} < ?")
+        params.append(hi)
+    return " AND ".join(clauses) or "1 = 1", params
+
+
+# --- MIGRATION ---
+
+def _normalize_column(conn, table, col, local):
+    """Rewrite non-canonical values of ``table.col``. SQLite converts what it
+    can parse; pandas handles the rest; unparseable values are left alone."""
+    modifier = ", 'utc'" if local else ""
+    # Values with their own offset are left to pandas so 'utc' can't shift them twice
+    conn.execute(f"""
+        UPDATE {table} SET {col} = strftime('{SQL_FORMAT}', {col}{modifier})
+        WHERE {col} IS NOT NULL AND {col} NOT GLOB '{GLOB}'
+          AND {col} NOT LIKE '%Z' AND {col} NOT GLOB '*[+-][0-9][0-9]:[0-9][0-9]'
+          AND strftime('{SQL_FORMAT}', {col}{modifier}) IS NOT NULL
+    """)
+    rest = conn.execute(f"SELECT rowid, {col} FROM {table} WHERE {col} IS NOT NULL AND {col} NOT GLOB '{GLOB}'").fetchall()
+    fixed = []
+    for rowid, value in rest:
+        try:
+            ts = pd.Timestamp(value)
+        except (ValueError, TypeError):
+            continue
+        if ts is pd.NaT:
+            continue
+        if ts.tzinfo is None and not local:
+            ts = ts.tz_localize("UTC")
+        fixed.append((to_text(ts), rowid))
+    conn.executemany(f"UPDATE {table} SET {col} = ? WHERE rowid = ?", fixed)
+
+
+def migrate_existing(conn):
+    # scanned_items held str(datetime.now()) (server-local); audit_log held utcnow().isoformat()
+    _normalize_column(conn, "scanned_items", "timestamp", local=True)
+    _normalize_column(conn, "equipment_location", "last_seen", local=True)
+    _normalize_column(conn, "audit_log", "timestamp", local=False)
+    conn.execute("""
+        UPDATE maintenance_log SET date = date(date)
+        WHERE date IS NOT NULL AND date NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]' AND date(date) IS NOT NULL
+    """)